@@ -0,0 +1,95 @@
+"""Compare blocking and asyncio focus requests sharing one event loop
+
+Synthetic nights are written to separate directories and a focus request is
+made for every night from the same event loop, while a heartbeat coroutine
+ticks every 10 ms. Requests are made by calling the instance inside a
+coroutine, which blocks the loop, and concurrently with `GoodmanFocus.arun`,
+with no executor and with a `ThreadExecutor` or `ProcessExecutor` shared by
+all the requests. For every case the wall time and the longest interval
+between heartbeats are reported.
+
+Usage::
+
+    python benchmarks/bench_async.py [--repeat N] [--requests N] [--workers N]
+
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from goodman_focus import GoodmanFocus
+from goodman_focus.executors import ProcessExecutor, ThreadExecutor
+from goodman_focus.tests.synthetic import write_night
+
+HEARTBEAT = 0.01
+
+
+async def measure(request, data_paths):
+    """Wall time of `request` and longest interval between heartbeats"""
+    intervals = []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(HEARTBEAT)
+            now = time.perf_counter()
+            intervals.append(now - last)
+            last = now
+
+    beating = asyncio.ensure_future(heartbeat())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await request(data_paths)
+    elapsed = time.perf_counter() - start
+    done.set()
+    await beating
+    return elapsed, max(intervals)
+
+
+async def blocking_requests(data_paths):
+    return [GoodmanFocus(data_path=data_path)() for data_path in data_paths]
+
+
+def get_async_requests(executor=None):
+    async def async_requests(data_paths):
+        return await asyncio.gather(*[GoodmanFocus(data_path=data_path, executor=executor).arun()
+                                      for data_path in data_paths])
+    return async_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per case')
+    parser.add_argument('--requests', type=int, default=4, help='Number of concurrent requests')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Workers of the shared executors')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        data_paths = []
+        for index in range(args.requests):
+            data_path = os.path.join(temporary_directory, f"night_{index}")
+            os.mkdir(data_path)
+            write_night(path=data_path, name='red_2x2')
+            data_paths.append(data_path)
+
+        with ThreadExecutor(workers=args.workers) as thread_executor, \
+                ProcessExecutor(workers=args.workers) as process_executor:
+            cases = [('blocking __call__', blocking_requests),
+                     ('arun', get_async_requests()),
+                     ('arun thread', get_async_requests(thread_executor)),
+                     ('arun process', get_async_requests(process_executor))]
+            print(f"{'case':>17} {'wall [s]':>9} {'max heartbeat [ms]':>19}")
+            for label, request in cases:
+                timings = [asyncio.run(measure(request, data_paths)) for _ in range(args.repeat)]
+                elapsed = min(elapsed for elapsed, _ in timings)
+                interval = min(interval for _, interval in timings)
+                print(f"{label:>17} {elapsed:9.2f} {1e3 * interval:19.1f}")
+
+
+if __name__ == '__main__':
+    main()
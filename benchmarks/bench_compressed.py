@@ -0,0 +1,108 @@
+"""Compare full and partial reading of compressed focus sequences
+
+A synthetic sequence of full size frames is written uncompressed, tile
+compressed with the default Rice compression of fpack (`.fits.fz`) and gzip
+compressed (`.fits.gz`). For every format the size on disk and the best wall
+and CPU time per file are reported for:
+
+- header discovery with `astropy.io.fits.getheader` on the HDU holding the
+  image and with `read_focus_header`, which does not decompress any data,
+- reading with `CCDData.read`, which decompresses the full frame, and with
+  `read_focus_frame`, which decompresses only the central band.
+
+Usage::
+
+    python benchmarks/bench_compressed.py [--repeat N] [--frames N]
+
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from astropy.io import fits
+from astropy.modeling import models
+from ccdproc import CCDData
+
+from goodman_focus.readers import get_band_limits, read_focus_frame, read_focus_header
+
+SHAPE = (1896, 4142)
+FORMATS = [('fits', ''), ('fits.fz', 'fz'), ('fits.gz', 'gz')]
+
+
+def get_frame(focus, seed=0):
+    generator = np.random.default_rng(seed)
+    x_axis = np.arange(SHAPE[1])
+    stddev = np.sqrt(3. ** 2 + (4e-3 * focus) ** 2) / 2.35482
+    profile = 300. + 0.02 * x_axis
+    for center, amplitude in zip(np.linspace(100, SHAPE[1] - 100, 30), generator.uniform(800, 8000, 30)):
+        profile += models.Gaussian1D(amplitude=amplitude * 1.5 / stddev, mean=center, stddev=stddev)(x_axis)
+    data = profile[np.newaxis, :] + generator.normal(0, 8., SHAPE)
+    return np.clip(np.round(data), 0, 65535).astype(np.uint16)
+
+
+def write_sequence(path, frames):
+    """Write the same sequence in every format, return the paths per format"""
+    paths = {extension: [] for extension, _ in FORMATS}
+    for index, focus in enumerate(np.linspace(-1000, 1000, frames)):
+        data = get_frame(focus=focus, seed=index)
+        header = fits.Header({'OBSTYPE': 'FOCUS', 'CAM_FOC': float(focus)})
+        for extension, compression in FORMATS:
+            file_path = os.path.join(path, f"focus_{index:03d}.{extension}")
+            if compression == 'fz':
+                fits.HDUList([fits.PrimaryHDU(), fits.CompImageHDU(data=data, header=header)]).writeto(file_path)
+            else:
+                fits.PrimaryHDU(data=data, header=header).writeto(file_path)
+            paths[extension].append(file_path)
+    return paths
+
+
+def measure(function, paths, repeat):
+    """Best wall and CPU time per file"""
+    wall = []
+    cpu = []
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        for file_path in paths:
+            function(file_path)
+        wall.append((time.perf_counter() - wall_start) / len(paths))
+        cpu.append((time.process_time() - cpu_start) / len(paths))
+    return min(wall), min(cpu)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per case')
+    parser.add_argument('--frames', type=int, default=5, help='Number of frames of the sequence')
+    args = parser.parse_args()
+
+    low, high = get_band_limits(height=SHAPE[0])
+    full_size = SHAPE[0] * SHAPE[1] * 2 / 2 ** 20
+    decompressed = {'fits': (full_size, full_size),
+                    'fits.fz': (full_size, (high - low) * SHAPE[1] * 2 / 2 ** 20),
+                    'fits.gz': (full_size, high * SHAPE[1] * 2 / 2 ** 20)}
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        paths = write_sequence(path=temporary_directory, frames=args.frames)
+        print(f"{'format':>8} {'size [MB]':>10} {'step':>7} {'method':>17} "
+              f"{'wall [ms]':>10} {'cpu [ms]':>9} {'decompressed [MB]':>18}")
+        for extension, compression in FORMATS:
+            size = np.mean([os.path.getsize(file_path) for file_path in paths[extension]]) / 2 ** 20
+            extension_index = 1 if compression == 'fz' else 0
+            # astropy decompresses the whole gzip stream to find the headers
+            cases = [('header', 'getheader', lambda path: fits.getheader(path, extension_index),
+                      full_size if compression == 'gz' else 0.),
+                     ('header', 'read_focus_header', read_focus_header, 0.),
+                     ('read', 'CCDData.read', lambda path: CCDData.read(path, hdu=extension_index, unit='adu'),
+                      decompressed[extension][0]),
+                     ('read', 'read_focus_frame', read_focus_frame, decompressed[extension][1])]
+            for step, method, function, megabytes in cases:
+                wall, cpu = measure(function=function, paths=paths[extension], repeat=args.repeat)
+                print(f"{extension:>8} {size:10.2f} {step:>7} {method:>17} "
+                      f"{1e3 * wall:10.1f} {1e3 * cpu:9.1f} {megabytes:18.2f}")
+
+
+if __name__ == '__main__':
+    main()
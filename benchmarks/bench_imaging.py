@@ -0,0 +1,68 @@
+"""Compare the latency of the imaging fast path with the full pipeline
+
+Synthetic imaging focus frames with a single slit image are measured with
+`get_peaks` and `get_fwhm` and with `get_slit_fwhm`.
+
+Usage::
+
+    python benchmarks/bench_imaging.py [--repeat N]
+
+"""
+import argparse
+import time
+
+import numpy as np
+
+from astropy.modeling import models
+from ccdproc import CCDData
+
+from goodman_focus.goodman_focus import get_fwhm, get_peaks, get_slit_fwhm
+
+
+def get_slit_frame(shape, fwhm=4., seed=0):
+    """Synthetic imaging focus frame with a sloped background"""
+    generator = np.random.default_rng(seed)
+    rows, columns = shape
+    x_axis = np.arange(columns)
+    profile = 200 + 0.01 * x_axis + models.Gaussian1D(amplitude=3000,
+                                                      mean=0.47 * columns,
+                                                      stddev=fwhm / 2.35482)(x_axis)
+    return CCDData(data=profile[np.newaxis, :] + generator.normal(0, 10, (rows, columns)), unit='adu')
+
+
+def full_pipeline(ccd):
+    peaks, values, x_axis, profile = get_peaks(ccd=ccd)
+    return get_fwhm(peaks=peaks, values=values, x_axis=x_axis, profile=profile, model=models.Gaussian1D())
+
+
+def fast_path(ccd):
+    return get_slit_fwhm(ccd=ccd, model=models.Gaussian1D())
+
+
+def measure(function, ccd, repeat):
+    """Best time of `repeat` runs and the FWHM obtained"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fwhm = function(ccd)
+        timings.append(time.perf_counter() - start)
+    return min(timings), fwhm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10, help='Number of runs per case')
+    args = parser.parse_args()
+
+    print(f"{'binning':>8} {'FWHM':>5} {'full [ms]':>10} {'fast [ms]':>10} {'speedup':>8} {'FWHM diff':>10}")
+    for binning, shape in [('1x1', (1896, 4142)), ('2x2', (948, 2071))]:
+        for fwhm in [3., 8., 20.]:
+            ccd = get_slit_frame(shape=shape, fwhm=fwhm)
+            full_time, full_fwhm = measure(full_pipeline, ccd, repeat=args.repeat)
+            fast_time, fast_fwhm = measure(fast_path, ccd, repeat=args.repeat)
+            print(f"{binning:>8} {fwhm:5.1f} {1e3 * full_time:10.1f} {1e3 * fast_time:10.1f} "
+                  f"{full_time / fast_time:8.2f} {abs(fast_fwhm - full_fwhm) / full_fwhm:10.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Compare fixed and binning-derived extraction parameters
+
+Synthetic comparison lamp frames with isolated lines and close pairs are
+measured with `get_peaks` and `get_fwhm` using `DEFAULT_PARAMETERS` and the
+parameters derived from the binning and slit by `get_extraction_parameters`.
+For every binning the time per frame, the fraction of lines detected and the
+error of the FWHM are reported.
+
+Usage::
+
+    python benchmarks/bench_parameters.py [--repeat N]
+
+"""
+import argparse
+import time
+
+import numpy as np
+
+from astropy.modeling import models
+from ccdproc import CCDData
+
+from goodman_focus.goodman_focus import get_fwhm, get_peaks
+from goodman_focus.parameters import DEFAULT_PARAMETERS, PLATE_SCALE, get_extraction_parameters
+
+SLIT = '1.0_LONG_SLIT'
+UNBINNED_SHAPE = (1896, 4142)
+
+
+def get_lamp_frame(binning, seed=0):
+    """Synthetic frame with lines of the width of the slit
+
+    Returns:
+        The frame as `CCDData`, the line centers and the true FWHM, both in
+        binned pixels.
+
+    """
+    generator = np.random.default_rng(seed)
+    rows, columns = UNBINNED_SHAPE[0] // binning, UNBINNED_SHAPE[1] // binning
+    fwhm = 1.0 / PLATE_SCALE / binning
+    isolated = np.linspace(100, UNBINNED_SHAPE[1] - 100, 30)
+    pairs = isolated[:-1:3] + 60
+    centers = np.sort(np.concatenate([isolated, pairs, pairs + 14])) / binning
+    x_axis = np.arange(columns)
+    profile = 500. + 0.01 * x_axis
+    for center in centers:
+        profile += models.Gaussian1D(amplitude=generator.uniform(2000, 8000) / binning,
+                                     mean=center,
+                                     stddev=fwhm / 2.35482)(x_axis)
+    data = profile[np.newaxis, :] + generator.normal(0, 10, (rows, columns))
+    header = {'CCDSUM': f"{binning} {binning}", 'SLIT': SLIT}
+    return CCDData(data=data, meta=header, unit='adu'), centers, fwhm
+
+
+def measure(ccd, parameters, repeat):
+    """Best time of `repeat` runs, the peaks and the FWHM"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        peaks, values, x_axis, profile = get_peaks(ccd=ccd, parameters=parameters)
+        fwhm = get_fwhm(peaks=peaks,
+                        values=values,
+                        x_axis=x_axis,
+                        profile=profile,
+                        model=models.Gaussian1D(),
+                        parameters=parameters)
+        timings.append(time.perf_counter() - start)
+    return min(timings), peaks, fwhm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs per case')
+    args = parser.parse_args()
+
+    print(f"{'binning':>8} {'parameters':>10} {'time [ms]':>10} {'detected':>9} {'FWHM error':>11}")
+    for binning in [1, 2, 3]:
+        ccd, centers, true_fwhm = get_lamp_frame(binning=binning)
+        for label, parameters in [('default', DEFAULT_PARAMETERS),
+                                  ('derived', get_extraction_parameters(ccd.header))]:
+            elapsed, peaks, fwhm = measure(ccd=ccd, parameters=parameters, repeat=args.repeat)
+            distance = np.abs(np.asarray(peaks, dtype=float)[:, np.newaxis] - centers[np.newaxis, :])
+            detected = np.count_nonzero(distance.min(axis=0) <= 1.5) if len(peaks) > 0 else 0
+            error = abs(fwhm - true_fwhm) / true_fwhm if fwhm is not None else np.nan
+            print(f"{binning}x{binning:<6} {label:>10} {1e3 * elapsed:10.1f} "
+                  f"{detected:4d}/{len(centers):<4d} {error:11.2%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Compare the throughput of the float64 and float32 processing paths
+
+Synthetic arc lamp frames with the size of 1x1 and 2x2 binned spectroscopic
+data are processed by `get_peaks` and `get_fwhm` in both precisions.
+
+Usage::
+
+    python benchmarks/bench_precision.py [--repeat N]
+
+"""
+import argparse
+import time
+
+import numpy as np
+
+from astropy.modeling import models
+from ccdproc import CCDData
+
+from goodman_focus.goodman_focus import get_fwhm, get_peaks
+
+
+def get_arc_frame(shape, number_of_lines=40, stddev=3., dtype=np.float64, seed=0):
+    """Synthetic arc lamp frame with lines along the columns"""
+    generator = np.random.default_rng(seed)
+    rows, columns = shape
+    x_axis = np.arange(columns)
+    profile = np.zeros(columns)
+    for center, amplitude in zip(np.linspace(50, columns - 50, number_of_lines),
+                                 generator.uniform(500, 5000, number_of_lines)):
+        profile += models.Gaussian1D(amplitude=amplitude, mean=center, stddev=stddev)(x_axis)
+    data = 1000 + profile[np.newaxis, :] + generator.normal(0, 10, (rows, columns))
+    return CCDData(data=data.astype(dtype), unit='adu')
+
+
+def measure(ccd, dtype, repeat):
+    """Best time of `repeat` runs of the extraction and of the whole frame and the FWHM obtained"""
+    extraction, total = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        peaks, values, x_axis, profile = get_peaks(ccd=ccd, dtype=dtype)
+        extracted = time.perf_counter()
+        fwhm = get_fwhm(peaks=peaks, values=values, x_axis=x_axis, profile=profile, model=models.Gaussian1D())
+        extraction.append(extracted - start)
+        total.append(time.perf_counter() - start)
+    return min(extraction), min(total), fwhm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10, help='Number of runs per case')
+    args = parser.parse_args()
+
+    print("Times in ms, extraction is get_peaks and total includes get_fwhm")
+    print(f"{'binning':>8} {'extraction 64':>14} {'extraction 32':>14} {'speedup':>8} "
+          f"{'total 64':>9} {'total 32':>9} {'speedup':>8} {'FWHM diff':>10}")
+    for binning, shape, stddev in [('1x1', (1896, 4142), 3.), ('2x2', (948, 2071), 1.5)]:
+        ccd = get_arc_frame(shape=shape, stddev=stddev)
+        extraction_64, total_64, fwhm_64 = measure(ccd, dtype=None, repeat=args.repeat)
+        extraction_32, total_32, fwhm_32 = measure(ccd, dtype=np.float32, repeat=args.repeat)
+        print(f"{binning:>8} {1e3 * extraction_64:14.1f} {1e3 * extraction_32:14.1f} "
+              f"{extraction_64 / extraction_32:8.2f} {1e3 * total_64:9.1f} {1e3 * total_32:9.1f} "
+              f"{total_64 / total_32:8.2f} {abs(fwhm_32 - fwhm_64) / fwhm_64:10.2e}")
+
+
+if __name__ == '__main__':
+    main()
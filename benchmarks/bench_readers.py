@@ -0,0 +1,90 @@
+"""Compare reading multi-extension focus frames in full and by central band
+
+Synthetic full size frames are split in four amplifiers with overscan and
+written as multi-extension files. They are read by assembling every extension
+in full and taking the central band, and with `read_focus_frame`, serially and
+with a `ThreadExecutor`.
+
+Usage::
+
+    python benchmarks/bench_readers.py [--repeat N]
+
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from astropy.io import fits
+
+from goodman_focus.executors import ThreadExecutor
+from goodman_focus.readers import get_band_limits, read_focus_frame
+
+OVERSCAN = 16
+
+
+def write_frame(file_path, shape, seed=0):
+    """Write a frame as four amplifiers, returning the assembled frame"""
+    generator = np.random.default_rng(seed)
+    frame = generator.integers(0, 65535, shape, dtype=np.uint16)
+    rows, columns = shape
+    extensions = []
+    for row, flip_y in [(0, False), (rows // 2, True)]:
+        for column, flip_x in [(0, False), (columns // 2, True)]:
+            data = frame[row:row + rows // 2, column:column + columns // 2]
+            data = data[::-1 if flip_y else 1, ::-1 if flip_x else 1]
+            data = np.hstack([data, np.zeros((rows // 2, OVERSCAN), dtype=np.uint16)])
+            x_range = [column + 1, column + columns // 2][::-1 if flip_x else 1]
+            y_range = [row + 1, row + rows // 2][::-1 if flip_y else 1]
+            header = fits.Header()
+            header['DATASEC'] = f"[1:{columns // 2},1:{rows // 2}]"
+            header['DETSEC'] = f"[{x_range[0]}:{x_range[1]},{y_range[0]}:{y_range[1]}]"
+            extensions.append(fits.ImageHDU(data=data, header=header))
+    fits.HDUList([fits.PrimaryHDU()] + extensions).writeto(file_path)
+    return frame
+
+
+def read_assembled(file_path):
+    """Read every extension in full, assemble the frame and take the band"""
+    with fits.open(file_path) as hdu_list:
+        pieces = [hdu.data[:, :-OVERSCAN] for hdu in hdu_list[1:]]
+        bottom = np.hstack([pieces[0], pieces[1][:, ::-1]])
+        top = np.hstack([pieces[2][::-1, :], pieces[3][::-1, ::-1]])
+        frame = np.vstack([bottom, top])
+    low, high = get_band_limits(height=frame.shape[0])
+    return frame[low:high]
+
+
+def measure(function, repeat):
+    """Best time of `repeat` runs and the result"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10, help='Number of runs per case')
+    args = parser.parse_args()
+
+    print(f"{'binning':>8} {'full [ms]':>10} {'band [ms]':>10} {'threads [ms]':>13} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as directory, ThreadExecutor(workers=4) as executor:
+        for binning, shape in [('1x1', (1896, 4142)), ('2x2', (948, 2070))]:
+            file_path = os.path.join(directory, f"frame_{binning}.fits")
+            write_frame(file_path=file_path, shape=shape)
+            full_time, full_band = measure(lambda: read_assembled(file_path), repeat=args.repeat)
+            band_time, band = measure(lambda: read_focus_frame(file_path)[0], repeat=args.repeat)
+            thread_time, thread_band = measure(lambda: read_focus_frame(file_path, executor=executor)[0],
+                                               repeat=args.repeat)
+            assert np.array_equal(full_band, band) and np.array_equal(full_band, thread_band)
+            print(f"{binning:>8} {1e3 * full_time:10.1f} {1e3 * band_time:10.1f} {1e3 * thread_time:13.1f} "
+                  f"{full_time / min(band_time, thread_time):8.2f}")
+
+
+if __name__ == '__main__':
+    main()
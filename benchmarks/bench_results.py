@@ -0,0 +1,94 @@
+"""Compare dictionary and structured array results over many nights
+
+Results of many synthetic nights are kept either as the dictionaries returned
+by `GoodmanFocus.__call__`, with `focus_data` and `fwhm_data` lists, or as
+`FocusResult` instances backed by structured arrays. The dictionaries also
+keep a list of file names so both hold the same information. For every number
+of results the memory used and the time to build a single data frame with all
+the measurements and to get the minimum FWHM per mode are reported.
+
+Usage::
+
+    python benchmarks/bench_results.py [--repeat N] [--files N]
+
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas
+
+from goodman_focus.results import FocusMeasurements, FocusResult, results_to_pandas
+
+MODES = [f"Spectroscopic_{grating}_M{mode}" for grating in [400, 600, 930, 1200] for mode in range(1, 6)]
+
+
+def get_results(number_of_results, number_of_files, seed=0):
+    generator = np.random.default_rng(seed)
+    results = []
+    for index in range(number_of_results):
+        focus = np.sort(generator.uniform(-2000, 2000, number_of_files))
+        fwhm = 2 + 1e-6 * focus ** 2 + generator.normal(0, 0.05, number_of_files)
+        files = [f"{index:05d}_focus_{number:03d}.fits" for number in range(number_of_files)]
+        results.append(FocusResult(date=f"night_{index // len(MODES):04d}",
+                                   time='2019-06-19T00:00:00.000',
+                                   mode_name=MODES[index % len(MODES)],
+                                   focus=0.,
+                                   fwhm=2.,
+                                   best_image_name=files[number_of_files // 2],
+                                   best_image_focus=0.,
+                                   best_image_fwhm=2.,
+                                   measurements=FocusMeasurements.from_arrays(file=files, fwhm=fwhm, focus=focus)))
+    return results
+
+
+def to_dict(result):
+    content = result.to_dict()
+    content['file_data'] = result.measurements.file.tolist()
+    return content
+
+
+def dicts_to_pandas(results):
+    rows = [{'mode_name': result['mode_name'], 'date': result['date'], 'file': file, 'fwhm': fwhm, 'focus': focus}
+            for result in results
+            for file, fwhm, focus in zip(result['file_data'], result['fwhm_data'], result['focus_data'])]
+    return pandas.DataFrame(rows)
+
+
+def get_memory(build):
+    tracemalloc.start()
+    content = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, content
+
+
+def get_time(function, content, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(content).groupby('mode_name', observed=True)['fwhm'].min()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs per case')
+    parser.add_argument('--files', type=int, default=15, help='Number of files per result')
+    args = parser.parse_args()
+
+    print(f"{'results':>8} {'format':>10} {'memory [MB]':>12} {'aggregate [ms]':>15}")
+    for number_of_results in [100, 1000, 10000]:
+        typed = get_results(number_of_results=number_of_results, number_of_files=args.files)
+        for label, build, function in [
+                ('dict', lambda: [to_dict(result) for result in typed], dicts_to_pandas),
+                ('typed', lambda: get_results(number_of_results, args.files), results_to_pandas)]:
+            size, content = get_memory(build)
+            elapsed = get_time(function, content, repeat=args.repeat)
+            print(f"{number_of_results:8d} {label:>10} {size / 2 ** 20:12.2f} {1e3 * elapsed:15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Compare sending a profile to worker processes pickled or in shared memory
+
+This is how `get_fwhm` fits the lines of a frame in parallel when the files
+can't be sent to the workers. One task per line of a single profile is sent,
+with the pickled profile or with the descriptor of a `SharedProfileStore`.
+Only the transfer is timed, the tasks just read their data, since fitting
+takes the same time in both cases.
+
+Usage::
+
+    python benchmarks/bench_shared_profiles.py [--lines N] [--workers N]
+
+"""
+import argparse
+import time
+
+import numpy as np
+
+from goodman_focus.executors import ProcessExecutor
+from goodman_focus.shared_profiles import SharedProfileStore
+
+
+def read_pickled(array):
+    return float(array[0])
+
+
+def read_shared(descriptor, index):
+    with SharedProfileStore.attach(descriptor) as store:
+        return float(store.profiles[index, 0])
+
+
+def best_time(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=80, help='Number of lines of a profile')
+    parser.add_argument('--workers', type=int, default=2, help='Number of worker processes')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs per case')
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(0)
+    cases = [('lines 2x2', generator.normal(size=(1, 2071))),
+             ('lines 1x1', generator.normal(size=(1, 4142)))]
+
+    print(f"{args.workers} workers, best of {args.repeat}, times in ms")
+    print(f"{'case':>13} {'tasks':>6} {'MB':>7} {'pickled':>8} {'shared':>8} {'speedup':>8}")
+    with ProcessExecutor(workers=args.workers) as executor:
+        executor.map(read_pickled, [(np.zeros(1),)])
+        for name, arrays in cases:
+            indices = [0] * args.lines
+
+            def pickled():
+                executor.map(read_pickled, [(arrays[index],) for index in indices])
+
+            def shared():
+                with SharedProfileStore.from_profiles(arrays) as store:
+                    executor.map(read_shared, [(store.descriptor, index) for index in indices])
+
+            pickled_time = best_time(pickled, args.repeat)
+            shared_time = best_time(shared, args.repeat)
+            megabytes = arrays[0].nbytes * len(indices) / 1e6
+            print(f"{name:>13} {len(indices):6d} {megabytes:7.1f} {1e3 * pickled_time:8.1f} "
+                  f"{1e3 * shared_time:8.1f} {pickled_time / shared_time:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Compare weighted and unweighted fits of the focus curve
+
+Synthetic focus sweeps with a different noise level in every frame are fitted
+by `GoodmanFocus._fit` with and without the FWHM uncertainties. For every
+number of frames per sweep the median and 90th percentile of the absolute
+error of the best focus are reported. The time per frame of `get_fwhm` on a
+profile with many lines is compared with the time spent propagating the
+covariance of every line to its FWHM uncertainty.
+
+Usage::
+
+    python benchmarks/bench_weighted_fit.py [--repeat N] [--sweeps N]
+
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas
+
+from astropy.modeling import fitting, models
+
+from goodman_focus.goodman_focus import GoodmanFocus, _get_fwhm_error, get_fwhm
+
+BEST_FOCUS = 150.
+FOCUS_RANGE = (-1500., 1500.)
+
+
+def get_sweep(number_of_frames, generator):
+    """FWHM of a sweep with a noise level drawn independently for every frame"""
+    focus = np.linspace(*FOCUS_RANGE, number_of_frames) + generator.uniform(-50, 50)
+    fwhm = np.sqrt(3. ** 2 + (4e-3 * (focus - BEST_FOCUS)) ** 2)
+    fwhm_error = 0.03 * fwhm * generator.lognormal(0, 1, number_of_frames)
+    return pandas.DataFrame({'file': [f"frame_{index:02d}.fits" for index in range(number_of_frames)],
+                             'fwhm': fwhm + generator.normal(0, fwhm_error),
+                             'focus': focus,
+                             'fwhm_error': fwhm_error})
+
+
+def get_focus_errors(goodman_focus, number_of_frames, sweeps, weighted, seed=0):
+    generator = np.random.default_rng(seed)
+    errors = []
+    for _ in range(sweeps):
+        sweep = get_sweep(number_of_frames=number_of_frames, generator=generator)
+        if not weighted:
+            sweep = sweep.drop(columns='fwhm_error')
+        goodman_focus._fit(df=sweep)
+        errors.append(abs(goodman_focus._GoodmanFocus__best_focus - BEST_FOCUS))
+    return np.array(errors)
+
+
+def get_profile(number_of_lines=40, length=4096, seed=0):
+    generator = np.random.default_rng(seed)
+    x_axis = np.arange(length)
+    peaks = np.linspace(50, length - 50, number_of_lines)
+    values = generator.uniform(1000, 5000, number_of_lines)
+    profile = generator.normal(0, 10, length)
+    for peak, value in zip(peaks, values):
+        profile += models.Gaussian1D(amplitude=value, mean=peak, stddev=2.)(x_axis)
+    return peaks, values, x_axis, profile
+
+
+def get_times(repeat):
+    """Best time of `get_fwhm` and of the uncertainties of all its lines"""
+    peaks, values, x_axis, profile = get_profile()
+    fitter = fitting.LevMarLSQFitter()
+    model = fitter(models.Gaussian1D(amplitude=values[0], mean=peaks[0], stddev=5.), x_axis, profile)
+    covariance = fitter.fit_info['param_cov']
+    fwhm_timings = []
+    error_timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        get_fwhm(peaks=peaks, values=values, x_axis=x_axis, profile=profile, model=models.Gaussian1D())
+        fwhm_timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in range(len(peaks)):
+            _get_fwhm_error(model=model, covariance=covariance)
+        error_timings.append(time.perf_counter() - start)
+    return min(fwhm_timings), min(error_timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs of get_fwhm')
+    parser.add_argument('--sweeps', type=int, default=300, help='Number of sweeps per case')
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    goodman_focus = GoodmanFocus()
+    print(f"{'frames':>7} {'fit':>10} {'median error':>13} {'p90 error':>10}")
+    for number_of_frames in [7, 9, 11, 15]:
+        for label, weighted in [('unweighted', False), ('weighted', True)]:
+            errors = get_focus_errors(goodman_focus=goodman_focus,
+                                      number_of_frames=number_of_frames,
+                                      sweeps=args.sweeps,
+                                      weighted=weighted)
+            print(f"{number_of_frames:7d} {label:>10} {np.median(errors):13.1f} {np.percentile(errors, 90):10.1f}")
+
+    fwhm_time, error_time = get_times(repeat=args.repeat)
+    print(f"get_fwhm: {1e3 * fwhm_time:.1f} ms per frame, of which {1e3 * error_time:.2f} ms "
+          f"are spent on the uncertainties")
+
+
+if __name__ == '__main__':
+    main()
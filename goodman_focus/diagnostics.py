@@ -0,0 +1,157 @@
+import numpy as np
+import os
+
+from .plotting import PlotRenderer
+
+import logging
+
+
+log = logging.getLogger(__name__)
+
+
+class DiagnosticsRecorder(object):
+    """Collect the intermediate results of every frame in compact arrays
+
+    Functions accepting a `recorder` argument store their intermediate
+    results only when one is provided, so there is no cost when diagnostics
+    are disabled. The recorded frames can be saved to a single `.npz` bundle
+    and loaded back later to inspect or plot them without processing the data
+    again.
+
+    Floating point arrays are stored as `float32`.
+
+    """
+
+    def __init__(self):
+        self.frames = []
+
+    def __len__(self):
+        return len(self.frames)
+
+    def start_frame(self, file_name):
+        """Start recording a new frame
+
+        Args:
+            file_name (str): Name of the file being processed.
+
+        """
+        self.frames.append({'file_name': np.array(file_name)})
+
+    def record(self, **values):
+        """Store arrays or scalars in the current frame
+
+        Args:
+            **values: Name and value of every item to store.
+
+        """
+        if not self.frames:
+            self.start_frame(file_name='')
+        frame = self.frames[-1]
+        for name, value in values.items():
+            value = np.ma.getdata(value) if np.ma.isMaskedArray(value) else np.asarray(value)
+            if value.dtype.kind == 'f':
+                value = value.astype(np.float32)
+            frame[name] = value
+
+    def frame(self, index):
+        """Get the recorded values of a frame as a dictionary"""
+        return self.frames[index]
+
+    def save(self, path):
+        """Save every frame to a compressed `.npz` file
+
+        Each item is concatenated across frames and stored together with the
+        offsets needed to split it again.
+
+        Args:
+            path (str): Destination file.
+
+        """
+        names = sorted(set(name for frame in self.frames for name in frame))
+        bundle = {'number_of_frames': np.array(len(self.frames))}
+        for name in names:
+            values = [np.atleast_1d(frame[name]) if name in frame else None for frame in self.frames]
+            present = [value for value in values if value is not None]
+            lengths = [len(value) if value is not None else -1 for value in values]
+            bundle[f"{name}__data"] = np.concatenate(present)
+            bundle[f"{name}__lengths"] = np.array(lengths)
+            bundle[f"{name}__scalar"] = np.array(all(np.ndim(frame[name]) == 0
+                                                     for frame in self.frames if name in frame))
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        np.savez_compressed(path, **bundle)
+        log.info(f"Saved diagnostics of {len(self.frames)} frames to {path}")
+
+    @classmethod
+    def load(cls, path):
+        """Load a bundle written by `save`
+
+        Args:
+            path (str): Location of the `.npz` file.
+
+        Returns:
+            A `DiagnosticsRecorder` with all the recorded frames.
+
+        """
+        recorder = cls()
+        with np.load(path) as bundle:
+            number_of_frames = int(bundle['number_of_frames'])
+            recorder.frames = [{} for _ in range(number_of_frames)]
+            names = [key[:-len('__data')] for key in bundle.files if key.endswith('__data')]
+            for name in names:
+                data = bundle[f"{name}__data"]
+                lengths = bundle[f"{name}__lengths"]
+                scalar = bool(bundle[f"{name}__scalar"])
+                start = 0
+                for index, length in enumerate(lengths):
+                    if length < 0:
+                        continue
+                    value = data[start:start + length]
+                    recorder.frames[index][name] = value[0] if scalar else value
+                    start += length
+        return recorder
+
+    def get_profile_plot_arguments(self, index):
+        """Rebuild the arguments of `plotting.draw_profile` for a frame
+
+        Returns:
+            A dictionary of arguments or `None` if the profile of the frame was
+            not recorded.
+
+        """
+        frame = self.frames[index]
+        if 'raw_profile' not in frame:
+            return None
+        raw_profile = frame['raw_profile']
+        x_axis = np.arange(len(raw_profile))
+        fitted_background = frame['background_slope'] * x_axis + frame['background_intercept']
+        threshold = frame.get('threshold', np.nan)
+        return {'title': f"{frame['file_name']}",
+                'x_axis': x_axis,
+                'raw_profile': raw_profile,
+                'clipped_profile': np.ma.masked_array(raw_profile, mask=frame['clipped_mask']),
+                'initial_background': np.full(len(x_axis), frame['initial_background']),
+                'fitted_background': fitted_background,
+                'profile': raw_profile - fitted_background,
+                'threshold': threshold,
+                'threshold_label': 'Peak Selection Threshold',
+                'peaks': list(frame.get('accepted_peaks', []))}
+
+    def plot(self, output_dir, formats=('png',), workers=0):
+        """Write a profile plot for every recorded frame
+
+        Args:
+            output_dir (str): Directory where plots are written.
+            formats (tuple): File formats.
+            workers (int): Number of worker processes, see `PlotRenderer`.
+
+        Returns:
+            A list of the files written.
+
+        """
+        renderer = PlotRenderer(output_dir=output_dir, formats=formats, workers=workers)
+        for index, frame in enumerate(self.frames):
+            plot_arguments = self.get_profile_plot_arguments(index=index)
+            if plot_arguments is not None:
+                renderer.plot_profile(file_name=str(frame['file_name']), **plot_arguments)
+        return renderer.close()
@@ -0,0 +1,396 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import secrets
+import threading
+import time
+import uuid
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.managers import BaseManager
+
+import logging
+
+
+log = logging.getLogger(__name__)
+
+AUTHKEY_VARIABLE = 'GOODMAN_FOCUS_AUTHKEY'
+DEFAULT_TIMEOUT = 600
+_POLL_INTERVAL = 0.1
+
+
+class Executor(object):
+    """Interface used to run the tasks of `GoodmanFocus`
+
+    An executor applies a function to a list of tasks and returns the results
+    in the same order. Functions must be defined at module level and tasks
+    should be small, file names and parameters rather than data, so they are
+    cheap to send to other processes or nodes.
+
+    `local` tells whether every worker runs on this host, in which case tasks
+    may refer to shared memory.
+
+    """
+
+    workers = 1
+    local = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def map(self, function, tasks):
+        """Apply `function` to every task
+
+        Args:
+            function (callable): Module level function.
+            tasks (list): Each element is a tuple of positional arguments.
+
+        Returns:
+            A list with the result of every task.
+
+        """
+        raise NotImplementedError
+
+    async def amap(self, function, tasks):
+        """Apply `function` to every task without blocking the event loop
+
+        By default `map` runs in the default executor of the running loop, so
+        cancelling the coroutine stops waiting for the results but does not
+        stop the tasks already sent.
+
+        Args:
+            function (callable): Module level function.
+            tasks (list): Each element is a tuple of positional arguments.
+
+        Returns:
+            A list with the result of every task.
+
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.map, function, tasks)
+
+    def close(self):
+        """Release the resources used by the executor"""
+        pass
+
+
+class SerialExecutor(Executor):
+    """Run every task in the calling thread"""
+
+    def map(self, function, tasks):
+        return [function(*task) for task in tasks]
+
+    async def amap(self, function, tasks):
+        """Run one task at a time in the default executor of the running loop
+
+        Cancellation takes effect before the next task is started.
+        """
+        loop = asyncio.get_running_loop()
+        results = []
+        for task in tasks:
+            results.append(await loop.run_in_executor(None, function, *task))
+        return results
+
+
+class _PoolExecutor(Executor):
+
+    pool_class = None
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = self.pool_class(max_workers=self.workers)
+        return self._pool
+
+    def map(self, function, tasks):
+        pool = self._get_pool()
+        futures = [pool.submit(function, *task) for task in tasks]
+        return [future.result() for future in futures]
+
+    async def amap(self, function, tasks):
+        """Submit every task to the pool and await their results
+
+        Tasks that have not started are cancelled when the coroutine is
+        cancelled or any task fails.
+        """
+        pool = self._get_pool()
+        futures = [asyncio.wrap_future(pool.submit(function, *task)) for task in tasks]
+        try:
+            return list(await asyncio.gather(*futures))
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+class ThreadExecutor(_PoolExecutor):
+    """Run tasks in a pool of threads
+
+    Args:
+        workers (int): Number of threads. Default is the number of CPUs.
+
+    """
+
+    pool_class = ThreadPoolExecutor
+
+
+class ProcessExecutor(_PoolExecutor):
+    """Run tasks in a pool of processes
+
+    Args:
+        workers (int): Number of processes. Default is the number of CPUs.
+
+    """
+
+    pool_class = ProcessPoolExecutor
+
+
+_task_queue = queue.Queue()
+_result_queue = queue.Queue()
+
+
+def _get_task_queue():
+    return _task_queue
+
+
+def _get_result_queue():
+    return _result_queue
+
+
+class _QueueManager(BaseManager):
+    pass
+
+
+_QueueManager.register('get_task_queue', callable=_get_task_queue)
+_QueueManager.register('get_result_queue', callable=_get_result_queue)
+
+
+def get_authkey():
+    """Authentication key from `$GOODMAN_FOCUS_AUTHKEY`, `None` when it is not set"""
+    authkey = os.environ.get(AUTHKEY_VARIABLE, '')
+    return authkey.encode() if authkey else None
+
+
+def run_worker(address, authkey):
+    """Process tasks from a `DistributedExecutor` until it is closed
+
+    Args:
+        address (tuple): Host and port of the executor.
+        authkey (bytes): Authentication key shared with the executor.
+
+    Returns:
+        The number of tasks processed.
+
+    """
+    manager = _QueueManager(address=tuple(address), authkey=authkey)
+    manager.connect()
+    tasks = manager.get_task_queue()
+    results = manager.get_result_queue()
+    processed = 0
+    while True:
+        try:
+            task = tasks.get()
+        except (EOFError, OSError):
+            log.info("Executor is no longer available")
+            break
+        if task is None:
+            break
+        job_id, index, function, arguments = task
+        try:
+            results.put((job_id, index, True, function(*arguments)))
+        except Exception as error:
+            results.put((job_id, index, False, error))
+        processed += 1
+    return processed
+
+
+class DistributedExecutor(Executor):
+    """Send tasks to worker processes through a network queue
+
+    The queues are served by a `multiprocessing.managers.BaseManager`, and
+    workers on any node connect to `address` using `run_worker` or
+    `goodman-focus-worker HOST:PORT`. All nodes must see the data
+    at the same path.
+
+    Several threads may call `map` at the same time. Only one of them reads
+    the result queue at a time and stores every result under the job it
+    belongs to, where the thread waiting for that job picks it up.
+
+    Tasks are pickled, so anyone who knows the authentication key can run
+    code in the executor and the workers. Without `authkey` it is read from
+    `$GOODMAN_FOCUS_AUTHKEY` or, when it is not set, a random key is
+    generated and logged so it can be given to the remote workers.
+
+    Args:
+        address (tuple): Host and port to listen on, port `0` picks a free one.
+          The actual address is available as the `address` attribute.
+        authkey (bytes): Authentication key shared with the workers.
+        workers (int): Number of worker processes to start on this host.
+        timeout (float): Maximum time in seconds to wait for each result,
+          `None` waits forever.
+
+    """
+
+    local = False
+
+    def __init__(self, address=('127.0.0.1', 0), authkey=None, workers=0, timeout=DEFAULT_TIMEOUT):
+        authkey = authkey or get_authkey()
+        generated = authkey is None
+        if generated:
+            authkey = secrets.token_hex(32).encode()
+        self.authkey = authkey
+        self.workers = workers
+        self.timeout = timeout
+        self._manager = _QueueManager(address=tuple(address), authkey=authkey)
+        self._manager.start()
+        self.address = self._manager.address
+        self._tasks = self._manager.get_task_queue()
+        self._results = self._manager.get_result_queue()
+        self._received = {}
+        self._condition = threading.Condition()
+        self._reader = threading.Lock()
+        self._processes = []
+        for _ in range(self.workers):
+            process = multiprocessing.Process(target=run_worker, args=(self.address, self.authkey), daemon=True)
+            process.start()
+            self._processes.append(process)
+        log.debug(f"Distributed executor listening on {self.address} with {self.workers} local workers")
+        if generated:
+            log.info(f"Start remote workers with {AUTHKEY_VARIABLE}={self.authkey.decode()} "
+                     f"goodman-focus-worker {self.address[0]}:{self.address[1]}")
+
+    def map(self, function, tasks):
+        job_id = uuid.uuid4().hex
+        with self._condition:
+            self._received[job_id] = {}
+        for index, task in enumerate(tasks):
+            self._tasks.put((job_id, index, function, tuple(task)))
+        try:
+            return self._collect(job_id=job_id, number_of_tasks=len(tasks))
+        finally:
+            with self._condition:
+                self._received.pop(job_id, None)
+
+    def _read_result(self):
+        """Move one result from the queue to the job it belongs to"""
+        try:
+            result_job_id, index, success, result = self._results.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            return
+        with self._condition:
+            if result_job_id in self._received:
+                self._received[result_job_id][index] = (success, result)
+            self._condition.notify_all()
+
+    def _collect(self, job_id, number_of_tasks):
+        """Wait for every result of a job, reading the queue when no other thread does"""
+        received = self._received[job_id]
+        last_count = 0
+        last_result = time.monotonic()
+        while True:
+            with self._condition:
+                count = len(received)
+                failures = [result for success, result in received.values() if not success]
+            if failures:
+                raise failures[0]
+            if count == number_of_tasks:
+                return [received[index][1] for index in range(number_of_tasks)]
+            if count > last_count:
+                last_count = count
+                last_result = time.monotonic()
+            elif self.timeout is not None and time.monotonic() - last_result > self.timeout:
+                raise TimeoutError(f"No result received in {self.timeout} seconds, "
+                                   f"{number_of_tasks - count} tasks pending. "
+                                   f"Check that workers are connected to {self.address} with the "
+                                   f"same authentication key")
+            if self._reader.acquire(blocking=False):
+                try:
+                    self._read_result()
+                finally:
+                    self._reader.release()
+            else:
+                with self._condition:
+                    self._condition.wait(timeout=_POLL_INTERVAL)
+
+    def close(self):
+        """Stop the local workers and the queue server"""
+        if self._manager is None:
+            return
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join()
+        self._processes = []
+        self._manager.shutdown()
+        self._manager = None
+
+
+def get_executor(name='serial', workers=None, address=('127.0.0.1', 0), authkey=None):
+    """Create an executor by name
+
+    Args:
+        name (str): One of `serial`, `thread`, `process` or `distributed`.
+        workers (int): Number of workers, for `distributed` these are the
+          workers started on this host.
+        address (tuple): Address of the `distributed` executor.
+        authkey (bytes): Authentication key of the `distributed` executor,
+          see `DistributedExecutor`.
+
+    Returns:
+        An `Executor` instance.
+
+    """
+    if name == 'serial':
+        return SerialExecutor()
+    elif name == 'thread':
+        return ThreadExecutor(workers=workers)
+    elif name == 'process':
+        return ProcessExecutor(workers=workers)
+    elif name == 'distributed':
+        return DistributedExecutor(address=address,
+                                   authkey=authkey,
+                                   workers=workers if workers is not None else os.cpu_count() or 1)
+    raise ValueError(f"Unknown executor: {name}")
+
+
+def parse_address(address):
+    """Convert a `HOST:PORT` string to a tuple"""
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+def run_distributed_worker(arguments=None):   # pragma: no cover
+    """Entrypoint for workers of a `DistributedExecutor`
+
+    Args:
+        arguments (list): (optional) a list of arguments and respective values.
+
+    """
+    parser = argparse.ArgumentParser(description="Process Goodman Focus tasks from a distributed executor")
+    parser.add_argument('address', help='HOST:PORT of the executor')
+    parser.add_argument('--authkey',
+                        default=os.environ.get(AUTHKEY_VARIABLE, None),
+                        help=f"Authentication key logged by the executor. Default: ${AUTHKEY_VARIABLE}")
+    args = parser.parse_args(args=arguments)
+    if not args.authkey:
+        parser.error(f"The authentication key is required, use --authkey or set ${AUTHKEY_VARIABLE}")
+
+    logging.basicConfig(level=logging.INFO)
+    processed = run_worker(address=parse_address(args.address), authkey=args.authkey.encode())
+    log.info(f"Processed {processed} tasks")
+
+
+if __name__ == '__main__':   # pragma: no cover
+    run_distributed_worker()
@@ -1,21 +1,33 @@
 import argparse
-import glob
+import asyncio
 import json
 import matplotlib.pyplot as plt
 import numpy as np
 import os
 import pandas
 import re
+import sqlite3
 import sys
+import time
 
-from astropy.io import fits
 from astropy.stats import sigma_clip
+from astropy.stats import gaussian_fwhm_to_sigma, gaussian_sigma_to_fwhm
 from astropy.modeling import models, fitting
 from ccdproc import CCDData
-from ccdproc import ImageFileCollection
 from scipy import optimize
 from scipy import signal
 
+from .diagnostics import DiagnosticsRecorder
+from .executors import SerialExecutor, get_executor, parse_address
+from .history import DEFAULT_HISTORY_PATH, TEMPERATURE_KEYWORD, FocusHistory
+from .index import HeaderIndex
+from .parameters import DEFAULT_PARAMETERS, get_extraction_parameters
+from .plotting import PlotRenderer, draw_focus, draw_profile
+from .readers import DEFAULT_FILE_PATTERN, find_files, read_focus_frame, read_focus_header
+from .results import FocusMeasurements, FocusResult
+from .shared_profiles import SharedProfileStore
+from .templates import DEFAULT_TEMPLATE_PATH, LineTemplateStore
+
 import logging
 import logging.config
 
@@ -38,8 +50,10 @@ def get_args(arguments=None):
     parser.add_argument('--file-pattern',
                         action='store',
                         dest='file_pattern',
-                        default='*.fits',
-                        help='Pattern for filtering files.')
+                        default=DEFAULT_FILE_PATTERN,
+                        help='Pattern for filtering files, several patterns '
+                             'can be separated by commas. Default: '
+                             f'{DEFAULT_FILE_PATTERN}')
 
     parser.add_argument('--obstype',
                         action='store',
@@ -69,6 +83,133 @@ def get_args(arguments=None):
                         help='Threshold as a factor of spectral profile standard deviation '
                              'after background subtraction.')
 
+    parser.add_argument('--track-lines',
+                        action='store_true',
+                        dest='track_lines',
+                        help='Track lines from one focus value to the next using '
+                             'the previous fit as initial values.')
+
+    parser.add_argument('--per-line-focus',
+                        action='store_true',
+                        dest='per_line_focus',
+                        help='Fit a focus curve for every line to obtain the '
+                             'best focus along the dispersion axis. Implies '
+                             '--track-lines.')
+
+    parser.add_argument('--line-templates',
+                        action='store',
+                        dest='line_templates',
+                        nargs='?',
+                        const=DEFAULT_TEMPLATE_PATH,
+                        default=None,
+                        help='Use and update stored line positions for '
+                             'spectroscopic modes. Optionally, the path to the '
+                             f'templates file. Default: {DEFAULT_TEMPLATE_PATH}. '
+                             'Implies --track-lines.')
+
+    parser.add_argument('--plot-dir',
+                        action='store',
+                        dest='plot_dir',
+                        default=None,
+                        help='Write the plots of --plot-results and --debug to '
+                             'files in this folder instead of showing them.')
+
+    parser.add_argument('--plot-format',
+                        action='append',
+                        dest='plot_formats',
+                        choices=['png', 'pdf'],
+                        help='File format of the plots written to --plot-dir. '
+                             'Can be used more than once. Default: png')
+
+    parser.add_argument('--diagnostics',
+                        action='store',
+                        dest='diagnostics',
+                        default=None,
+                        help='Save the profiles, peaks and fitted lines of every '
+                             'file to this .npz file for later inspection.')
+
+    parser.add_argument('--use-index',
+                        action='store_true',
+                        dest='use_index',
+                        help='Keep an index of the header keywords so that only '
+                             'new or modified files are read on the next run.')
+
+    parser.add_argument('--index-path',
+                        action='store',
+                        dest='index_path',
+                        default=None,
+                        help='Location of the index file used by --use-index. '
+                             'Default: .goodman_focus_index.json in --data-path')
+
+    parser.add_argument('--coarse-to-fine',
+                        action='store_true',
+                        dest='coarse_to_fine',
+                        help='Analyse a few frames spread over the focus range '
+                             'first and then only the frames around the '
+                             'provisional best focus.')
+
+    parser.add_argument('--focus-tolerance',
+                        action='store',
+                        dest='focus_tolerance',
+                        type=float,
+                        default=50,
+                        help='Stop --coarse-to-fine when the best focus is '
+                             'bracketed within this many focus units. '
+                             'Default: 50')
+
+    parser.add_argument('--precision',
+                        action='store',
+                        dest='precision',
+                        choices=['float64', 'float32'],
+                        default='float64',
+                        help='Floating point precision of the data and profiles. '
+                             'Fits are always done in float64. Default: float64')
+
+    parser.add_argument('--no-imaging-fast-path',
+                        action='store_false',
+                        dest='imaging_fast_path',
+                        help='Use the same peak detection and fitting for '
+                             'imaging frames as for spectroscopic ones instead '
+                             'of fitting only the slit.')
+
+    parser.add_argument('--executor',
+                        action='store',
+                        dest='executor',
+                        choices=['serial', 'thread', 'process', 'distributed'],
+                        default=None,
+                        help='Process focus groups, or the files of a single '
+                             'group, in parallel. The distributed executor '
+                             'accepts workers started with goodman-focus-worker.')
+
+    parser.add_argument('--workers',
+                        action='store',
+                        dest='workers',
+                        type=int,
+                        default=None,
+                        help='Number of workers of --executor. For the '
+                             'distributed executor these are started on this '
+                             'host. Default: number of CPUs.')
+
+    parser.add_argument('--executor-address',
+                        action='store',
+                        dest='executor_address',
+                        default='127.0.0.1:0',
+                        help='HOST:PORT where the distributed executor listens. '
+                             'The authentication key is read from '
+                             '$GOODMAN_FOCUS_AUTHKEY, otherwise a random key '
+                             'is generated and logged.')
+
+    parser.add_argument('--history',
+                        action='store',
+                        dest='history',
+                        nargs='?',
+                        const=DEFAULT_HISTORY_PATH,
+                        default=None,
+                        help='Store the results in a database of best focus '
+                             'per mode, used by goodman-focus-history to '
+                             'predict the best focus. Optionally, the path to '
+                             f'the database. Default: {DEFAULT_HISTORY_PATH}')
+
     parser.add_argument('--debug',
                         action='store_true',
                         dest='debug',
@@ -99,41 +240,45 @@ def clean_clipped_profile(clipped_profile: np.ma.MaskedArray):
     return clipped_x_axis, cleaned_profile
 
 
-def get_peaks(ccd: CCDData,
-              file_name: str = '',
-              split_size_for_low_snr_data: int = 10,
-              threshold_for_selecting_peaks: float = 2,
-              plots: bool = False):
-    """Identify peaks in an image
+def _extract_profile(ccd: CCDData,
+                     split_size_for_low_snr_data: int = 10,
+                     recorder=None,
+                     dtype=None,
+                     parameters=None):
+    """Extract the spectral profile from the central band and subtract its background
 
-    For Imaging and Spectroscopy the images obtained for focusing have lines
-    that in the first case is an image of the slit and for the second is the
-    spectrum of lamp, strategically selected for a good coverage of lines across
-    the detector.
+    The background fit is always done in `float64`, the profiles keep the
+    type of the median of the central band unless `dtype` is given.
 
     Args:
-        ccd (CCDData): Image to get peaks from
-        file_name (str): Name of the file used. This is optional and is used
-          only for debugging purposes.
-        split_size_for_low_snr_data (int): When the data has low signal-to-noise ratio is required
-          to split the spectral profile in this number of parts. Default: 10
-        threshold_for_selecting_peaks (float): Factor of spectral profile's standard deviation to
-          discriminate peaks.
-        plots (bool): Show plots of the profile, background and
-          background-subtracted profile
+        ccd (CCDData): Image to extract the profile from.
+        split_size_for_low_snr_data (int): Number of parts to split the profile
+          into when the data has low signal-to-noise ratio.
+        recorder (DiagnosticsRecorder): Optional recorder of intermediate
+          results.
+        dtype (numpy.dtype): Floating point type of the profiles, for instance
+          `numpy.float32`. Floating point data is converted before the median,
+          integer data after it.
+        parameters (ExtractionParameters): Height of the central band. Default
+          `DEFAULT_PARAMETERS`.
 
     Returns:
-        A list of peak values, peak intensities as well as the x-axis and the
-        background subtracted spectral profile. For Imaging is the same axis as
-        the spectral axis.
+        The x-axis, raw profile, clipped profile, initial and fitted background
+        models and the background subtracted profile.
 
     """
+    parameters = parameters or DEFAULT_PARAMETERS
     width, length = ccd.data.shape
 
-    low_limit = int(width / 2 - 50)
-    high_limit = int(width / 2 + 50)
+    low_limit = int(width / 2 - parameters.band_half_width)
+    high_limit = int(width / 2 + parameters.band_half_width)
 
-    raw_profile = np.median(ccd.data[low_limit:high_limit, :], axis=0)
+    band = ccd.data[low_limit:high_limit, :]
+    if dtype is not None and band.dtype.kind == 'f':
+        band = band.astype(dtype, copy=False)
+    raw_profile = np.median(band, axis=0)
+    if dtype is not None:
+        raw_profile = raw_profile.astype(dtype, copy=False)
     x_axis = np.array(range(len(raw_profile)))
 
     clipped_profile = sigma_clip(raw_profile, sigma=1, maxiters=5)
@@ -158,58 +303,188 @@ def get_peaks(ccd: CCDData,
 
     fitted_background = fitter(background_model,
                                clipped_x_axis,
-                               cleaned_profile)
+                               np.asarray(cleaned_profile, dtype=float))
+
+    profile = raw_profile - np.array(fitted_background(x_axis), dtype=raw_profile.dtype)
 
-    profile = raw_profile - np.array(fitted_background(x_axis))
+    if recorder is not None:
+        recorder.record(raw_profile=raw_profile,
+                        clipped_mask=np.ma.getmaskarray(clipped_profile),
+                        initial_background=background_model.intercept.value,
+                        background_slope=fitted_background.slope.value,
+                        background_intercept=fitted_background.intercept.value)
 
-    filtered_data = np.where(
-        np.abs(profile > profile.min() + 0.03 * profile.max()), profile,
-        None)
-    filtered_data = np.array(
-        [0 if it is None else it for it in filtered_data])
+    return x_axis, raw_profile, clipped_profile, background_model, fitted_background, profile
 
-    peaks = signal.argrelmax(filtered_data, axis=0, order=5)[0]
-    log.debug(f"Found {len(peaks)} peaks in file")
+
+def _find_peaks(profile: np.ndarray, threshold_for_selecting_peaks: float = 2, recorder=None, parameters=None):
+    """Detect peaks on a background subtracted profile
+
+    Args:
+        profile (numpy.ndarray): Background subtracted profile.
+        threshold_for_selecting_peaks (float): Factor of the profile's standard
+          deviation to discriminate peaks.
+        recorder (DiagnosticsRecorder): Optional recorder of intermediate
+          results.
+        parameters (ExtractionParameters): Peak separation and floor. Default
+          `DEFAULT_PARAMETERS`.
+
+    Returns:
+        A list of peak locations, an array of values at the peaks and the
+        standard deviation of the profile.
+
+    """
+    parameters = parameters or DEFAULT_PARAMETERS
+    filtered_data = np.where(profile > profile.min() + parameters.floor_fraction * profile.max(), profile, 0)
+
+    candidate_peaks = signal.argrelmax(filtered_data, axis=0, order=parameters.peak_order)[0]
+    log.debug("Found %s peaks in file", len(candidate_peaks))
 
     cleaned_profile_stddev = np.std(profile)
-    log.debug(f"Standard deviation of spectral profile after subtracting "
-              f"background is: {cleaned_profile_stddev}")
+    log.debug("Standard deviation of spectral profile after subtracting "
+              "background is: %s", cleaned_profile_stddev)
 
-    peaks = [i for i in peaks if profile[int(i)] > threshold_for_selecting_peaks * cleaned_profile_stddev]
-    log.debug(f"Peaks below {threshold_for_selecting_peaks * cleaned_profile_stddev} rejected. "
-              f"Update threshold to updated, current value is "
-              f"{threshold_for_selecting_peaks} standard deviation.")
-    log.debug(f"{len(peaks)} peaks remaining after cleaning.")
+    threshold = threshold_for_selecting_peaks * cleaned_profile_stddev
+    peaks = [i for i in candidate_peaks if profile[int(i)] > threshold]
+    log.debug("Peaks below %s rejected. Update threshold to updated, current value is "
+              "%s standard deviation.", threshold, threshold_for_selecting_peaks)
+    log.debug("%s peaks remaining after cleaning.", len(peaks))
 
     values = np.array([profile[int(index)] for index in peaks])
 
-    if plots:   # pragma: no cover
-        plt.title(f"{file_name} {np.mean(clipped_profile)}")
-        plt.axhline(0, color='k', label='Zero')
-        plt.axhline(threshold_for_selecting_peaks * cleaned_profile_stddev, color='g',
-                    label=f"{threshold_for_selecting_peaks} Cleaned Profile STD")
-        plt.plot(x_axis, raw_profile, label='Raw Profile')
-        plt.plot(x_axis, clipped_profile, label='Clipped Profile')
-        plt.plot(x_axis, background_model(x_axis),
-                 label='Initial Background Model')
-        plt.plot(x_axis, fitted_background(x_axis), label='Fitted Background Level')
-        plt.plot(x_axis, profile, label='Background Subtracted Profile')
-        # plt.plot(x_axis, filtered_data, label="Filtered Data")
-        for _peak in peaks:
-            plt.axvline(_peak, color='k', alpha=0.6)
-        plt.legend(loc='best')
-        plt.show()
+    if recorder is not None:
+        recorder.record(candidate_peaks=candidate_peaks,
+                        accepted_peaks=np.array(peaks, dtype=int),
+                        threshold=threshold)
+
+    return peaks, values, cleaned_profile_stddev
+
+
+def get_profile(ccd: CCDData, split_size_for_low_snr_data: int = 10, recorder=None, dtype=None, parameters=None):
+    """Get the background subtracted spectral profile of an image
+
+    This is the same profile `get_peaks` works on, without the peak detection.
+
+    Args:
+        ccd (CCDData): Image to get the profile from.
+        split_size_for_low_snr_data (int): When the data has low signal-to-noise ratio is required
+          to split the spectral profile in this number of parts. Default: 10
+        recorder (DiagnosticsRecorder): Optional recorder of intermediate
+          results.
+        dtype (numpy.dtype): Floating point type of the profile, see
+          `get_peaks`.
+        parameters (ExtractionParameters): See `get_peaks`.
+
+    Returns:
+        The x-axis and the background subtracted spectral profile.
+
+    """
+    x_axis, _, _, _, _, profile = _extract_profile(
+        ccd=ccd,
+        split_size_for_low_snr_data=split_size_for_low_snr_data,
+        recorder=recorder,
+        dtype=dtype,
+        parameters=parameters)
+    return x_axis, profile
+
+
+def get_peaks(ccd: CCDData,
+              file_name: str = '',
+              split_size_for_low_snr_data: int = 10,
+              threshold_for_selecting_peaks: float = 2,
+              plots: bool = False,
+              renderer: PlotRenderer = None,
+              recorder: DiagnosticsRecorder = None,
+              dtype=None,
+              parameters=None):
+    """Identify peaks in an image
+
+    For Imaging and Spectroscopy the images obtained for focusing have lines
+    that in the first case is an image of the slit and for the second is the
+    spectrum of lamp, strategically selected for a good coverage of lines across
+    the detector.
+
+    Args:
+        ccd (CCDData): Image to get peaks from
+        file_name (str): Name of the file used. This is optional and is used
+          only for debugging purposes.
+        split_size_for_low_snr_data (int): When the data has low signal-to-noise ratio is required
+          to split the spectral profile in this number of parts. Default: 10
+        threshold_for_selecting_peaks (float): Factor of spectral profile's standard deviation to
+          discriminate peaks.
+        plots (bool): Show plots of the profile, background and
+          background-subtracted profile
+        renderer (PlotRenderer): If provided, plots are written to files by
+          the renderer instead of being shown.
+        recorder (DiagnosticsRecorder): If provided, the profile, background
+          and detected peaks are stored in it.
+        dtype (numpy.dtype): Floating point type of the profiles, `numpy.float32`
+          halves the memory used by the central band and the profiles. Fits are
+          always done in `float64`. Default is `float64` for integer or double
+          precision data.
+        parameters (ExtractionParameters): Band height, peak separation and
+          floor, usually obtained once per focus group with
+          `get_extraction_parameters`. Default `DEFAULT_PARAMETERS`.
+
+    Returns:
+        A list of peak values, peak intensities as well as the x-axis and the
+        background subtracted spectral profile. For Imaging is the same axis as
+        the spectral axis.
+
+    """
+    x_axis, raw_profile, clipped_profile, background_model, fitted_background, profile = _extract_profile(
+        ccd=ccd,
+        split_size_for_low_snr_data=split_size_for_low_snr_data,
+        recorder=recorder,
+        dtype=dtype,
+        parameters=parameters)
+
+    peaks, values, cleaned_profile_stddev = _find_peaks(
+        profile=profile,
+        threshold_for_selecting_peaks=threshold_for_selecting_peaks,
+        recorder=recorder,
+        parameters=parameters)
+
+    if plots:
+        plot_arguments = {'title': f"{file_name} {np.mean(clipped_profile)}",
+                          'x_axis': x_axis,
+                          'raw_profile': raw_profile,
+                          'clipped_profile': clipped_profile,
+                          'initial_background': background_model(x_axis),
+                          'fitted_background': fitted_background(x_axis),
+                          'profile': profile,
+                          'threshold': threshold_for_selecting_peaks * cleaned_profile_stddev,
+                          'threshold_label': f"{threshold_for_selecting_peaks} Cleaned Profile STD",
+                          'peaks': list(peaks)}
+        if renderer is not None:
+            renderer.plot_profile(file_name=file_name, **plot_arguments)
+        else:   # pragma: no cover
+            fig, ax = plt.subplots()
+            draw_profile(ax, **plot_arguments)
+            plt.show()
 
     return peaks, values, x_axis, profile
 
 
-def get_fwhm(peaks, values, x_axis, profile, model, sigma=1, maxiter=3):
+def get_fwhm(peaks,
+             values,
+             x_axis,
+             profile,
+             model,
+             sigma=1,
+             maxiter=3,
+             recorder=None,
+             executor=None,
+             parameters=None,
+             return_error=False):
     """Finds FWHM for an image by fitting a model
 
     For Imaging there is only one peak (the slit itself) but for spectroscopy
     there are many. In that case a 3-sigma clipping 1-iteration is applied to
     clean the values and then the mean is returned. In case that a FWHM can't be
-    obtained a `None` value is returned.
+    obtained a `None` value is returned. The uncertainty of the FWHM of every
+    line is obtained from the covariance of its fit, see `_clip_fwhm` for how
+    they are combined.
 
     This function allows the use of `Gaussian1D` and `Moffat1D` models to be
     fitted to each line. `Gaussian1D` produces more consistent results though
@@ -225,64 +500,769 @@ def get_fwhm(peaks, values, x_axis, profile, model, sigma=1, maxiter=3):
          `Moffat1D` are supported.
         sigma (int): Number sigmas to use on sigma-clipping
         maxiter (int): Maximum number of sigma-clipping iterations
+        recorder (DiagnosticsRecorder): If provided, the fitted parameters of
+          every line are stored in it.
+        executor (Executor): If provided and its workers run on this host, the
+          lines are fitted in parallel reading the profile from shared memory.
+        parameters (ExtractionParameters): Initial width of the lines. Default
+          `DEFAULT_PARAMETERS`.
+        return_error (bool): Also return the uncertainty of the FWHM.
 
     Returns:
-        The FWHM, mean FWHM or `None`.
+        The FWHM, mean FWHM or `None`, and its uncertainty when
+        `return_error` is set.
 
     """
+    parameters = parameters or DEFAULT_PARAMETERS
+    profile = np.asarray(profile, dtype=float)
+    if executor is not None and executor.local and executor.workers > 1 and len(peaks) > 1:
+        fitted_parameters = _fit_lines_in_parallel(peaks=peaks,
+                                                   values=values,
+                                                   profile=profile,
+                                                   model=model,
+                                                   executor=executor,
+                                                   initial_stddev=parameters.initial_stddev)
+        fitted = ~np.isnan(fitted_parameters[:, 2])
+        if recorder is not None:
+            recorder.record(line_parameters=fitted_parameters[:, :3])
+        return _clip_fwhm(all_fwhm=list(fitted_parameters[fitted, 2]),
+                          all_fwhm_error=fitted_parameters[fitted, 3],
+                          sigma=sigma,
+                          maxiter=maxiter,
+                          recorder=recorder,
+                          return_error=return_error)
+
     fitter = fitting.LevMarLSQFitter()
     all_fwhm = []
+    all_fwhm_error = []
+    fitted_parameters = []
     for peak_index in range(len(peaks)):
         if model.__class__.name == 'Gaussian1D':
             model.amplitude.value = values[peak_index]
             model.mean.value = peaks[peak_index]
-            # TODO (simon): stddev should be estimated based on binning and slit size
-            model.stddev.value = 5
-            log.debug(f"Fitting {model.__class__.name} with amplitude={model.amplitude.value}, "
-                      f"mean={model.mean.value}, stddev={model.stddev.value}")
+            model.stddev.value = parameters.initial_stddev
+            log.debug("Fitting %s with amplitude=%s, mean=%s, stddev=%s", model.__class__.name,
+                      model.amplitude.value, model.mean.value, model.stddev.value)
 
         elif model.__class__.name == 'Moffat1D':
             model.amplitude.value = values[peak_index]
             model.x_0.value = peaks[peak_index]
-            log.debug(
-                f"Fitting {model.__class__.name} with amplitude={model.amplitude.value}, x_0={model.x_0.value}")
+            log.debug("Fitting %s with amplitude=%s, x_0=%s", model.__class__.name,
+                      model.amplitude.value, model.x_0.value)
 
-        model = fitter(model,
-                       x_axis,
-                       profile)
+        fitter.fit_info['param_cov'] = None
+        try:
+            model = fitter(model,
+                           x_axis,
+                           profile)
+        except fitting.NonFiniteValueError:
+            log.warning(f"Fit of line at {peaks[peak_index]} diverged, it will be ignored")
+            if recorder is not None:
+                fitted_parameters.append([np.nan, np.nan, np.nan])
+            continue
 
         if not np.isnan(model.fwhm):
             all_fwhm.append(model.fwhm)
+            all_fwhm_error.append(_get_fwhm_error(model=model, covariance=fitter.fit_info['param_cov']))
+
+        if recorder is not None:
+            fitted_parameters.append([model.amplitude.value, _get_center(model), model.fwhm])
+
+    if recorder is not None:
+        recorder.record(line_parameters=np.reshape(fitted_parameters, (-1, 3)))
+
+    return _clip_fwhm(all_fwhm=all_fwhm,
+                      all_fwhm_error=all_fwhm_error,
+                      sigma=sigma,
+                      maxiter=maxiter,
+                      recorder=recorder,
+                      return_error=return_error)
+
+
+def _fit_shared_lines(descriptor, rows, peaks, values, model, initial_stddev=5.):
+    """Fit lines of the profile in a `SharedProfileStore`
+
+    This is the per-line task sent to an `Executor` by `get_fwhm`, initial
+    values are set in the same way. The amplitude, center, FWHM and FWHM
+    uncertainty of every line are written to `rows` of the results, which has
+    four columns. The model is copied since the fitter changes its
+    parameters and tasks may run in threads of the same process.
+    """
+    model = model.copy()
+    fitter = fitting.LevMarLSQFitter()
+    with SharedProfileStore.attach(descriptor) as store:
+        profile = store.profiles[0]
+        x_axis = np.arange(len(profile))
+        for row, peak, value in zip(rows, peaks, values):
+            model.amplitude.value = value
+            if model.__class__.name == 'Moffat1D':
+                model.x_0.value = peak
+            else:
+                model.mean.value = peak
+                model.stddev.value = initial_stddev
+            fitter.fit_info['param_cov'] = None
+            try:
+                model = fitter(model, x_axis, profile)
+            except fitting.NonFiniteValueError:
+                continue
+            store.results[row] = [model.amplitude.value,
+                                  _get_center(model),
+                                  model.fwhm,
+                                  _get_fwhm_error(model=model, covariance=fitter.fit_info['param_cov'])]
+
+
+def _fit_lines_in_parallel(peaks, values, profile, model, executor, initial_stddev=5.):
+    """Fit every line of a profile with the workers of an executor
+
+    The profile is placed in shared memory and each worker fits a contiguous
+    chunk of lines.
 
-    if len(all_fwhm) == 1:
+    Returns:
+        An array with the amplitude, center, FWHM and FWHM uncertainty of
+        every line.
+
+    """
+    chunks = [chunk for chunk in np.array_split(np.arange(len(peaks)), executor.workers) if len(chunk) > 0]
+    with SharedProfileStore.from_profiles(profile[np.newaxis, :], results_shape=(len(peaks), 4)) as store:
+        executor.map(_fit_shared_lines, [(store.descriptor,
+                                          chunk.tolist(),
+                                          [peaks[i] for i in chunk],
+                                          [values[i] for i in chunk],
+                                          model,
+                                          initial_stddev) for chunk in chunks])
+        return store.results.copy()
+
+
+def _clip_fwhm(all_fwhm, sigma=1, maxiter=3, recorder=None, all_fwhm_error=None, return_error=False):
+    """Combine the FWHM of all the lines of a frame in a single value
+
+    The uncertainty of the mean is the larger of the propagated uncertainties
+    of the lines kept by the sigma clipping and the standard error of their
+    scatter, which also accounts for the real variation of the FWHM along the
+    dispersion axis.
+
+    Args:
+        all_fwhm (list): FWHM values of every line fitted successfully.
+        sigma (int): Number sigmas to use on sigma-clipping
+        maxiter (int): Maximum number of sigma-clipping iterations
+        recorder (DiagnosticsRecorder): If provided, the FWHM values and the
+          ones rejected by the sigma clipping are stored in it.
+        all_fwhm_error (list): Uncertainty of every FWHM value, `nan` where
+          it is not known.
+        return_error (bool): Also return the uncertainty of the result.
+
+    Returns:
+        The FWHM, mean FWHM or `None`, and its uncertainty, `nan` when it is
+        not known, when `return_error` is set.
+
+    """
+    all_fwhm = np.asarray(all_fwhm, dtype=float)
+    if all_fwhm_error is None:
+        all_fwhm_error = np.full(len(all_fwhm), np.nan)
+    all_fwhm_error = np.asarray(all_fwhm_error, dtype=float)
+
+    if recorder is not None:
+        recorder.record(line_fwhm=all_fwhm, line_fwhm_error=all_fwhm_error)
+
+    fwhm, fwhm_error = None, np.nan
+    if len(all_fwhm) == 0:
+        log.error("Unable to obtain usable FWHM value")
+    elif len(all_fwhm) == 1:
         log.info(f"Returning single FWHM value: {all_fwhm[0]}")
-        return all_fwhm[0]
+        fwhm, fwhm_error = all_fwhm[0], all_fwhm_error[0]
     else:
         log.info(f"Applying sigma clipping to collected FWHM values."
                  f" SIGMA: {sigma}, ITERATIONS: {maxiter}")
         clipped_fwhm = sigma_clip(all_fwhm, sigma=sigma, maxiters=maxiter)
+        rejected = np.ma.getmaskarray(clipped_fwhm)
 
-        if np.ma.is_masked(clipped_fwhm):
-            cleaned_fwhm = clipped_fwhm[~clipped_fwhm.mask]
-            removed_fwhm = clipped_fwhm[clipped_fwhm.mask]
-            log.info(f"Discarded {len(removed_fwhm)} FWHM values")
-            for _value in removed_fwhm.data:
-                log.debug(f"FWHM {_value} discarded")
+        if recorder is not None:
+            recorder.record(rejected_fwhm=rejected)
+
+        if np.any(rejected):
+            log.info(f"Discarded {np.sum(rejected)} FWHM values")
+            if log.isEnabledFor(logging.DEBUG):
+                for _value in all_fwhm[rejected]:
+                    log.debug("FWHM %s discarded", _value)
         else:
             log.debug("No FWHM value was discarded.")
-            cleaned_fwhm = clipped_fwhm
 
+        cleaned_fwhm = all_fwhm[~rejected]
         if len(cleaned_fwhm) > 0:
-            log.debug(f"Remaining FWHM values: {len(cleaned_fwhm)}")
-            for _value in cleaned_fwhm:
-                log.debug(f"FWHM value: {_value}")
-            mean_fwhm = np.mean(cleaned_fwhm)
-            log.debug(f"Mean FWHM value {mean_fwhm}")
-            return mean_fwhm
+            log.debug("Remaining FWHM values: %s", len(cleaned_fwhm))
+            if log.isEnabledFor(logging.DEBUG):
+                for _value in cleaned_fwhm:
+                    log.debug("FWHM value: %s", _value)
+            fwhm = np.mean(cleaned_fwhm)
+            fwhm_error = _get_mean_error(values=cleaned_fwhm, errors=all_fwhm_error[~rejected])
+            log.debug("Mean FWHM value %s +/- %s", fwhm, fwhm_error)
         else:
             log.error("Unable to obtain usable FWHM value")
             log.debug("Returning FWHM None")
-            return None
+
+    if return_error:
+        return fwhm, fwhm_error
+    return fwhm
+
+
+def _get_mean_error(values, errors):
+    """Uncertainty of the mean of `values`, see `_clip_fwhm`"""
+    known = np.isfinite(errors)
+    propagated = np.sqrt(np.mean(errors[known] ** 2) / len(values)) if np.any(known) else np.nan
+    scatter = np.std(values, ddof=1) / np.sqrt(len(values)) if len(values) > 1 else np.nan
+    return float(np.fmax(propagated, scatter))
+
+
+def _get_fwhm_error(model, covariance):
+    """Uncertainty of the FWHM of a fitted `Gaussian1D` or `Moffat1D` model
+
+    The covariance of the free parameters is propagated through the
+    expression of the FWHM of the model.
+
+    Args:
+        model (Model): Fitted model.
+        covariance (numpy.ndarray): Covariance matrix of the free parameters,
+          `fit_info['param_cov']` of the fitter.
+
+    Returns:
+        The uncertainty of the FWHM or `nan` if it can't be obtained.
+
+    """
+    if covariance is None:
+        return np.nan
+    names = [name for name in model.param_names if not model.fixed[name] and not model.tied[name]]
+    gradient = np.zeros(len(names))
+    if model.__class__.name == 'Moffat1D':
+        alpha = model.alpha.value
+        factor = 2 ** (1. / alpha) - 1
+        if factor <= 0:
+            return np.nan
+        gradient[names.index('gamma')] = 2 * np.sign(model.gamma.value) * np.sqrt(factor)
+        if 'alpha' in names:
+            gradient[names.index('alpha')] = \
+                -abs(model.gamma.value) * 2 ** (1. / alpha) * np.log(2) / (alpha ** 2 * np.sqrt(factor))
+    else:
+        gradient[names.index('stddev')] = gaussian_sigma_to_fwhm
+    variance = gradient @ np.asarray(covariance) @ gradient
+    if not np.isfinite(variance) or variance < 0:
+        return np.nan
+    return float(np.sqrt(variance))
+
+
+def get_fit_weights(fwhm_error, floor_fraction=0.1):
+    """Weights for the fit of the focus curve from the FWHM uncertainties
+
+    Every frame is weighted by the inverse of its uncertainty. Unknown
+    uncertainties are replaced by the largest known one and uncertainties
+    below `floor_fraction` of the median are raised to it, so a single frame
+    can't dominate the fit.
+
+    Args:
+        fwhm_error (array-like): Uncertainty of the FWHM of every frame.
+        floor_fraction (float): Minimum uncertainty as a fraction of the
+          median.
+
+    Returns:
+        An array of weights or `None` if no uncertainty is known, in which case
+        every frame has the same weight.
+
+    """
+    fwhm_error = np.asarray(fwhm_error, dtype=float)
+    known = np.isfinite(fwhm_error) & (fwhm_error > 0)
+    if not np.any(known):
+        return None
+    fwhm_error = np.where(known, fwhm_error, np.max(fwhm_error[known]))
+    fwhm_error = np.maximum(fwhm_error, floor_fraction * np.median(fwhm_error[known]))
+    return 1. / fwhm_error
+
+
+def _set_initial_values(model, amplitude, center, stddev):
+    """Set the initial values of a `Gaussian1D` or `Moffat1D` model
+
+    Args:
+        model (Model): Model to update in place.
+        amplitude (float): Initial amplitude.
+        center (float): Initial center of the line.
+        stddev (float): Initial width expressed as a gaussian standard
+          deviation, converted to `gamma` for `Moffat1D`.
+
+    """
+    model.amplitude.value = amplitude
+    if model.__class__.name == 'Gaussian1D':
+        model.mean.value = center
+        model.stddev.value = stddev
+    elif model.__class__.name == 'Moffat1D':
+        model.x_0.value = center
+        model.gamma.value = (stddev * gaussian_sigma_to_fwhm) / (2 * np.sqrt(2 ** (1 / model.alpha.value) - 1))
+
+
+def _get_center(model):
+    """Get the center of a `Gaussian1D` or `Moffat1D` model"""
+    if model.__class__.name == 'Moffat1D':
+        return model.x_0.value
+    return model.mean.value
+
+
+def fit_lines(x_axis, profile, centers, widths, model, search_tolerance=3, window_factor=5, return_errors=False):
+    """Fit a model to each line starting from known centers and widths
+
+    Instead of fitting the whole profile, only a window around every line is
+    used. The center is first refined by looking for the maximum within
+    `search_tolerance` pixels of the initial center.
+
+    Args:
+        x_axis (numpy.ndarray): X-axis for the profile, equivalent to
+          `range(len(profile))`.
+        profile (numpy.ndarray): Background subtracted profile.
+        centers (numpy.ndarray): Initial center of every line.
+        widths (numpy.ndarray): Initial width of every line expressed as a
+          gaussian standard deviation.
+        model (Model): A `Gaussian1D` or `Moffat1D` model.
+        search_tolerance (int): Maximum shift in pixels of a line with respect
+          to its initial center.
+        window_factor (float): Half width of the fitting window as a factor of
+          the line's FWHM.
+        return_errors (bool): Also return the uncertainty of every FWHM.
+
+    Returns:
+        Arrays of fitted centers, widths, FWHM, a boolean mask of successful
+        fits and the number of function evaluations used by each fit, followed
+        by the uncertainty of every FWHM when `return_errors` is set.
+
+    """
+    fitter = fitting.LevMarLSQFitter()
+    profile = np.asarray(profile, dtype=float)
+    number_of_lines = len(centers)
+    length = len(profile)
+
+    fitted_centers = np.array(centers, dtype=float)
+    fitted_widths = np.array(widths, dtype=float)
+    fitted_fwhm = np.full(number_of_lines, np.nan)
+    fitted_fwhm_error = np.full(number_of_lines, np.nan)
+    success = np.zeros(number_of_lines, dtype=bool)
+    evaluations = np.zeros(number_of_lines, dtype=int)
+
+    for i in range(number_of_lines):
+        center = int(round(centers[i]))
+        search_low = max(0, center - search_tolerance)
+        search_high = min(length, center + search_tolerance + 1)
+        if search_low >= search_high:
+            continue
+        peak = search_low + int(np.argmax(profile[search_low:search_high]))
+
+        half_window = max(int(np.ceil(window_factor * widths[i] * gaussian_sigma_to_fwhm)),
+                          search_tolerance + 3)
+        low = max(0, peak - half_window)
+        high = min(length, peak + half_window + 1)
+
+        _set_initial_values(model=model, amplitude=profile[peak], center=peak, stddev=widths[i])
+        fitter.fit_info['param_cov'] = None
+        try:
+            fitted_model = fitter(model, x_axis[low:high], profile[low:high])
+        except fitting.NonFiniteValueError:
+            log.debug("Fit of line at %s diverged", centers[i])
+            continue
+        evaluations[i] = fitter.fit_info['nfev']
+
+        fitted_center = _get_center(fitted_model)
+        fwhm = fitted_model.fwhm
+        if fitter.fit_info['ierr'] in [1, 2, 3, 4] \
+                and np.isfinite(fwhm) \
+                and 0 < fwhm < high - low \
+                and fitted_model.amplitude.value > 0 \
+                and abs(fitted_center - centers[i]) <= search_tolerance:
+            fitted_centers[i] = fitted_center
+            fitted_widths[i] = fwhm * gaussian_fwhm_to_sigma
+            fitted_fwhm[i] = fwhm
+            success[i] = True
+            if return_errors:
+                fitted_fwhm_error[i] = _get_fwhm_error(model=fitted_model, covariance=fitter.fit_info['param_cov'])
+
+    if return_errors:
+        return fitted_centers, fitted_widths, fitted_fwhm, success, evaluations, fitted_fwhm_error
+    return fitted_centers, fitted_widths, fitted_fwhm, success, evaluations
+
+
+def get_slit_fwhm(ccd: CCDData, model, window_factor=5, dtype=None, recorder=None, parameters=None,
+                  return_error=False):
+    """Measure the FWHM of the slit in an imaging focus frame
+
+    Imaging focus frames have a single feature, the image of the slit, so the
+    peak detection and the sigma clipping of many FWHM values are not needed.
+    The median of the profile is subtracted as background, the slit is located
+    at the maximum of the profile and its centroid and width are obtained from
+    the pixels above half maximum. Then the model is fitted only to a window
+    around it.
+
+    Args:
+        ccd (CCDData): Image to measure.
+        model (Model): A `Gaussian1D` or `Moffat1D` model.
+        window_factor (float): Half width of the fitting window as a factor of
+          the slit's FWHM.
+        dtype (numpy.dtype): Floating point type of the profile, see
+          `get_peaks`.
+        recorder (DiagnosticsRecorder): Optional recorder of intermediate
+          results.
+        parameters (ExtractionParameters): Height of the central band. Default
+          `DEFAULT_PARAMETERS`.
+        return_error (bool): Also return the uncertainty of the FWHM.
+
+    Returns:
+        The FWHM or `None`, and its uncertainty when `return_error` is set.
+
+    """
+    parameters = parameters or DEFAULT_PARAMETERS
+    width, length = ccd.data.shape
+    band = ccd.data[int(width / 2 - parameters.band_half_width):int(width / 2 + parameters.band_half_width), :]
+    if dtype is not None and band.dtype.kind == 'f':
+        band = band.astype(dtype, copy=False)
+    raw_profile = np.median(band, axis=0)
+    if dtype is not None:
+        raw_profile = raw_profile.astype(dtype, copy=False)
+
+    background = np.median(raw_profile)
+    profile = raw_profile - background
+    x_axis = np.arange(len(profile))
+
+    peak = int(np.argmax(profile))
+    above_half_maximum = profile > profile[peak] / 2.
+    below_left = np.flatnonzero(~above_half_maximum[:peak])
+    below_right = np.flatnonzero(~above_half_maximum[peak:])
+    low = below_left[-1] + 1 if len(below_left) > 0 else 0
+    high = peak + below_right[0] if len(below_right) > 0 else length
+    weights = profile[low:high]
+    centroid = np.sum(x_axis[low:high] * weights) / np.sum(weights)
+    log.debug("Slit found at %s with a width of %s pixels above half maximum", centroid, high - low)
+
+    _, _, fwhm, success, _, fwhm_error = fit_lines(x_axis=x_axis,
+                                                   profile=profile,
+                                                   centers=[centroid],
+                                                   widths=[max((high - low) * gaussian_fwhm_to_sigma, 1.)],
+                                                   model=model,
+                                                   search_tolerance=max(3, int(np.ceil((high - low) / 2.))),
+                                                   window_factor=window_factor,
+                                                   return_errors=True)
+
+    if recorder is not None:
+        recorder.record(raw_profile=raw_profile,
+                        clipped_mask=np.zeros(len(raw_profile), dtype=bool),
+                        initial_background=background,
+                        background_slope=0.,
+                        background_intercept=background,
+                        accepted_peaks=np.array([peak]),
+                        threshold=profile[peak] / 2.,
+                        line_fwhm=fwhm[success],
+                        line_fwhm_error=fwhm_error[success])
+
+    if not success[0]:
+        log.error("Unable to obtain usable FWHM value")
+        return (None, np.nan) if return_error else None
+    return (fwhm[0], fwhm_error[0]) if return_error else fwhm[0]
+
+
+class LineTracker(object):
+    """Follow the lines of a focus sequence from one frame to the next
+
+    Along a focus sequence the same lines are present in every frame, only
+    their width changes. Once the lines are detected in one frame their
+    centers and widths are used as initial values for the next one, and the
+    peak detection is skipped as long as enough of the tracked lines are
+    fitted successfully. Frames are expected in order of focus value.
+
+    Args:
+        model (Model): `Gaussian1D` or `Moffat1D` model to fit to each line.
+        search_tolerance (int): Maximum shift in pixels of a line between
+          adjacent frames.
+        window_factor (float): Half width of the fitting window as a factor of
+          the line's FWHM.
+        min_valid_fraction (float): Minimum fraction of the lines found at the
+          last detection that must be fitted successfully for the tracked set
+          to remain valid. Lines lost one frame after another are counted
+          against the same reference, so they are detected again once too
+          many are missing.
+        initial_stddev (float): Standard deviation used for lines detected for
+          the first time.
+        sigma (int): Number sigmas to use on sigma-clipping
+        maxiter (int): Maximum number of sigma-clipping iterations
+        parameters (ExtractionParameters): Peak detection parameters used when
+          the lines are detected. Default `DEFAULT_PARAMETERS`.
+
+    """
+
+    def __init__(self,
+                 model,
+                 search_tolerance=3,
+                 window_factor=5,
+                 min_valid_fraction=0.7,
+                 initial_stddev=5,
+                 sigma=1,
+                 maxiter=3,
+                 parameters=None):
+        self.model = model
+        self.search_tolerance = search_tolerance
+        self.window_factor = window_factor
+        self.min_valid_fraction = min_valid_fraction
+        self.initial_stddev = initial_stddev
+        self.sigma = sigma
+        self.maxiter = maxiter
+        self.parameters = parameters
+
+        self.centers = None
+        self.widths = None
+        self.line_ids = None
+        self.detected_lines = 0
+        self.history = []
+        self._next_line_id = 0
+        self.frames = 0
+        self.detections = 0
+        self.fits = 0
+        self.failed_fits = 0
+        self.evaluations = 0
+
+    def reset(self):
+        """Forget the tracked lines"""
+        self.centers = None
+        self.widths = None
+        self.line_ids = None
+        self.detected_lines = 0
+
+    def seed(self, centers, widths):
+        """Start tracking a known set of lines
+
+        Args:
+            centers (array-like): Centers of the lines.
+            widths (array-like): Widths of the lines as a gaussian standard
+              deviation.
+
+        """
+        self.centers = np.array(centers, dtype=float)
+        self.widths = np.array(widths, dtype=float)
+        self.line_ids = self._new_line_ids(len(self.centers))
+        self.detected_lines = len(self.centers)
+
+    def _new_line_ids(self, number_of_lines):
+        line_ids = np.arange(self._next_line_id, self._next_line_id + number_of_lines)
+        self._next_line_id += number_of_lines
+        return line_ids
+
+    def _fit(self, x_axis, profile, centers, widths, recorder=None):
+        fitted_centers, fitted_widths, fitted_fwhm, success, evaluations, fitted_fwhm_error = fit_lines(
+            x_axis=x_axis,
+            profile=profile,
+            centers=centers,
+            widths=widths,
+            model=self.model,
+            search_tolerance=self.search_tolerance,
+            window_factor=self.window_factor,
+            return_errors=True)
+        self.fits += len(centers)
+        self.failed_fits += int(np.sum(~success))
+        self.evaluations += int(np.sum(evaluations))
+        if recorder is not None:
+            recorder.record(line_centers=fitted_centers,
+                            line_widths=fitted_widths,
+                            line_success=success,
+                            line_evaluations=evaluations)
+        return fitted_centers, fitted_widths, fitted_fwhm, success, fitted_fwhm_error
+
+    def _detect(self, profile, threshold_for_selecting_peaks, recorder=None):
+        """Detect the lines and match them with the tracked ones
+
+        Lines matching a tracked line keep its identifier and width, new lines
+        get a new identifier and `initial_stddev`.
+        """
+        self.detections += 1
+        peaks, _, _ = _find_peaks(profile=profile,
+                                  threshold_for_selecting_peaks=threshold_for_selecting_peaks,
+                                  recorder=recorder,
+                                  parameters=self.parameters)
+        centers = np.array(peaks, dtype=float)
+        widths = np.full(len(centers), float(self.initial_stddev))
+        line_ids = self._new_line_ids(len(centers))
+        if self.centers is not None and len(self.centers) > 0 and len(centers) > 0:
+            distance = np.abs(centers[:, np.newaxis] - self.centers[np.newaxis, :])
+            nearest = np.argmin(distance, axis=1)
+            matched = distance[np.arange(len(centers)), nearest] <= self.search_tolerance
+            for index in np.flatnonzero(matched):
+                closest = np.argmin(distance[:, nearest[index]])
+                if closest == index:
+                    widths[index] = self.widths[nearest[index]]
+                    line_ids[index] = self.line_ids[nearest[index]]
+        return centers, widths, line_ids
+
+    def __call__(self, x_axis, profile, threshold_for_selecting_peaks=2, recorder=None, return_error=False):
+        """Measure the lines of a new frame
+
+        Args:
+            x_axis (numpy.ndarray): X-axis for the profile.
+            profile (numpy.ndarray): Background subtracted profile.
+            threshold_for_selecting_peaks (float): Used only when the lines
+              need to be detected again.
+            recorder (DiagnosticsRecorder): Optional recorder of intermediate
+              results.
+            return_error (bool): Also return the uncertainty of the FWHM.
+
+        Returns:
+            The FWHM, mean FWHM or `None`, and its uncertainty when
+            `return_error` is set.
+
+        """
+        self.frames += 1
+        fitted = None
+        line_ids = self.line_ids
+        if self.centers is not None and len(self.centers) > 0:
+            fitted = self._fit(x_axis=x_axis,
+                               profile=profile,
+                               centers=self.centers,
+                               widths=self.widths,
+                               recorder=recorder)
+            if np.sum(fitted[3]) < self.min_valid_fraction * self.detected_lines:
+                log.debug("Only %s of the %s lines detected were fitted, detecting lines again.",
+                          np.sum(fitted[3]), self.detected_lines)
+                fitted = None
+
+        if fitted is None:
+            centers, widths, line_ids = self._detect(
+                profile=profile,
+                threshold_for_selecting_peaks=threshold_for_selecting_peaks,
+                recorder=recorder)
+            self.detected_lines = len(centers)
+            fitted = self._fit(x_axis=x_axis, profile=profile, centers=centers, widths=widths, recorder=recorder)
+
+        fitted_centers, fitted_widths, fitted_fwhm, success, fitted_fwhm_error = fitted
+        self.centers = fitted_centers[success]
+        self.widths = fitted_widths[success]
+        self.line_ids = line_ids[success]
+        self.history.append((self.line_ids, self.centers, fitted_fwhm[success]))
+
+        return _clip_fwhm(all_fwhm=list(fitted_fwhm[success]),
+                          all_fwhm_error=fitted_fwhm_error[success],
+                          sigma=self.sigma,
+                          maxiter=self.maxiter,
+                          recorder=recorder,
+                          return_error=return_error)
+
+    def get_fwhm_matrix(self):
+        """Get the FWHM of every tracked line in every frame
+
+        Returns:
+            An array with the mean position of each line and a matrix of FWHM
+            values of shape (lines, frames) with `nan` where a line was not
+            measured.
+
+        """
+        all_ids = np.unique(np.concatenate([ids for ids, _, _ in self.history])) \
+            if self.history else np.array([], dtype=int)
+        positions = np.zeros(len(all_ids))
+        counts = np.zeros(len(all_ids))
+        fwhm_matrix = np.full((len(all_ids), len(self.history)), np.nan)
+        for frame, (line_ids, centers, fwhm) in enumerate(self.history):
+            rows = np.searchsorted(all_ids, line_ids)
+            fwhm_matrix[rows, frame] = fwhm
+            positions[rows] += centers
+            counts[rows] += 1
+        positions = positions / np.maximum(counts, 1)
+        return positions, fwhm_matrix
+
+
+def _refine_grid_minimum(grid, curves):
+    """Locate the minimum of each curve sampled on a regular grid
+
+    The minimum sample is refined with a parabola through it and its two
+    neighbours.
+
+    Args:
+        grid (numpy.ndarray): Regular grid of size N.
+        curves (numpy.ndarray): Curves sampled on the grid, shape (M, N).
+
+    Returns:
+        Arrays with the location of each minimum and the curve value there.
+
+    """
+    index = np.clip(np.argmin(curves, axis=1), 1, len(grid) - 2)
+    rows = np.arange(curves.shape[0])
+    left, middle, right = curves[rows, index - 1], curves[rows, index], curves[rows, index + 1]
+    curvature = left - 2 * middle + right
+    with np.errstate(divide='ignore', invalid='ignore'):
+        offset = np.where(curvature > 0, 0.5 * (left - right) / curvature, 0)
+    offset = np.clip(np.nan_to_num(offset), -1, 1)
+    location = grid[index] + offset * (grid[1] - grid[0])
+    value = middle - 0.25 * (left - right) * offset
+    return location, value
+
+
+def fit_line_focus_curves(focus, fwhm_matrix, degree=2, grid_size=2000):
+    """Fit the focus curve of every line at once
+
+    Each row of `fwhm_matrix` is the FWHM of one line along the focus
+    sequence. All the polynomials are obtained with a single batched linear
+    least squares solve, missing values (`nan`) are ignored. Lines with fewer
+    than `degree + 2` measurements, or measured at fewer than `degree + 1`
+    distinct focus values, are not fitted since their system is singular.
+
+    Args:
+        focus (array-like): Focus value of each frame.
+        fwhm_matrix (numpy.ndarray): FWHM values with shape (lines, frames).
+        degree (int): Degree of the polynomial fitted to each line.
+        grid_size (int): Number of focus values where the polynomials are
+          evaluated to find their minimum.
+
+    Returns:
+        A dictionary with the best focus and the FWHM at best focus for every
+        line, `nan` for lines that could not be fitted, and the compromise
+        focus that minimizes the mean FWHM of all the fitted lines along with
+        that mean FWHM.
+
+    """
+    focus = np.asarray(focus, dtype=float)
+    fwhm_matrix = np.atleast_2d(np.asarray(fwhm_matrix, dtype=float))
+    number_of_lines = fwhm_matrix.shape[0]
+
+    center = (focus.max() + focus.min()) / 2.
+    half_range = max((focus.max() - focus.min()) / 2., 1.)
+    vandermonde = np.vander((focus - center) / half_range, degree + 1, increasing=True)
+
+    weights = np.isfinite(fwhm_matrix).astype(float)
+    values = np.where(weights > 0, fwhm_matrix, 0)
+    _, focus_index = np.unique(focus, return_inverse=True)
+    distinct_focus = (weights @ np.eye(focus_index.max() + 1)[focus_index] > 0).sum(axis=1)
+    valid = (weights.sum(axis=1) >= degree + 2) & (distinct_focus >= degree + 1)
+    degenerate = np.flatnonzero((weights.sum(axis=1) >= degree + 2) & ~valid)
+    if len(degenerate) > 0:
+        log.warning(f"Lines {degenerate.tolist()} were measured at fewer than {degree + 1} "
+                    f"distinct focus values, their focus curves will not be fitted")
+
+    normal_matrix = np.einsum('lf,fi,fj->lij', weights[valid], vandermonde, vandermonde)
+    normal_vector = np.einsum('lf,fi->li', values[valid], vandermonde)
+    coefficients = np.full((number_of_lines, degree + 1), np.nan)
+    if np.any(valid):
+        coefficients[valid] = np.linalg.solve(normal_matrix, normal_vector[..., np.newaxis])[..., 0]
+
+    grid = np.linspace(-1, 1, grid_size)
+    curves = coefficients[valid] @ np.vander(grid, degree + 1, increasing=True).T
+
+    best_focus = np.full(number_of_lines, np.nan)
+    best_fwhm = np.full(number_of_lines, np.nan)
+    compromise_focus = np.nan
+    compromise_fwhm = np.nan
+    if np.any(valid):
+        location, value = _refine_grid_minimum(grid=grid, curves=curves)
+        best_focus[valid] = center + location * half_range
+        best_fwhm[valid] = value
+
+        location, value = _refine_grid_minimum(grid=grid, curves=curves.mean(axis=0)[np.newaxis, :])
+        compromise_focus = center + location[0] * half_range
+        compromise_fwhm = value[0]
+
+    return {'best_focus': best_focus,
+            'best_fwhm': best_fwhm,
+            'compromise_focus': compromise_focus,
+            'compromise_fwhm': compromise_fwhm}
+
+
+class GoodmanFocusError(Exception):
+    """Raised when the focus can not be obtained from the data path or files"""
+    pass
 
 
 class GoodmanFocus(object):
@@ -304,15 +1284,45 @@ class GoodmanFocus(object):
                 'RDNOISE',
                 'GAIN',
                 'OBSTYPE',
-                'ROI']
+                'ROI',
+                'CCDSUM',
+                TEMPERATURE_KEYWORD]
+
+    configuration_keywords = ['CAM_TARG',
+                              'GRT_TARG',
+                              'FILTER',
+                              'FILTER2',
+                              'GRATING',
+                              'SLIT',
+                              'WAVMODE',
+                              'RDNOISE',
+                              'GAIN',
+                              'ROI']
 
     def __init__(self,
                  data_path=os.getcwd(),
-                 file_pattern="*.fits",
+                 file_pattern=DEFAULT_FILE_PATTERN,
                  obstype="FOCUS",
                  features_model='gaussian',
                  selection_threshold=2,
                  plot_results=False,
+                 track_lines=False,
+                 per_line_focus=False,
+                 line_templates=None,
+                 plot_dir=None,
+                 plot_formats=('png',),
+                 plot_workers=2,
+                 diagnostics=None,
+                 use_index=False,
+                 index_path=None,
+                 coarse_to_fine=False,
+                 focus_tolerance=50,
+                 precision='float64',
+                 imaging_fast_path=True,
+                 executor=None,
+                 history=None,
+                 extraction_parameters=None,
+                 exit_on_error=True,
                  debug=False):
 
         self.data_path = data_path
@@ -321,6 +1331,25 @@ class GoodmanFocus(object):
         self.features_model = features_model
         self.selection_threshold = selection_threshold
         self.plot_results = plot_results
+        self.track_lines = track_lines or per_line_focus or line_templates is not None
+        self.per_line_focus = per_line_focus
+        self.line_templates = line_templates
+        self.plot_dir = plot_dir
+        self.plot_formats = plot_formats
+        self.plot_workers = plot_workers
+        self.renderer = None
+        self.diagnostics = diagnostics
+        self.recorder = None
+        self.use_index = use_index
+        self.index_path = index_path
+        self.coarse_to_fine = coarse_to_fine
+        self.focus_tolerance = focus_tolerance
+        self.precision = precision
+        self.imaging_fast_path = imaging_fast_path
+        self.executor = executor
+        self.history = history
+        self.extraction_parameters = extraction_parameters
+        self.exit_on_error = exit_on_error
         self.debug = debug
 
         self.log = logging.getLogger(__name__)
@@ -344,63 +1373,145 @@ class GoodmanFocus(object):
         self.__best_image_fwhm = None
         self._fwhm = None
         self.__notes = ''
-
-        self.polynomial = models.Polynomial1D(degree=5)
-        self.fitter = fitting.LevMarLSQFitter()
+        self._header_cache = {}
+        self.timings = {}
+        self.skipped_files = []
+        self.group_parameters = self.extraction_parameters or DEFAULT_PARAMETERS
+        self.line_tracker = None
+        self.line_tracker_focus = []
+        self.template_store = None
+        self._template_settings = None
+        if self.line_templates is not None:
+            self.template_store = LineTemplateStore(path=self.line_templates)
+
+        self.polynomial = models.Polynomial1D(degree=2)
+        self.fitter = fitting.LinearLSQFitter()
         self.linear_fitter = fitting.LinearLSQFitter()
 
-        if os.path.isdir(self.data_path):
-            self.full_path = self.data_path
-        else:
-            self.log.critical("No such directory")
-            sys.exit(0)
+        self.full_path = self.data_path
 
     def __call__(self, files=None):
+        """Obtain the best focus of every group
+
+        Args:
+            files (list): Optional list of files relative to `data_path`. By
+              default every file matching `file_pattern` is used.
+
+        Returns:
+            A list with one dictionary per mode, see `FocusResult.to_dict`.
+
+        """
+        return [result.to_dict() for result in self.run(files=files)]
+
+    def run(self, files=None):
+        """Obtain the best focus of every group as `FocusResult` instances
+
+        The measurements of every result are kept in a structured array
+        instead of lists, which is better suited to process many nights.
+
+        Args:
+            files (list): Optional list of files relative to `data_path`. By
+              default every file matching `file_pattern` is used.
+
+        Returns:
+            A list with one `FocusResult` per mode.
+
+        """
+        self._header_cache = {}
+        self.timings = {}
+        call_start = time.perf_counter()
+        try:
+            self._discover(files=files)
+        except GoodmanFocusError:
+            if self.exit_on_error:
+                sys.exit(0)
+            raise
+        self._add_timing(stage='discovery', start=call_start)
+        return self._process_groups(call_start=call_start)
+
+    async def arun(self, files=None):
+        """Obtain the best focus of every group without blocking the event loop
+
+        Headers are read in the default executor of the running loop and every
+        group is processed by `process_focus_group` through `Executor.amap` of
+        `executor`, or one group at a time in the default executor of the loop
+        when no executor is set. Cancelling the coroutine cancels the groups
+        not yet started. Errors raise `GoodmanFocusError` regardless of
+        `exit_on_error`.
+
+        Concurrent requests should use one instance each, they can share the
+        same `executor`. Plots can only be written to `plot_dir`. When
+        diagnostics are saved, all the groups are processed by a single call in
+        the default executor of the loop since they go to a single file.
+
+        Args:
+            files (list): Optional list of files relative to `data_path`. By
+              default every file matching `file_pattern` is used.
+
+        Returns:
+            A list with one `FocusResult` per mode.
+
+        """
+        if (self.plot_results or self.debug) and self.plot_dir is None:
+            raise GoodmanFocusError('Plots can not be shown by arun, use "plot_dir" to write them')
+        loop = asyncio.get_running_loop()
+        self._header_cache = {}
+        self.timings = {}
+        call_start = time.perf_counter()
+        await loop.run_in_executor(None, self._discover, files)
+        self._add_timing(stage='discovery', start=call_start)
+
+        if self.diagnostics is not None:
+            return await loop.run_in_executor(None, self._process_groups, call_start)
+
+        executor = self.executor if self.executor is not None else SerialExecutor()
+        self.log.debug(f"Processing {len(self.focus_groups)} groups with {executor.__class__.__name__}")
+        start = time.perf_counter()
+        group_results = await executor.amap(process_focus_group, self._get_group_tasks())
+        self._add_timing(stage='groups', start=start)
+        if self.history is not None:
+            await loop.run_in_executor(None, self._record_group_history, group_results)
+        self._add_timing(stage='total', start=call_start)
+        return [result for results in group_results for result in results]
+
+    def _discover(self, files=None):
+        """Read the headers of the focus files and group them by configuration
+
+        Args:
+            files (list): Optional list of files relative to `data_path`. By
+              default every file matching `file_pattern` is used.
+
+        Raises:
+            GoodmanFocusError: If there are no focus files to process.
+
+        """
+        if not os.path.isdir(self.full_path):
+            self.log.critical("No such directory")
+            raise GoodmanFocusError(f"No such directory: {self.full_path}")
         if files is None:
             if not os.listdir(self.full_path):
                 self.log.critical("Directory is empty")
-                sys.exit(0)
+                raise GoodmanFocusError(f"Directory {self.full_path} is empty")
 
-            elif not glob.glob(os.path.join(self.full_path, self.file_pattern)):
+            file_names = find_files(path=self.full_path, file_pattern=self.file_pattern)
+            if not file_names:
                 self.log.critical(f"Directory {self.full_path} does not containe files matching the pattern {self.file_pattern}")
-                sys.exit(0)
-
-            _ifc = ImageFileCollection(location=self.full_path,
-                                       keywords=self.keywords,
-                                       glob_include=self.file_pattern)
-
-            self.ifc = _ifc.summary.to_pandas()
+                raise GoodmanFocusError(f"No files matching {self.file_pattern} in {self.full_path}")
+
+            if self.use_index:
+                header_index = HeaderIndex(data_path=self.full_path,
+                                           keywords=self.keywords,
+                                           index_path=self.index_path)
+                self.ifc = header_index.update(file_pattern=self.file_pattern)
+                self.log.debug(f"Read {header_index.files_read} new or modified files")
+            else:
+                self.ifc = self._read_headers(files=file_names)
             self.log.debug(f"Found {self.ifc.shape[0]} FITS files")
             self.ifc = self.ifc[(self.ifc['OBSTYPE'] == self.obstype)]
             if self.ifc.shape[0] != 0:
                 self.log.debug(f"Found { self.ifc.shape[0]} FITS files with OBSTYPE = FOCUS")
 
-                self.focus_groups = []
-                configs = self.ifc.groupby(['CAM_TARG',
-                                            'GRT_TARG',
-                                            'FILTER',
-                                            'FILTER2',
-                                            'GRATING',
-                                            'SLIT',
-                                            'WAVMODE',
-                                            'RDNOISE',
-                                            'GAIN',
-                                            'ROI']).size().reset_index().rename(
-                    columns={0: 'count'})
-                # print(configs.to_string())
-                for i in configs.index:
-                    focus_group = self.ifc[
-                        ((self.ifc['CAM_TARG'] == configs.iloc[i]['CAM_TARG']) &
-                         (self.ifc['GRT_TARG'] == configs.iloc[i]['GRT_TARG']) &
-                         (self.ifc['FILTER'] == configs.iloc[i]['FILTER']) &
-                         (self.ifc['FILTER2'] == configs.iloc[i]['FILTER2']) &
-                         (self.ifc['GRATING'] == configs.iloc[i]['GRATING']) &
-                         (self.ifc['SLIT'] == configs.iloc[i]['SLIT']) &
-                         (self.ifc['WAVMODE'] == configs.iloc[i]['WAVMODE']) &
-                         (self.ifc['RDNOISE'] == configs.iloc[i]['RDNOISE']) &
-                         (self.ifc['GAIN'] == configs.iloc[i]['GAIN']) &
-                         (self.ifc['ROI'] == configs.iloc[i]['ROI']))]
-                    self.focus_groups.append(focus_group)
+                self.focus_groups = self._group_by_configuration(file_collection=self.ifc)
             else:
                 self.log.critical('Focus files must have OBSTYPE keyword equal to '
                                   '"FOCUS", none found.')
@@ -408,7 +1519,7 @@ class GoodmanFocus(object):
                               'it is not recommended to use neither "OBJECT" nor '
                               '"FLAT" because it may contaminate the sample with '
                               'non focus images.')
-                sys.exit(0)
+                raise GoodmanFocusError(f"No files with OBSTYPE = {self.obstype} in {self.full_path}")
         else:
             if isinstance(files, list):
                 full_path_content = os.listdir(self.full_path)
@@ -417,69 +1528,106 @@ class GoodmanFocus(object):
                     files_dont_exist = [_file for _file in files if _file not in full_path_content]
                     for _file in files_dont_exist:
                         self.log.critical(f"File {_file} does not exist in {self.full_path}")
-                    sys.exit(0)
+                    raise GoodmanFocusError(f"Files {', '.join(files_dont_exist)} do not exist in {self.full_path}")
                 else:
-                    data = {'file': files}
+                    self.ifc = self._read_headers(files=files)
+                    self.focus_groups = self._group_by_configuration(file_collection=self.ifc)
 
-                    for key in ['DATE', 'DATE-OBS', 'INSTCONF', 'FILTER', 'FILTER2', 'WAVMODE']:
-                        key_data = [fits.getval(os.path.join(self.full_path,
-                                                             _file), key) for _file in files]
+            else:
+                self.log.critical('"files" argument must be a list')
+                raise GoodmanFocusError('"files" argument must be a list')
 
-                        data[key] = key_data
+    def _process_groups(self, call_start):
+        """Obtain the best focus of every group found by `_discover`
 
-                    self.focus_groups = [pandas.DataFrame(data)]
+        Args:
+            call_start (float): Start time of the call, for `timings`.
 
-            else:
-                self.log.critical('"files" argument must be a list')
-                sys.exit(0)
+        Returns:
+            A list with one `FocusResult` per mode.
+
+        """
+        if self._can_map_groups():
+            self.log.debug(f"Processing {len(self.focus_groups)} groups with {self.executor.__class__.__name__}")
+            start = time.perf_counter()
+            group_results = self.executor.map(process_focus_group, self._get_group_tasks())
+            self._add_timing(stage='groups', start=start)
+            if self.history is not None:
+                self._record_group_history(group_results=group_results)
+            self._add_timing(stage='total', start=call_start)
+            return [result for results in group_results for result in results]
+
+        if self.plot_dir is not None and (self.plot_results or self.debug):
+            self.renderer = PlotRenderer(output_dir=self.plot_dir,
+                                         formats=self.plot_formats,
+                                         workers=self.plot_workers)
+        if self.diagnostics is not None:
+            self.recorder = DiagnosticsRecorder()
 
         results = []
         for focus_group in self.focus_groups:
             mode_name = self._get_mode_name(focus_group)
             self.notes = ''
             try:
-                focus_dataframe = self.get_focus_data(group=focus_group)
+                measurements = self._get_measurements(group=focus_group)
 
-                self._fit(df=focus_dataframe)
+                start = time.perf_counter()
+                self._fit(df=measurements.to_pandas())
+                self._add_timing(stage='focus_curve', start=start)
                 self.log.info(f"Best Focus for mode {mode_name} is {self.__best_focus}")
-                results.append({'date': focus_group['DATE'].tolist()[0],
-                                'time': focus_group['DATE-OBS'].tolist()[0],
-                                'mode_name': mode_name,
-                                'notes': self.notes,
-                                'focus': round(self.__best_focus, 10),
-                                'fwhm': round(self.__best_fwhm, 10),
-                                'best_image_name': self.__best_image,
-                                'best_image_focus': round(self.__best_image_focus, 10),
-                                'best_image_fwhm': round(self.__best_image_fwhm, 10),
-                                'focus_data': focus_dataframe['focus'].tolist(),
-                                'fwhm_data': focus_dataframe['fwhm'].tolist()
-                                })
-
-                if self.plot_results:   # pragma: no cover
-
-                    fig, ax = plt.subplots()
-
-                    focus_list = focus_dataframe['focus'].tolist()
-                    fwhm_list = focus_dataframe['fwhm'].tolist()
+                results.append(FocusResult(date=focus_group['DATE'].tolist()[0],
+                                           time=focus_group['DATE-OBS'].tolist()[0],
+                                           mode_name=mode_name,
+                                           notes=self.notes,
+                                           focus=round(self.__best_focus, 10),
+                                           fwhm=round(self.__best_fwhm, 10),
+                                           best_image_name=self.__best_image,
+                                           best_image_focus=round(self.__best_image_focus, 10),
+                                           best_image_fwhm=round(self.__best_image_fwhm, 10),
+                                           measurements=measurements,
+                                           skipped_files=self.skipped_files if self.coarse_to_fine else None,
+                                           line_focus=self._get_line_focus() if self.per_line_focus else None))
+                if self.template_store is not None:
+                    self._update_line_template()
+                if self.history is not None:
+                    self._record_history(group=focus_group, result=results[-1])
+
+                if self.plot_results:
+                    focus_list = measurements.focus.tolist()
                     new_x_axis = np.linspace(focus_list[0], focus_list[-1], 1000)
-
-                    ax.plot(focus_list, fwhm_list, marker='x', label='Measured FWHM')
-                    ax.axvline(self.__best_focus, color='k', label='Best Focus')
-                    ax.set_title(f"Best Focus:\n{mode_name} {self.__best_focus:.3f}")
-                    ax.set_xlabel("Focus Value")
-                    if 'IM_' in mode_name:
-                        ax.set_ylabel("FWHM")
-                    else:
-                        ax.set_ylabel("Mean FWHM")
-                    ax.plot(new_x_axis,
-                            self.polynomial(new_x_axis), label='Model')
-                    ax.legend(loc='best')
-                    plt.show()
+                    plot_arguments = {'mode_name': mode_name,
+                                      'focus': focus_list,
+                                      'fwhm': measurements.fwhm.tolist(),
+                                      'best_focus': self.__best_focus,
+                                      'model_x_axis': new_x_axis,
+                                      'model_fwhm': self._get_model_fwhm(new_x_axis)}
+                    if self.renderer is not None:
+                        self.renderer.plot_focus(date=focus_group['DATE'].tolist()[0],
+                                                 first_file=focus_group['file'].tolist()[0],
+                                                 **plot_arguments)
+                    else:   # pragma: no cover
+                        fig, ax = plt.subplots()
+                        draw_focus(ax, **plot_arguments)
+                        plt.show()
             except ValueError as error:
                 self.log.error(f"Unable to obtain focus due to ValueError: {str(error)}", exc_info=True)
 
+        if self.recorder is not None:
+            self.recorder.save(self.diagnostics)
+
+        if self.renderer is not None:
+            written = self.renderer.close()
+            self.renderer = None
+            self.log.info(f"Wrote {len(written)} plot files to {self.plot_dir}")
+
+        self._add_timing(stage='total', start=call_start)
+        self.log.debug(f"Timings: {self.timings}")
         return results
 
+    def _add_timing(self, stage, start):
+        """Add the time elapsed since `start` to a stage of `timings`"""
+        self.timings[stage] = self.timings.get(stage, 0.) + time.perf_counter() - start
+
     @property
     def fwhm(self):
         return self._fwhm
@@ -490,12 +1638,25 @@ class GoodmanFocus(object):
             self._fwhm = value
 
     def _fit(self, df):
-        """
+        """Fit the focus curve and find the best focus
+
+        Away from the best focus the FWHM grows as a hyperbola, so a parabola
+        is fitted to the square of the FWHM. It is obtained with a linear least
+        squares fit where every frame is weighted by the inverse of the
+        uncertainty of its squared FWHM, twice the FWHM times its uncertainty,
+        see `get_fit_weights`, so noisy frames have less influence. With only
+        three coefficients short sweeps are not interpolated, noise included.
+        Focus values are mapped from their range to [-1, 1] through the
+        `domain` and `window` of the polynomial, otherwise the fit is poorly
+        conditioned.
 
         Args:
-            df:
+            df (DataFrame): Columns `file`, `fwhm` and `focus` and optionally
+              `fwhm_error`. Without it every frame has the same weight.
 
         Returns:
+            The polynomial fitted to the square of the FWHM, see
+            `_get_model_fwhm`.
 
         """
         self.__focus = df['focus'].tolist()
@@ -503,7 +1664,17 @@ class GoodmanFocus(object):
         self.__files = df['file'].tolist()
         max_focus = np.max(self.__focus)
         min_focus = np.min(self.__focus)
-        self.polynomial = self.fitter(self.polynomial, self.__focus, self.__fwhm)
+        fwhm = np.abs(np.asarray(self.__fwhm, dtype=float))
+        weights = get_fit_weights(df['fwhm_error']) if 'fwhm_error' in df.columns else None
+        if weights is None:
+            weights = np.ones(len(fwhm))
+        weights = weights / (2. * np.maximum(fwhm, 0.1 * np.median(fwhm)))
+        center = (max_focus + min_focus) / 2.
+        half_range = max((max_focus - min_focus) / 2., 1.)
+        polynomial = models.Polynomial1D(degree=self.polynomial.degree,
+                                         domain=(center - half_range, center + half_range),
+                                         window=(-1, 1))
+        self.polynomial = self.fitter(polynomial, self.__focus, fwhm ** 2, weights=weights)
         try:
             self._get_local_minimum(x1=min_focus, x2=max_focus)
             self.notes = f"Focus obtained by using Brent's optimization method."
@@ -523,6 +1694,66 @@ class GoodmanFocus(object):
 
         return self.polynomial
 
+    def _get_line_focus(self):
+        """Best focus of every tracked line of the last processed group
+
+        Returns:
+            A dictionary with the position (column) of every line, its best
+            focus and FWHM at best focus as well as the compromise focus that
+            minimizes the mean FWHM of all lines.
+
+        """
+        positions, fwhm_matrix = self.line_tracker.get_fwhm_matrix()
+        line_focus = fit_line_focus_curves(focus=self.line_tracker_focus, fwhm_matrix=fwhm_matrix)
+        fitted = np.isfinite(line_focus['best_focus'])
+        self.log.info(f"Fitted focus curves for {np.sum(fitted)} of {len(positions)} lines, "
+                      f"compromise focus: {line_focus['compromise_focus']}")
+        return {'line_position': positions[fitted].tolist(),
+                'best_focus': line_focus['best_focus'][fitted].tolist(),
+                'best_fwhm': line_focus['best_fwhm'][fitted].tolist(),
+                'compromise_focus': float(line_focus['compromise_focus']),
+                'compromise_fwhm': float(line_focus['compromise_fwhm'])}
+
+    def _seed_line_template(self, group):
+        """Start tracking from the stored line template of a spectroscopic group
+
+        Args:
+            group (DataFrame): Focus group being processed.
+
+        Returns:
+            `True` if the tracker was seeded from a template.
+
+        """
+        self._template_settings = None
+        required = ['INSTCONF', 'FILTER', 'FILTER2', 'WAVMODE', 'ROI', 'CCDSUM']
+        if not all([column in group.columns for column in required]):
+            return False
+
+        mode_name = self._get_mode_name(group)
+        if not mode_name.startswith('SP'):
+            return False
+
+        self._template_settings = (mode_name, group['CCDSUM'].iloc[0], group['ROI'].iloc[0])
+        template = self.template_store.get(*self._template_settings)
+        if template is None:
+            self.log.debug(f"No line template for {mode_name}")
+            return False
+
+        self.log.debug(f"Using line template with {len(template['positions'])} lines for {mode_name}")
+        self.line_tracker.seed(centers=template['positions'], widths=template['widths'])
+        return True
+
+    def _update_line_template(self):
+        """Store the lines of the frame closest to best focus as the new template"""
+        if self._template_settings is None or self.notes.startswith('Warning') \
+                or not self.line_tracker.history:
+            return
+        index = np.argmin(np.abs(np.array(self.line_tracker_focus) - self.__best_focus))
+        _, centers, fwhm = self.line_tracker.history[index]
+        self.template_store.update(*self._template_settings,
+                                   positions=centers,
+                                   widths=fwhm * gaussian_fwhm_to_sigma)
+
     def _get_local_minimum(self, x1, x2, x_axis_size=2000):
         """Finds best focus
 
@@ -544,10 +1775,167 @@ class GoodmanFocus(object):
         middle_point = x_axis[index_of_minimum]
 
         self.__best_focus = optimize.brent(self.polynomial, brack=(x1, middle_point, x2))
-        self.__best_fwhm = self.polynomial(self.__best_focus)
+        self.__best_fwhm = self._get_model_fwhm(self.__best_focus)
 
         return self.__best_focus
 
+    def _get_model_fwhm(self, focus):
+        """FWHM of the fitted focus curve, the square root of `polynomial`"""
+        return np.sqrt(np.clip(self.polynomial(focus), 0, None))
+
+    def _group_by_configuration(self, file_collection):
+        """Split a collection of files in groups of identical configuration
+
+        Args:
+            file_collection (DataFrame): One row per file with at least the
+              columns defined in `configuration_keywords`.
+
+        Returns:
+            A list of `pandas.DataFrame`, one per instrument configuration.
+
+        """
+        focus_groups = []
+        for _, focus_group in file_collection.groupby(self.configuration_keywords,
+                                                      dropna=False,
+                                                      sort=True):
+            focus_groups.append(focus_group)
+        self.log.debug(f"Found {len(focus_groups)} different configurations")
+        return focus_groups
+
+    def _read_headers(self, files):
+        """Read the header of every file in a list
+
+        The header of every file and the offset of its data are kept in
+        `_header_cache` so that the data is read later on without parsing the
+        header again. The data of compressed files is not decompressed, see
+        `read_focus_header`. Files whose header can't be read, for instance
+        while they are being written, are skipped with a warning.
+
+        Args:
+            files (list): File names relative to `full_path`.
+
+        Returns:
+            a `pandas.DataFrame` with a `file` column and one column per
+            keyword in `keywords`.
+
+        """
+        rows = []
+        for _file in files:
+            try:
+                header, data_offset = read_focus_header(os.path.join(self.full_path, _file), return_offset=True)
+            except (OSError, ValueError) as error:
+                self.log.warning(f"Unable to read header of {_file}: {str(error)}")
+                continue
+            self._header_cache[_file] = (header, data_offset)
+            rows.append([_file] + [header.get(key, None) for key in self.keywords])
+
+        return pandas.DataFrame(rows, columns=['file'] + self.keywords)
+
+    def _read_ccd(self, file_name):
+        """Read the data of a file reusing its cached header when available
+
+        Single images whose header is cached are read at the offset of their
+        data without parsing the header again. Multi-extension files are read
+        with `read_focus_frame`, using the executor to read the extensions in
+        parallel when its workers run on this host and there is more than one,
+        so the bands are not sent over the network.
+
+        Args:
+            file_name (str): File name relative to `full_path`.
+
+        Returns:
+            A `CCDData` instance.
+
+        """
+        executor = self.executor \
+            if self.executor is not None and self.executor.local and self.executor.workers > 1 else None
+        cached_header, data_offset = self._header_cache.get(file_name, (None, None))
+        data, header = read_focus_frame(file_path=os.path.join(self.full_path, file_name),
+                                        executor=executor,
+                                        half_width=self.group_parameters.band_half_width,
+                                        header=cached_header,
+                                        data_offset=data_offset)
+        header = cached_header if cached_header is not None else header
+
+        return CCDData(data=data, meta=header, unit='adu')
+
+    def _get_dtype(self):
+        """Type of the profiles for the selected `precision`"""
+        return np.float32 if self.precision == 'float32' else None
+
+    def _can_map_groups(self):
+        """Whether the focus groups can be sent to the executor
+
+        Every group is processed by a separate `GoodmanFocus` instance, so this
+        is not possible when diagnostics are saved to a single file or plots
+        need to be shown.
+        """
+        return self.executor is not None \
+            and len(self.focus_groups) > 1 \
+            and self.diagnostics is None \
+            and (self.plot_dir is not None or not (self.plot_results or self.debug))
+
+    def _can_map_files(self):
+        """Whether the files of a group can be sent to the executor
+
+        Files are independent only when lines are not tracked from one frame
+        to the next, and no diagnostics or debug plots are produced.
+        """
+        return self.executor is not None \
+            and not self.track_lines \
+            and self.recorder is None \
+            and not self.debug
+
+    def _get_group_tasks(self):
+        """Tasks of `process_focus_group` for every focus group"""
+        parameters = self._get_task_parameters()
+        return [(parameters, group['file'].tolist()) for group in self.focus_groups]
+
+    def _record_group_history(self, group_results):
+        """Store the results of `process_focus_group` in the focus history"""
+        for focus_group, results in zip(self.focus_groups, group_results):
+            for result in results:
+                self._record_history(group=focus_group, result=result)
+
+    def _record_history(self, group, result):
+        """Store a result in the focus history with the median temperature of its group"""
+        temperatures = pandas.to_numeric(group[TEMPERATURE_KEYWORD], errors='coerce').dropna()
+        temperature = float(temperatures.median()) if not temperatures.empty else None
+        try:
+            with FocusHistory(path=self.history) as focus_history:
+                focus_history.add(mode_name=result.mode_name,
+                                  date_obs=result.time,
+                                  focus=result.focus,
+                                  fwhm=result.fwhm,
+                                  best_image_name=result.best_image_name,
+                                  temperature=temperature,
+                                  date=result.date,
+                                  data_path=self.full_path)
+        except sqlite3.Error as error:
+            self.log.error(f"Unable to store result of {result.mode_name} in {self.history}: {str(error)}")
+
+    def _get_task_parameters(self):
+        """Arguments to recreate this instance in a per-group task"""
+        return {'data_path': self.full_path,
+                'file_pattern': self.file_pattern,
+                'obstype': self.obstype,
+                'features_model': self.features_model,
+                'selection_threshold': self.selection_threshold,
+                'plot_results': self.plot_results,
+                'track_lines': self.track_lines,
+                'per_line_focus': self.per_line_focus,
+                'line_templates': self.line_templates,
+                'plot_dir': self.plot_dir,
+                'plot_formats': tuple(self.plot_formats),
+                'plot_workers': 0,
+                'coarse_to_fine': self.coarse_to_fine,
+                'focus_tolerance': self.focus_tolerance,
+                'precision': self.precision,
+                'imaging_fast_path': self.imaging_fast_path,
+                'extraction_parameters': self.extraction_parameters,
+                'exit_on_error': False,
+                'debug': self.debug}
+
     @staticmethod
     def _get_mode_name(group):
         """Defines a string characteristic of the instrument configuration
@@ -585,6 +1973,198 @@ class GoodmanFocus(object):
         # mode_name = re.sub('[- ]', '_', mode_name)
         return mode_name
 
+    def _measure_files(self, group, template_seeded=False):
+        """Measure the FWHM of every file of a group in this process
+
+        Args:
+            group (DataFrame): Focus group being processed.
+            template_seeded (bool): Whether the line tracker was seeded from a
+              line template.
+
+        Yields:
+            The file name, FWHM, focus value and FWHM uncertainty of every
+            file.
+
+        """
+        for file_name in group.file.tolist():
+            self.log.debug(f"Processing file: {file_name}")
+            start = time.perf_counter()
+            self.__ccd = self._read_ccd(file_name=file_name)
+            self._add_timing(stage='read', start=start)
+            start = time.perf_counter()
+            if self.recorder is not None:
+                self.recorder.start_frame(file_name=file_name)
+
+            if self.track_lines:
+                x_axis, profile = get_profile(ccd=self.__ccd,
+                                              recorder=self.recorder,
+                                              dtype=self._get_dtype(),
+                                              parameters=self.group_parameters)
+                fwhm, fwhm_error = self.line_tracker(x_axis=x_axis,
+                                                     profile=profile,
+                                                     threshold_for_selecting_peaks=self.selection_threshold,
+                                                     recorder=self.recorder,
+                                                     return_error=True)
+                self.line_tracker_focus.append(self.__ccd.header['CAM_FOC'])
+                if template_seeded and self.line_tracker.frames == 1 and self.line_tracker.detections > 0:
+                    self.template_store.invalidate(*self._template_settings)
+            elif self.imaging_fast_path and not self.debug and self.__ccd.header.get('WAVMODE', None) == 'IMAGING':
+                fwhm, fwhm_error = get_slit_fwhm(ccd=self.__ccd,
+                                                 model=self.feature_model,
+                                                 dtype=self._get_dtype(),
+                                                 recorder=self.recorder,
+                                                 parameters=self.group_parameters,
+                                                 return_error=True)
+            else:
+                peaks, values, x_axis, profile = get_peaks(
+                    ccd=self.__ccd,
+                    file_name=file_name,
+                    threshold_for_selecting_peaks=self.selection_threshold,
+                    plots=self.debug,
+                    renderer=self.renderer,
+                    recorder=self.recorder,
+                    dtype=self._get_dtype(),
+                    parameters=self.group_parameters)
+
+                fwhm, fwhm_error = get_fwhm(peaks=peaks,
+                                            values=values,
+                                            x_axis=x_axis,
+                                            profile=profile,
+                                            model=self.feature_model,
+                                            recorder=self.recorder,
+                                            executor=self.executor,
+                                            parameters=self.group_parameters,
+                                            return_error=True)
+
+            if self.recorder is not None:
+                self.recorder.record(focus=self.__ccd.header['CAM_FOC'])
+
+            self._add_timing(stage='measure', start=start)
+            yield file_name, fwhm, self.__ccd.header['CAM_FOC'], fwhm_error
+
+    def _measure_group(self, group, template_seeded=False):
+        """Measure the FWHM of every file of a group
+
+        Files are sent to the executor when possible, otherwise they are
+        measured in this process by `_measure_files`.
+
+        Returns:
+            An iterable of the file name, FWHM, focus value and FWHM
+            uncertainty of every file, in the same order as the group.
+
+        """
+        if not self._can_map_files():
+            return self._measure_files(group=group, template_seeded=template_seeded)
+
+        self.log.debug(f"Processing {group.shape[0]} files with {self.executor.__class__.__name__}")
+        files = group['file'].tolist()
+        tasks = [(os.path.join(self.full_path, _file),
+                  self.features_model,
+                  self.selection_threshold,
+                  self.precision,
+                  self.imaging_fast_path,
+                  self.group_parameters,
+                  True) for _file in files]
+        start = time.perf_counter()
+        measurements = self.executor.map(measure_file_fwhm, tasks)
+        self._add_timing(stage='measure', start=start)
+        return [(_file, fwhm, focus, fwhm_error) for _file, (fwhm, focus, fwhm_error) in zip(files, measurements)]
+
+    def _measure_coarse_to_fine(self, group, coarse_frames=7):
+        """Measure only the files needed to locate the best focus
+
+        Files are sorted by focus and `coarse_frames` of them, evenly spread
+        and including both ends, are measured first. Then the focus curve is
+        fitted and the closest unmeasured files on each side of the provisional
+        best focus are measured, until the best focus is bracketed within
+        `focus_tolerance` or there are no unmeasured files in the bracket. The
+        names of the files not measured are stored in `skipped_files`.
+
+        Args:
+            group (DataFrame): Focus group being processed.
+            coarse_frames (int): Number of files of the first pass, at least
+              as many as the coefficients of the focus curve.
+
+        Returns:
+            A list of the file name, FWHM, focus value and FWHM uncertainty of
+            every file measured.
+
+        """
+        group = group.sort_values(by='CAM_FOC')
+        focus = group['CAM_FOC'].to_numpy(dtype=float)
+        fwhm = np.full(len(focus), np.nan)
+        fwhm_error = np.full(len(focus), np.nan)
+        measured = np.zeros(len(focus), dtype=bool)
+        measurements = []
+
+        coarse_frames = max(coarse_frames, len(self.polynomial.parameters) + 1)
+        indices = np.unique(np.round(np.linspace(0, len(focus) - 1, min(coarse_frames, len(focus)))).astype(int))
+        while len(indices) > 0:
+            for index, measurement in zip(indices, self._measure_group(group=group.iloc[indices])):
+                measured[index] = True
+                fwhm[index] = measurement[1] if measurement[1] else np.nan
+                fwhm_error[index] = measurement[3]
+                measurements.append(measurement)
+            indices = self._get_refinement_indices(files=group['file'].to_numpy(),
+                                                   focus=focus,
+                                                   fwhm=fwhm,
+                                                   measured=measured,
+                                                   fwhm_error=fwhm_error)
+
+        self.skipped_files = group['file'][~measured].tolist()
+        self.log.info(f"Measured {np.sum(measured)} of {len(focus)} files, "
+                      f"skipped {len(self.skipped_files)}")
+        return measurements
+
+    def _get_refinement_indices(self, files, focus, fwhm, measured, fwhm_error=None):
+        """Select the next files to measure around the provisional best focus
+
+        Args:
+            files (numpy.ndarray): File names sorted by focus.
+            focus (numpy.ndarray): Focus value of every file.
+            fwhm (numpy.ndarray): FWHM of the measured files, `nan` otherwise.
+            measured (numpy.ndarray): Mask of files already measured.
+            fwhm_error (numpy.ndarray): Uncertainty of the FWHM of the measured
+              files, used to weight the fit.
+
+        Returns:
+            A list with the indices of the files to measure next, empty when
+            the best focus is already known within `focus_tolerance`.
+
+        """
+        pending = np.flatnonzero(~measured)
+        valid = np.isfinite(fwhm)
+        if len(pending) == 0:
+            return []
+        if np.sum(valid) <= len(self.polynomial.parameters):
+            self.log.debug("Not enough FWHM values to fit the focus curve, measuring every file")
+            return pending
+
+        if fwhm_error is None:
+            fwhm_error = np.full(len(focus), np.nan)
+        self._fit(df=pandas.DataFrame({'file': files[valid],
+                                       'fwhm': fwhm[valid],
+                                       'focus': focus[valid],
+                                       'fwhm_error': fwhm_error[valid]}))
+        best_focus = self.__best_focus
+        below = focus[valid & (focus <= best_focus)]
+        above = focus[valid & (focus >= best_focus)]
+        low = below.max() if len(below) > 0 else focus.min()
+        high = above.min() if len(above) > 0 else focus.max()
+        self.log.debug(f"Provisional best focus {best_focus} bracketed by {low} and {high}")
+        if (high - low) / 2. <= self.focus_tolerance:
+            return []
+
+        inside = pending[(focus[pending] > low) & (focus[pending] < high)]
+        indices = []
+        left = inside[focus[inside] <= best_focus]
+        if len(left) > 0:
+            indices.append(left[-1])
+        right = inside[focus[inside] > best_focus]
+        if len(right) > 0:
+            indices.append(right[0])
+        return indices
+
     def get_focus_data(self, group):
         """Collects all the relevant data for finding best focus
 
@@ -597,39 +2177,123 @@ class GoodmanFocus(object):
             most likely in series and with the same configuration.
 
         Returns:
-            a `pandas.DataFrame` with three columns. `file`, `fwhm` and `focus`.
+            a `pandas.DataFrame` with four columns. `file`, `fwhm`, `focus`
+            and `fwhm_error`.
 
         """
+        return self._get_measurements(group=group).to_pandas()
+
+    def _get_measurements(self, group):
+        """Measure the files of a group, see `get_focus_data`
+
+        Returns:
+            A `FocusMeasurements` instance with the files whose FWHM could be
+            obtained, in order of focus.
+
+        """
+        self.group_parameters = self.extraction_parameters or get_extraction_parameters(group.iloc[0])
+        self.log.debug(f"Using {self.group_parameters}")
+
+        template_seeded = False
+        if self.track_lines:
+            self.line_tracker = LineTracker(model=self.feature_model,
+                                            initial_stddev=self.group_parameters.initial_stddev,
+                                            parameters=self.group_parameters)
+            self.line_tracker_focus = []
+            if 'CAM_FOC' in group.columns:
+                group = group.sort_values(by='CAM_FOC')
+            template_seeded = self.template_store is not None and self._seed_line_template(group=group)
+
+        self.skipped_files = []
+        if self.coarse_to_fine and not self.track_lines and 'CAM_FOC' in group.columns:
+            measurements = self._measure_coarse_to_fine(group=group)
+        else:
+            if self.coarse_to_fine:
+                self.log.warning("Coarse to fine evaluation requires the CAM_FOC keyword "
+                                 "and is not used when tracking lines")
+            measurements = self._measure_group(group=group, template_seeded=template_seeded)
+
         focus_data = []
-        for self.file_name in group.file.tolist():
-            self.log.debug(f"Processing file: {self.file_name}")
-            self.__ccd = CCDData.read(os.path.join(self.full_path,
-                                                   self.file_name),
-                                      unit='adu')
-
-            peaks, values, x_axis, profile = get_peaks(
-                ccd=self.__ccd,
-                file_name=self.file_name,
-                threshold_for_selecting_peaks=self.selection_threshold,
-                plots=self.debug)
-
-            self.fwhm = get_fwhm(peaks=peaks,
-                                 values=values,
-                                 x_axis=x_axis,
-                                 profile=profile,
-                                 model=self.feature_model)
-
-            self.log.info(f"File: {self.file_name} Focus: {self.__ccd.header['CAM_FOC']} FWHM: {self.fwhm}")
+        for self.file_name, self.fwhm, focus, fwhm_error in measurements:
+            self.log.info(f"File: {self.file_name} Focus: {focus} FWHM: {self.fwhm} +/- {fwhm_error}")
             if self.fwhm:
-                focus_data.append([self.file_name, self.fwhm, self.__ccd.header['CAM_FOC']])
+                focus_data.append([self.file_name, self.fwhm, focus, fwhm_error])
             else:
-                self.log.warning(f"File: {self.file_name} FWHM is: {self.fwhm} FOCUS: {self.__ccd.header['CAM_FOC']}")
+                self.log.warning(f"File: {self.file_name} FWHM is: {self.fwhm} FOCUS: {focus}")
 
-        focus_data_frame = pandas.DataFrame(
-            focus_data,
-            columns=['file', 'fwhm', 'focus']).sort_values(by='focus')
+        return FocusMeasurements.from_records(focus_data).sort_by_focus()
+
+
+def measure_file_fwhm(file_path,
+                      features_model='gaussian',
+                      selection_threshold=2,
+                      precision='float64',
+                      imaging_fast_path=True,
+                      parameters=None,
+                      return_error=False):
+    """Measure the FWHM of a single file
+
+    This is the per-file task sent to an `Executor` by
+    `GoodmanFocus.get_focus_data`, it only needs the location of the file so it
+    can run on any node with access to the data.
+
+    Args:
+        file_path (str): Full path to the file.
+        features_model (str): `gaussian` or `moffat`.
+        selection_threshold (float): Factor of the profile's standard deviation
+          to discriminate peaks.
+        precision (str): `float64` or `float32`, see `GoodmanFocus`.
+        imaging_fast_path (bool): Measure imaging frames with `get_slit_fwhm`.
+        parameters (ExtractionParameters): Parameters of the focus group.
+          Default `DEFAULT_PARAMETERS`.
+        return_error (bool): Also return the uncertainty of the FWHM.
 
-        return focus_data_frame
+    Returns:
+        The FWHM, or `None`, and the focus value of the file, followed by the
+        uncertainty of the FWHM when `return_error` is set.
+
+    """
+    parameters = parameters or DEFAULT_PARAMETERS
+    data, header = read_focus_frame(file_path=file_path, half_width=parameters.band_half_width)
+    ccd = CCDData(data=data, meta=header, unit='adu')
+
+    model = models.Moffat1D() if features_model == 'moffat' else models.Gaussian1D()
+    dtype = np.float32 if precision == 'float32' else None
+    if imaging_fast_path and ccd.header.get('WAVMODE', None) == 'IMAGING':
+        fwhm, fwhm_error = get_slit_fwhm(ccd=ccd, model=model, dtype=dtype, parameters=parameters, return_error=True)
+    else:
+        peaks, values, x_axis, profile = get_peaks(ccd=ccd,
+                                                   file_name=os.path.basename(file_path),
+                                                   threshold_for_selecting_peaks=selection_threshold,
+                                                   dtype=dtype,
+                                                   parameters=parameters)
+        fwhm, fwhm_error = get_fwhm(peaks=peaks,
+                                    values=values,
+                                    x_axis=x_axis,
+                                    profile=profile,
+                                    model=model,
+                                    parameters=parameters,
+                                    return_error=True)
+    if return_error:
+        return fwhm, ccd.header['CAM_FOC'], fwhm_error
+    return fwhm, ccd.header['CAM_FOC']
+
+
+def process_focus_group(parameters, files):
+    """Obtain the best focus of a single group of files
+
+    This is the per-group task sent to an `Executor` by `GoodmanFocus`.
+
+    Args:
+        parameters (dict): Arguments for `GoodmanFocus`.
+        files (list): Files of the group, relative to `data_path`.
+
+    Returns:
+        A list with the `FocusResult` of the group.
+
+    """
+    goodman_focus = GoodmanFocus(**parameters)
+    return goodman_focus.run(files=files)
 
 
 def run_goodman_focus(args=None):   # pragma: no cover
@@ -665,9 +2329,34 @@ def run_goodman_focus(args=None):   # pragma: no cover
                                  obstype=args.obstype,
                                  features_model=args.features_model,
                                  plot_results=args.plot_results,
+                                 track_lines=args.track_lines,
+                                 per_line_focus=args.per_line_focus,
+                                 line_templates=args.line_templates,
+                                 plot_dir=args.plot_dir,
+                                 plot_formats=args.plot_formats or ['png'],
+                                 diagnostics=args.diagnostics,
+                                 use_index=args.use_index,
+                                 index_path=args.index_path,
+                                 coarse_to_fine=args.coarse_to_fine,
+                                 focus_tolerance=args.focus_tolerance,
+                                 precision=args.precision,
+                                 imaging_fast_path=args.imaging_fast_path,
+                                 history=args.history,
                                  debug=args.debug)
 
-    results = goodman_focus()
+    if args.executor is not None:
+        goodman_focus.executor = get_executor(
+            name=args.executor,
+            workers=args.workers,
+            address=parse_address(args.executor_address))
+        if args.executor == 'distributed':
+            log.info(f"Distributed executor listening on {goodman_focus.executor.address}")
+
+    try:
+        results = goodman_focus()
+    finally:
+        if goodman_focus.executor is not None:
+            goodman_focus.executor.close()
     log.info("Summary")
     for result in results:
         log.info(json.dumps(result, indent=4))
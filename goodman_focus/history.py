@@ -0,0 +1,350 @@
+import argparse
+import datetime
+import json
+import numpy as np
+import os
+import sqlite3
+
+import logging
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.expanduser('~'), '.goodman_focus', 'focus_history.sqlite')
+
+TEMPERATURE_KEYWORD = 'ENVTEM'
+
+_COLUMNS = ['mode_name', 'date', 'date_obs', 'focus', 'fwhm', 'best_image_name', 'temperature', 'data_path']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS focus_results (
+    mode_name TEXT NOT NULL,
+    date TEXT,
+    date_obs TEXT NOT NULL,
+    focus REAL NOT NULL,
+    fwhm REAL,
+    best_image_name TEXT,
+    temperature REAL,
+    data_path TEXT,
+    PRIMARY KEY (mode_name, date_obs)
+);
+CREATE INDEX IF NOT EXISTS focus_results_date_obs ON focus_results (date_obs);
+"""
+
+
+def _to_float(value):
+    """Convert a header or JSON value to float, `None` if it is not a number"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not np.isfinite(value):
+        return None
+    return value
+
+
+def _parse_date(value):
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(str(value))
+    except ValueError:
+        return datetime.datetime.fromisoformat(str(value)[:10])
+
+
+class FocusHistory(object):
+    """SQLite database of the best focus obtained for every mode
+
+    Every result is stored with its mode name, date, best focus, FWHM and,
+    when available, the temperature at the time of the sequence. A result is
+    identified by its mode name and `DATE-OBS`, so storing the same sequence
+    twice, for instance when reprocessing old data, replaces it.
+
+    Args:
+        path (str): Location of the database. It is created when first used.
+
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path)
+            self._connection.executescript(_SCHEMA)
+        return self._connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the connection to the database"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def add(self,
+            mode_name,
+            date_obs,
+            focus,
+            fwhm=None,
+            best_image_name=None,
+            temperature=None,
+            date=None,
+            data_path=None):
+        """Store or replace a single result
+
+        Args:
+            mode_name (str): Mode name as returned by `GoodmanFocus._get_mode_name`.
+            date_obs (str): Value of `DATE-OBS` of the first file of the sequence.
+            focus (float): Best focus.
+            fwhm (float): FWHM at best focus.
+            best_image_name (str): File closest to the best focus.
+            temperature (float): Temperature during the sequence.
+            date (str): Value of `DATE`, defaults to the date part of `date_obs`.
+            data_path (str): Directory of the data.
+
+        """
+        if date is None:
+            date = str(date_obs)[:10]
+        with self.connection:
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO focus_results ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                (mode_name, date, str(date_obs), float(focus), _to_float(fwhm),
+                 best_image_name, _to_float(temperature), data_path))
+
+    def add_result(self, result, temperature=None, data_path=None):
+        """Store a result as returned by `GoodmanFocus`
+
+        Args:
+            result (dict): A single result.
+            temperature (float): Temperature during the sequence. By default the
+              `temperature` key of the result is used if present.
+            data_path (str): Directory of the data.
+
+        """
+        if temperature is None:
+            temperature = result.get('temperature', None)
+        self.add(mode_name=result['mode_name'],
+                 date_obs=result['time'],
+                 focus=result['focus'],
+                 fwhm=result.get('fwhm', None),
+                 best_image_name=result.get('best_image_name', None),
+                 temperature=temperature,
+                 date=result.get('date', None),
+                 data_path=data_path)
+
+    def add_results(self, results, data_path=None):
+        """Store a list of results as returned by `GoodmanFocus`
+
+        Results without a best focus are ignored.
+
+        Returns:
+            The number of results stored.
+
+        """
+        stored = 0
+        for result in results:
+            if _to_float(result.get('focus', None)) is None:
+                log.warning(f"Ignoring result of {result.get('mode_name', None)} without best focus")
+                continue
+            self.add_result(result=result, data_path=data_path)
+            stored += 1
+        return stored
+
+    def import_json(self, path):
+        """Seed the database from a JSON file of results
+
+        The file must contain a list of results, as returned by `GoodmanFocus`
+        or written by a batch reprocessing, or an object with such a list under
+        `results`.
+
+        Args:
+            path (str): Location of the JSON file.
+
+        Returns:
+            The number of results stored.
+
+        """
+        with open(path) as json_file:
+            content = json.load(json_file)
+        if isinstance(content, dict):
+            content = content.get('results', [])
+        stored = self.add_results(results=content, data_path=os.path.dirname(os.path.abspath(path)))
+        log.info(f"Imported {stored} results from {path}")
+        return stored
+
+    def get_modes(self):
+        """Mode names present in the database"""
+        cursor = self.connection.execute("SELECT DISTINCT mode_name FROM focus_results ORDER BY mode_name")
+        return [row[0] for row in cursor]
+
+    def query(self, mode_name=None, start=None, end=None, limit=None):
+        """Get stored results ordered by date
+
+        Args:
+            mode_name (str): Only results of this mode.
+            start (str): Only results with `DATE-OBS` at or after this ISO date.
+            end (str): Only results with `DATE-OBS` before this ISO date.
+            limit (int): Return only the most recent results.
+
+        Returns:
+            A list of dictionaries with the stored columns, oldest first.
+
+        """
+        conditions = []
+        parameters = []
+        if mode_name is not None:
+            conditions.append('mode_name = ?')
+            parameters.append(mode_name)
+        if start is not None:
+            conditions.append('date_obs >= ?')
+            parameters.append(str(start))
+        if end is not None:
+            conditions.append('date_obs < ?')
+            parameters.append(str(end))
+        statement = f"SELECT {', '.join(_COLUMNS)} FROM focus_results"
+        if conditions:
+            statement += f" WHERE {' AND '.join(conditions)}"
+        statement += " ORDER BY date_obs DESC"
+        if limit is not None:
+            statement += " LIMIT ?"
+            parameters.append(int(limit))
+        rows = self.connection.execute(statement, parameters).fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in reversed(rows)]
+
+    def predict(self,
+                mode_name,
+                temperature=None,
+                date=None,
+                max_age_days=365,
+                max_results=30,
+                min_temperature_range=1.,
+                sigma=3.,
+                min_half_width=100.):
+        """Predict the best focus of a mode and a narrow range to sweep
+
+        When a temperature is given and at least three recent results have a
+        temperature spread of `min_temperature_range` the best focus is
+        predicted with a linear fit of focus against temperature. Otherwise
+        the median of the recent results is used. The recommended range is the
+        prediction plus or minus `sigma` times the scatter of the results
+        around the prediction, but not narrower than `min_half_width`.
+
+        Args:
+            mode_name (str): Mode name.
+            temperature (float): Expected temperature.
+            date (str): Date of the prediction, only older results are used.
+              Defaults to the most recent result.
+            max_age_days (float): Ignore results older than this many days
+              before `date`.
+            max_results (int): Use at most this many of the most recent results.
+            min_temperature_range (float): Minimum temperature spread to use the
+              temperature fit.
+            sigma (float): Width of the range in units of the scatter.
+            min_half_width (float): Minimum half width of the range in focus
+              units.
+
+        Returns:
+            A dictionary with `mode_name`, `focus`, `low`, `high`, `scatter`,
+            `samples` and `method` or `None` if there are no results for the
+            mode.
+
+        """
+        date = _parse_date(date)
+        records = self.query(mode_name=mode_name,
+                             end=date.isoformat() if date is not None else None,
+                             limit=max_results)
+        if date is None and records:
+            date = _parse_date(records[-1]['date_obs'])
+        if max_age_days is not None and date is not None:
+            oldest = date - datetime.timedelta(days=max_age_days)
+            records = [record for record in records if _parse_date(record['date_obs']) >= oldest]
+        if not records:
+            log.warning(f"No focus history for mode {mode_name}")
+            return None
+
+        focus = np.array([record['focus'] for record in records])
+        temperatures = np.array([np.nan if record['temperature'] is None else record['temperature']
+                                 for record in records])
+        with_temperature = np.isfinite(temperatures)
+
+        method = 'median'
+        if temperature is not None and np.count_nonzero(with_temperature) >= 3 \
+                and np.ptp(temperatures[with_temperature]) >= min_temperature_range:
+            slope, intercept = np.polyfit(temperatures[with_temperature], focus[with_temperature], 1)
+            predicted = slope * float(temperature) + intercept
+            residuals = focus[with_temperature] - (slope * temperatures[with_temperature] + intercept)
+            scatter = np.sqrt(np.sum(residuals ** 2) / max(len(residuals) - 2, 1))
+            method = 'temperature'
+        else:
+            predicted = np.median(focus)
+            scatter = 1.4826 * np.median(np.abs(focus - predicted))
+
+        half_width = max(min_half_width, sigma * scatter)
+        log.debug(f"Predicted focus {predicted:.1f} for {mode_name} from {len(records)} results using {method}")
+        return {'mode_name': mode_name,
+                'focus': float(predicted),
+                'low': float(predicted - half_width),
+                'high': float(predicted + half_width),
+                'scatter': float(scatter),
+                'samples': len(records),
+                'method': method}
+
+
+def run_focus_history(arguments=None):   # pragma: no cover
+    """Entrypoint to seed, list and query the focus history
+
+    Args:
+        arguments (list): (optional) a list of arguments and respective values.
+
+    """
+    parser = argparse.ArgumentParser(description="Query the history of best focus results")
+    parser.add_argument('--history-path',
+                        action='store',
+                        dest='history_path',
+                        default=DEFAULT_HISTORY_PATH,
+                        help=f'Location of the database. Default: {DEFAULT_HISTORY_PATH}')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='Add results from JSON files')
+    import_parser.add_argument('files', nargs='+', help='JSON files with a list of results')
+
+    list_parser = subparsers.add_parser('list', help='List stored results')
+    list_parser.add_argument('--mode', dest='mode_name', default=None, help='Only this mode')
+    list_parser.add_argument('--start', default=None, help='Only results from this ISO date')
+    list_parser.add_argument('--end', default=None, help='Only results before this ISO date')
+
+    predict_parser = subparsers.add_parser('predict', help='Predict best focus and sweep range')
+    predict_parser.add_argument('mode_name', nargs='?', default=None, help='Mode name. Default: all modes')
+    predict_parser.add_argument('--temperature', type=float, default=None, help='Expected temperature')
+    predict_parser.add_argument('--date', default=None, help='ISO date of the prediction')
+
+    args = parser.parse_args(args=arguments)
+    logging.basicConfig(level=logging.INFO)
+
+    with FocusHistory(path=args.history_path) as history:
+        if args.command == 'import':
+            for file_path in args.files:
+                history.import_json(path=file_path)
+        elif args.command == 'list':
+            for record in history.query(mode_name=args.mode_name, start=args.start, end=args.end):
+                print(json.dumps(record))
+        else:
+            modes = [args.mode_name] if args.mode_name is not None else history.get_modes()
+            for mode_name in modes:
+                prediction = history.predict(mode_name=mode_name, temperature=args.temperature, date=args.date)
+                if prediction is not None:
+                    print(json.dumps(prediction))
+
+
+if __name__ == '__main__':   # pragma: no cover
+    run_focus_history()
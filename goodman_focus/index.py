@@ -0,0 +1,124 @@
+import json
+import os
+import pandas
+import tempfile
+
+from .readers import DEFAULT_FILE_PATTERN, match_file_pattern, read_focus_header
+
+import logging
+
+
+log = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = '.goodman_focus_index.json'
+INDEX_VERSION = 2
+
+
+class HeaderIndex(object):
+    """Persistent index of header keywords of the files in a directory
+
+    The values of `keywords` are stored for every file together with its size
+    and modification time. When the index is updated only new or modified
+    files are read, and files that no longer exist are removed.
+
+    Args:
+        data_path (str): Directory containing the data.
+        keywords (list): Header keywords to index.
+        index_path (str): Location of the index file. By default it is stored
+          in `data_path` as `.goodman_focus_index.json`.
+
+    """
+
+    def __init__(self, data_path, keywords, index_path=None):
+        self.data_path = data_path
+        self.keywords = list(keywords)
+        if index_path is None:
+            index_path = os.path.join(self.data_path, INDEX_FILE_NAME)
+        self.index_path = index_path
+        self.files_read = 0
+
+    def _load(self):
+        if not os.path.isfile(self.index_path):
+            return {}
+        try:
+            with open(self.index_path) as json_file:
+                index = json.load(json_file)
+        except (OSError, ValueError) as error:
+            log.warning(f"Unable to read index {self.index_path}, it will be rebuilt: {str(error)}")
+            return {}
+        if index.get('version') != INDEX_VERSION or index.get('keywords') != self.keywords:
+            log.info(f"Index {self.index_path} was created with different keywords, it will be rebuilt")
+            return {}
+        return index.get('files', {})
+
+    def _save(self, files):
+        directory = os.path.dirname(os.path.abspath(self.index_path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(file_descriptor, 'w') as json_file:
+                json.dump({'version': INDEX_VERSION, 'keywords': self.keywords, 'files': files}, json_file)
+            os.replace(temporary_path, self.index_path)
+        except OSError as error:
+            log.warning(f"Unable to write index {self.index_path}: {str(error)}")
+
+    @staticmethod
+    def _read_header(file_path):
+        """Read the header of a frame, see `read_focus_header`"""
+        return read_focus_header(file_path)
+
+    def _get_values(self, file_path):
+        """Read the keyword values of a file in a JSON serializable form"""
+        header = self._read_header(file_path)
+        self.files_read += 1
+        values = []
+        for key in self.keywords:
+            value = header.get(key, None)
+            if not isinstance(value, (str, int, float, bool)):
+                value = None
+            values.append(value)
+        return values
+
+    def update(self, file_pattern=DEFAULT_FILE_PATTERN):
+        """Bring the index up to date and return its content
+
+        Args:
+            file_pattern (str): Only files matching this pattern, or any of
+              several comma separated patterns, are indexed.
+
+        Returns:
+            a `pandas.DataFrame` with a `file` column and one column per
+            keyword, with one row per readable file.
+
+        """
+        self.files_read = 0
+        indexed = self._load()
+        files = {}
+        changed = False
+        with os.scandir(self.data_path) as entries:
+            for entry in entries:
+                if not match_file_pattern(entry.name, file_pattern) or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                previous = indexed.get(entry.name, None)
+                if previous is not None and previous['size'] == stat.st_size \
+                        and previous['mtime_ns'] == stat.st_mtime_ns:
+                    files[entry.name] = previous
+                    continue
+
+                changed = True
+                record = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'values': None}
+                try:
+                    record['values'] = self._get_values(entry.path)
+                except (OSError, ValueError) as error:
+                    log.warning(f"Unable to read header of {entry.name}: {str(error)}")
+                files[entry.name] = record
+
+        removed = len(set(indexed) - set(files))
+        if changed or removed:
+            log.debug(f"Index updated, read {self.files_read} files and removed {removed}")
+            self._save(files)
+
+        rows = [[name] + record['values'] for name, record in sorted(files.items())
+                if record['values'] is not None]
+        return pandas.DataFrame(rows, columns=['file'] + self.keywords)
@@ -0,0 +1,124 @@
+import math
+import re
+
+from astropy.stats import gaussian_fwhm_to_sigma
+
+import logging
+
+
+log = logging.getLogger(__name__)
+
+# arcseconds per unbinned pixel
+PLATE_SCALE = 0.15
+# all lengths below are in unbinned pixels
+BAND_ROWS = 100
+PEAK_SEPARATION = 5
+MIN_LINE_FWHM = 2.
+
+_CCDSUM_PATTERN = re.compile(r'^\s*(\d+)\s+(\d+)\s*$')
+_ROI_PATTERN = re.compile(r'(\d+)\s*x\s*(\d+)')
+_SLIT_PATTERN = re.compile(r'^\s*(\d+(?:\.\d*)?)')
+
+
+class ExtractionParameters(object):
+    """Parameters used to extract the profile and detect and fit its lines
+
+    The default values are suited for unbinned data, `get_extraction_parameters`
+    derives them from the binning and slit of a focus group.
+
+    Args:
+        band_half_width (int): Half the number of rows of the central band
+          whose median is the profile.
+        peak_order (int): Number of points on each side that a peak has to
+          exceed, see `scipy.signal.argrelmax`.
+        floor_fraction (float): Values of the profile less than this fraction
+          of its maximum above its minimum are ignored when detecting peaks.
+        initial_stddev (float): Initial standard deviation in pixels of the
+          `Gaussian1D` fitted to every line.
+
+    """
+
+    def __init__(self, band_half_width=50, peak_order=5, floor_fraction=0.03, initial_stddev=5.):
+        self.band_half_width = int(band_half_width)
+        self.peak_order = int(peak_order)
+        self.floor_fraction = float(floor_fraction)
+        self.initial_stddev = float(initial_stddev)
+
+    def __eq__(self, other):
+        return isinstance(other, ExtractionParameters) and vars(self) == vars(other)
+
+    def __repr__(self):
+        values = ', '.join(f"{key}={value}" for key, value in vars(self).items())
+        return f"{self.__class__.__name__}({values})"
+
+
+DEFAULT_PARAMETERS = ExtractionParameters()
+
+
+def parse_binning(ccdsum=None, roi=None):
+    """Get the binning from `CCDSUM` or, if not available, from `ROI`
+
+    Args:
+        ccdsum (str): Value of `CCDSUM`, for instance `2 2`.
+        roi (str): Value of `ROI`, for instance `Spectroscopic 2x2`.
+
+    Returns:
+        A tuple with the binning along the dispersion and spatial axes, or
+        `None` if it is not present.
+
+    """
+    for value, pattern in [(ccdsum, _CCDSUM_PATTERN), (roi, _ROI_PATTERN)]:
+        if not isinstance(value, str):
+            continue
+        match = pattern.search(value)
+        if match is not None:
+            return int(match.group(1)), int(match.group(2))
+    return None
+
+
+def parse_slit_width(slit):
+    """Get the slit width in arcseconds from `SLIT`, such as `1.0_LONG_SLIT`"""
+    if not isinstance(slit, str):
+        return None
+    match = _SLIT_PATTERN.match(slit)
+    if match is None:
+        return None
+    return float(match.group(1))
+
+
+def get_extraction_parameters(header):
+    """Derive the extraction parameters of a focus group from its headers
+
+    The band covers `BAND_ROWS` unbinned rows, so binned data is median
+    combined over the same area of the detector, peaks must be separated by
+    `PEAK_SEPARATION` unbinned pixels and the initial width of the lines is the
+    width of the slit projected on the detector. Missing keywords leave the
+    default values.
+
+    Args:
+        header (dict-like): `CCDSUM`, `ROI` and `SLIT` of the group, a FITS
+          header or a row of the file collection.
+
+    Returns:
+        An `ExtractionParameters` instance.
+
+    """
+    binning = parse_binning(ccdsum=header.get('CCDSUM', None), roi=header.get('ROI', None))
+    slit_width = parse_slit_width(header.get('SLIT', None))
+    if binning is None and slit_width is None:
+        return DEFAULT_PARAMETERS
+
+    dispersion_binning, spatial_binning = binning if binning is not None else (1, 1)
+    if slit_width is not None:
+        line_fwhm = max(slit_width / PLATE_SCALE, MIN_LINE_FWHM)
+        initial_stddev = line_fwhm * gaussian_fwhm_to_sigma / dispersion_binning
+    else:
+        initial_stddev = DEFAULT_PARAMETERS.initial_stddev / dispersion_binning
+
+    parameters = ExtractionParameters(
+        band_half_width=max(int(round(BAND_ROWS / spatial_binning / 2.)), 5),
+        peak_order=max(int(math.ceil(PEAK_SEPARATION / dispersion_binning)), 2),
+        floor_fraction=DEFAULT_PARAMETERS.floor_fraction,
+        initial_stddev=max(initial_stddev, 0.5))
+    log.debug("Extraction parameters for binning %s and slit %s: %s", binning, slit_width, parameters)
+    return parameters
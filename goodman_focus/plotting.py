@@ -0,0 +1,199 @@
+import os
+import re
+
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import logging
+
+
+log = logging.getLogger(__name__)
+
+
+def draw_focus(ax, mode_name, focus, fwhm, best_focus, model_x_axis, model_fwhm):
+    """Draw the measured FWHM, the fitted model and the best focus
+
+    Args:
+        ax (Axes): Matplotlib axes to draw on.
+        mode_name (str): Mode name used in the title.
+        focus (list): Focus values.
+        fwhm (list): FWHM for each focus value.
+        best_focus (float): Best focus value.
+        model_x_axis (numpy.ndarray): Focus values where the model was evaluated.
+        model_fwhm (numpy.ndarray): Model evaluated at `model_x_axis`.
+
+    """
+    ax.plot(focus, fwhm, marker='x', label='Measured FWHM')
+    ax.axvline(best_focus, color='k', label='Best Focus')
+    ax.set_title(f"Best Focus:\n{mode_name} {best_focus:.3f}")
+    ax.set_xlabel("Focus Value")
+    if 'IM_' in mode_name:
+        ax.set_ylabel("FWHM")
+    else:
+        ax.set_ylabel("Mean FWHM")
+    ax.plot(model_x_axis, model_fwhm, label='Model')
+    ax.legend(loc='best')
+
+
+def draw_profile(ax,
+                 title,
+                 x_axis,
+                 raw_profile,
+                 clipped_profile,
+                 initial_background,
+                 fitted_background,
+                 profile,
+                 threshold,
+                 threshold_label,
+                 peaks):
+    """Draw the steps of the profile extraction and the detected peaks
+
+    Args:
+        ax (Axes): Matplotlib axes to draw on.
+        title (str): Title of the plot.
+        x_axis (numpy.ndarray): X-axis of the profile.
+        raw_profile (numpy.ndarray): Median of the central band.
+        clipped_profile (numpy.ndarray): Sigma clipped profile, with `nan` or
+          masked values where it was clipped.
+        initial_background (numpy.ndarray): Initial background model.
+        fitted_background (numpy.ndarray): Fitted background model.
+        profile (numpy.ndarray): Background subtracted profile.
+        threshold (float): Level used to reject peaks.
+        threshold_label (str): Label for the threshold line.
+        peaks (list): Locations of the accepted peaks.
+
+    """
+    ax.set_title(title)
+    ax.axhline(0, color='k', label='Zero')
+    ax.axhline(threshold, color='g', label=threshold_label)
+    ax.plot(x_axis, raw_profile, label='Raw Profile')
+    ax.plot(x_axis, clipped_profile, label='Clipped Profile')
+    ax.plot(x_axis, initial_background, label='Initial Background Model')
+    ax.plot(x_axis, fitted_background, label='Fitted Background Level')
+    ax.plot(x_axis, profile, label='Background Subtracted Profile')
+    for _peak in peaks:
+        ax.axvline(_peak, color='k', alpha=0.6)
+    ax.legend(loc='best')
+
+
+def _save_figure(draw_function, output_path, formats, **kwargs):
+    """Draw on a new figure using the Agg canvas and write it once per format
+
+    Neither `pyplot` nor the interactive backend are used, so this is safe to
+    run in worker processes or threads.
+
+    Returns:
+        A list of the files written.
+
+    """
+    figure = Figure(figsize=(10, 7))
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot(1, 1, 1)
+    draw_function(ax, **kwargs)
+    written = []
+    for _format in formats:
+        file_name = f"{output_path}.{_format}"
+        figure.savefig(file_name, format=_format)
+        written.append(file_name)
+    return written
+
+
+def get_safe_file_name(name):
+    """Replace characters not suitable for a file name"""
+    return re.sub(r'[^\w.+-]', '_', str(name))
+
+
+class PlotRenderer(object):
+    """Render plots to files, optionally in a pool of worker processes
+
+    Plots are drawn without an interactive backend so nothing blocks, and when
+    `workers` is not zero the rendering runs in separate processes while the
+    focus calculation continues.
+
+    Args:
+        output_dir (str): Directory where plots are written. It is created if
+          it does not exist.
+        formats (tuple): File formats, any supported by matplotlib's Agg
+          canvas, for instance `png` and `pdf`.
+        workers (int): Number of worker processes. `0` renders in the calling
+          process and `None` uses the default of `ProcessPoolExecutor`.
+
+    """
+
+    def __init__(self, output_dir, formats=('png',), workers=2):
+        self.output_dir = output_dir
+        self.formats = tuple(formats)
+        self.workers = workers
+        self.written = []
+        self._futures = []
+        self._executor = None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.workers != 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _submit(self, draw_function, name, **kwargs):
+        output_path = os.path.join(self.output_dir, get_safe_file_name(name))
+        if self._executor is None:
+            self.written.extend(_save_figure(draw_function, output_path, self.formats, **kwargs))
+        else:
+            self._futures.append(
+                self._executor.submit(_save_figure, draw_function, output_path, self.formats, **kwargs))
+
+    def plot_focus(self, mode_name, focus, fwhm, best_focus, model_x_axis, model_fwhm, date=None, first_file=None):
+        """Render the focus curve of a group to `<mode_name>_<date>_<first_file>_focus.<format>`
+
+        Groups with the same mode name but a different binning, region of
+        interest or date are told apart by the date and the name of their
+        first file, without extensions, when they are given.
+
+        See `draw_focus` for a description of the other arguments.
+        """
+        parts = [mode_name]
+        if date is not None:
+            parts.append(date)
+        if first_file is not None:
+            parts.append(os.path.basename(first_file).split('.', 1)[0])
+        self._submit(draw_focus,
+                     name=f"{'_'.join(str(part) for part in parts)}_focus",
+                     mode_name=mode_name,
+                     focus=list(focus),
+                     fwhm=list(fwhm),
+                     best_focus=float(best_focus),
+                     model_x_axis=np.asarray(model_x_axis),
+                     model_fwhm=np.asarray(model_fwhm))
+
+    def plot_profile(self, file_name, **kwargs):
+        """Render the profile of a file to `<file_name>_profile.<format>`
+
+        See `draw_profile` for a description of the keyword arguments.
+        """
+        name, _ = os.path.splitext(os.path.basename(file_name))
+        self._submit(draw_profile, name=f"{name}_profile", **kwargs)
+
+    def close(self):
+        """Wait for pending plots and stop the workers
+
+        Returns:
+            A list of all the files written.
+
+        """
+        for future in self._futures:
+            try:
+                self.written.extend(future.result())
+            except Exception as error:
+                log.error(f"Unable to render plot: {str(error)}")
+        self._futures = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        return self.written
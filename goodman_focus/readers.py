@@ -0,0 +1,389 @@
+import fnmatch
+import gzip
+import numpy as np
+import os
+import re
+
+from astropy.io import fits
+
+import logging
+
+
+log = logging.getLogger(__name__)
+
+_SECTION_PATTERN = re.compile(r'^\[\s*(\d+)\s*:\s*(\d+)\s*,\s*(\d+)\s*:\s*(\d+)\s*\]$')
+
+DEFAULT_FILE_PATTERN = '*.fits,*.fits.fz,*.fits.gz'
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_BITPIX_TYPES = {8: 'u1', 16: '>i2', 32: '>i4', 64: '>i8', -32: '>f4', -64: '>f8'}
+
+
+def split_file_pattern(file_pattern):
+    """Get the list of patterns of a comma separated `file_pattern`"""
+    if isinstance(file_pattern, str):
+        file_pattern = file_pattern.split(',')
+    return [pattern.strip() for pattern in file_pattern if pattern.strip()]
+
+
+def match_file_pattern(file_name, file_pattern):
+    """Whether a file name matches any of the patterns of `file_pattern`"""
+    return any(fnmatch.fnmatch(file_name, pattern) for pattern in split_file_pattern(file_pattern))
+
+
+def find_files(path, file_pattern=DEFAULT_FILE_PATTERN):
+    """Names of the files of a directory matching `file_pattern`, sorted"""
+    with os.scandir(path) as entries:
+        return sorted(entry.name for entry in entries
+                      if entry.is_file() and match_file_pattern(entry.name, file_pattern))
+
+
+def _is_gzip_stream(binary_file):
+    """Whether an open binary file is gzip compressed, leaving it at the start"""
+    binary_file.seek(0)
+    magic = binary_file.read(2)
+    binary_file.seek(0)
+    return magic == _GZIP_MAGIC
+
+
+def is_gzip(file_path):
+    """Whether a file is compressed with gzip, regardless of its extension"""
+    with open(file_path, 'rb') as binary_file:
+        return _is_gzip_stream(binary_file)
+
+
+def parse_section(value):
+    """Convert a FITS section such as `[1:2048,1:100]` to integers
+
+    Args:
+        value (str): Section in FITS notation, one based and inclusive.
+
+    Returns:
+        A tuple `(x1, x2, y1, y2)`, reversed ranges are kept as they are.
+
+    """
+    match = _SECTION_PATTERN.match(str(value).strip())
+    if match is None:
+        raise ValueError(f"Invalid section: {value}")
+    return tuple(int(group) for group in match.groups())
+
+
+def _get_image_extensions(hdu_list):
+    return [index for index, hdu in enumerate(hdu_list)
+            if index > 0 and hdu.is_image and hdu.header.get('NAXIS', 0) == 2]
+
+
+def is_multi_extension(hdu_list):
+    """Whether the data is split in image extensions instead of the primary HDU"""
+    return hdu_list[0].header.get('NAXIS', 0) == 0 and len(_get_image_extensions(hdu_list)) > 0
+
+
+def _get_compressed_extension(hdu_list):
+    """Index of the compressed image of a tile-compressed single image
+
+    fpack moves the only image of a file, along with its header, to a
+    compressed extension and leaves an empty primary HDU.
+
+    Returns:
+        The index of the extension or `None` for any other kind of file.
+
+    """
+    if hdu_list[0].header.get('NAXIS', 0) != 0:
+        return None
+    extensions = _get_image_extensions(hdu_list)
+    if len(extensions) == 1 and isinstance(hdu_list[extensions[0]], fits.CompImageHDU):
+        return extensions[0]
+    return None
+
+
+def _read_gzip_header(file_object):
+    """Read the primary header of a gzip stream, `None` if it has no image"""
+    header = fits.Header.fromfile(file_object)
+    if header.get('NAXIS', 0) != 2 or header.get('BITPIX', None) not in _BITPIX_TYPES:
+        return None
+    return header
+
+
+def read_focus_header(file_path, return_offset=False):
+    """Read the header that describes a focus frame without reading its data
+
+    This is the primary header except for tile-compressed single images, for
+    which it is the header of the compressed extension. The header of gzip
+    files is read from the start of the stream so only the first blocks are
+    decompressed. The file is opened only once.
+
+    Args:
+        file_path (str): Full path to the file.
+        return_offset (bool): Also return the offset of the data of a single
+          image in the primary HDU, in the decompressed stream for gzip files.
+          Given to `read_focus_frame` along with the header, the data is read
+          without parsing the header again.
+
+    Returns:
+        An `astropy.io.fits.Header`, followed by the offset in bytes, or `None`
+        for any other kind of file, when `return_offset` is set.
+
+    """
+    header = None
+    data_offset = None
+    with open(file_path, 'rb') as binary_file:
+        if _is_gzip_stream(binary_file):
+            with gzip.GzipFile(fileobj=binary_file, mode='rb') as file_object:
+                header = _read_gzip_header(file_object)
+                if header is not None:
+                    data_offset = file_object.tell()
+        if header is None:
+            binary_file.seek(0)
+            with fits.open(binary_file) as hdu_list:
+                extension = _get_compressed_extension(hdu_list)
+                header = hdu_list[0 if extension is None else extension].header
+                if extension is None and header.get('NAXIS', 0) == 2 and header.get('BITPIX', None) in _BITPIX_TYPES:
+                    data_offset = hdu_list.fileinfo(0)['datLoc']
+    if return_offset:
+        return header, data_offset
+    return header
+
+
+def _scale(raw, header):
+    """Apply `BSCALE` and `BZERO` in the same way as `astropy.io.fits`"""
+    raw = raw.astype(raw.dtype.newbyteorder('='))
+    bscale = header.get('BSCALE', 1)
+    bzero = header.get('BZERO', 0)
+    if bscale == 1 and bzero == 0:
+        return raw
+    bits = 8 * raw.dtype.itemsize
+    if raw.dtype.kind == 'i' and bscale == 1 and bzero == 2 ** (bits - 1):
+        unsigned = np.dtype(f"u{raw.dtype.itemsize}")
+        return raw.view(unsigned) ^ unsigned.type(2 ** (bits - 1))
+    return raw * np.float32(bscale) + np.float32(bzero) if bits <= 16 else raw * bscale + bzero
+
+
+def _read_band(file_object, header, half_width=50):
+    """Read the central band of a single image starting at the current position"""
+    dtype = np.dtype(_BITPIX_TYPES[header['BITPIX']])
+    row_size = header['NAXIS1'] * dtype.itemsize
+    low, high = get_band_limits(height=header['NAXIS2'], half_width=half_width)
+    file_object.seek(low * row_size, os.SEEK_CUR)
+    buffer = file_object.read((high - low) * row_size)
+    raw = np.frombuffer(buffer, dtype=dtype).reshape(high - low, header['NAXIS1'])
+    return _scale(raw, header)
+
+
+def _read_gzip_band(binary_file, half_width=50):
+    """Read the central band of a gzip compressed single image
+
+    The stream is decompressed only up to the last row of the band.
+
+    Args:
+        binary_file (file): The file opened in binary mode, at its start.
+        half_width (int): Half the number of rows of the central band.
+
+    Returns:
+        The band and the header, or `None` if the primary HDU has no image.
+
+    """
+    with gzip.GzipFile(fileobj=binary_file, mode='rb') as file_object:
+        header = _read_gzip_header(file_object)
+        if header is None:
+            return None
+        return _read_band(file_object=file_object, header=header, half_width=half_width), header
+
+
+def _read_band_at(file_path, header, data_offset, half_width=50):
+    """Read the central band of a single image whose header is already known
+
+    Args:
+        file_path (str): Full path to the file, plain or gzip compressed.
+        header (astropy.io.fits.Header): Header of the image.
+        data_offset (int): Offset of the data, see `read_focus_header`.
+        half_width (int): Half the number of rows of the central band.
+
+    Returns:
+        The band as a `numpy.ndarray`.
+
+    """
+    with open(file_path, 'rb') as binary_file:
+        if not _is_gzip_stream(binary_file):
+            binary_file.seek(data_offset)
+            return _read_band(file_object=binary_file, header=header, half_width=half_width)
+        with gzip.GzipFile(fileobj=binary_file, mode='rb') as file_object:
+            file_object.seek(data_offset)
+            return _read_band(file_object=file_object, header=header, half_width=half_width)
+
+
+def _get_amplifier_layout(header, default_column):
+    """Location of the data of an extension in the assembled frame
+
+    The data section is given by `DATASEC` and its place in the detector by
+    `DETSEC`, in unbinned pixels. Without `DETSEC` the extensions are placed
+    side by side starting at `default_column`.
+    """
+    rows, columns = header['NAXIS2'], header['NAXIS1']
+    x1, x2, y1, y2 = parse_section(header['DATASEC']) if 'DATASEC' in header else (1, columns, 1, rows)
+    data_columns = (min(x1, x2) - 1, max(x1, x2))
+    data_rows = (min(y1, y2) - 1, max(y1, y2))
+    width = data_columns[1] - data_columns[0]
+    height = data_rows[1] - data_rows[0]
+
+    if 'DETSEC' in header:
+        dx1, dx2, dy1, dy2 = parse_section(header['DETSEC'])
+        binning_x = max((abs(dx2 - dx1) + 1) // width, 1)
+        binning_y = max((abs(dy2 - dy1) + 1) // height, 1)
+        column = (min(dx1, dx2) - 1) // binning_x
+        row = (min(dy1, dy2) - 1) // binning_y
+        flip_x = (dx1 > dx2) != (x1 > x2)
+        flip_y = (dy1 > dy2) != (y1 > y2)
+    else:
+        column, row, flip_x, flip_y = default_column, 0, False, False
+
+    return {'data_rows': data_rows,
+            'data_columns': data_columns,
+            'row': row,
+            'column': column,
+            'height': height,
+            'width': width,
+            'flip_x': flip_x,
+            'flip_y': flip_y}
+
+
+def get_band_limits(height, half_width=50):
+    """Rows of the central band used to extract the spectral profile
+
+    These are the same rows that `get_profile` takes from an assembled frame.
+    """
+    if height <= 2 * half_width:
+        return 0, height
+    return int(height / 2 - half_width), int(height / 2 + half_width)
+
+
+def _get_band_tasks(file_path, hdu_list, half_width=50):
+    """Build one reading task per extension that overlaps the central band
+
+    Returns:
+        A list of tasks for `read_extension_band`, a list with the location of
+        each piece in the band and the shape of the band.
+
+    """
+    layouts = {}
+    default_column = 0
+    for extension in _get_image_extensions(hdu_list):
+        layout = _get_amplifier_layout(header=hdu_list[extension].header, default_column=default_column)
+        default_column += layout['width']
+        layouts[extension] = layout
+
+    frame_height = max(layout['row'] + layout['height'] for layout in layouts.values())
+    frame_width = max(layout['column'] + layout['width'] for layout in layouts.values())
+    low, high = get_band_limits(height=frame_height, half_width=half_width)
+
+    tasks = []
+    locations = []
+    for extension, layout in layouts.items():
+        first = max(low, layout['row'])
+        last = min(high, layout['row'] + layout['height'])
+        if first >= last:
+            continue
+        if layout['flip_y']:
+            rows = (layout['data_rows'][1] - (last - layout['row']),
+                    layout['data_rows'][1] - (first - layout['row']))
+        else:
+            rows = (layout['data_rows'][0] + first - layout['row'],
+                    layout['data_rows'][0] + last - layout['row'])
+        tasks.append((file_path, extension, rows, layout['data_columns'], layout['flip_x'], layout['flip_y']))
+        locations.append((first - low, last - low, layout['column'], layout['column'] + layout['width']))
+    return tasks, locations, (high - low, frame_width)
+
+
+def _read_block(hdu, rows, columns, flip_x, flip_y):
+    block = np.array(hdu.section[rows[0]:rows[1], columns[0]:columns[1]])
+    if flip_x:
+        block = block[:, ::-1]
+    if flip_y:
+        block = block[::-1, :]
+    return block
+
+
+def read_extension_band(file_path, extension, rows, columns, flip_x=False, flip_y=False):
+    """Read a block of rows and columns of a single extension
+
+    The file is memory mapped when the data is not scaled, and only the
+    requested block is read through `section`. This is the per-extension task
+    sent to an `Executor` by `read_focus_frame`.
+
+    Args:
+        file_path (str): Full path to the file.
+        extension (int): Index of the HDU.
+        rows (tuple): First and last, excluded, zero based rows.
+        columns (tuple): First and last, excluded, zero based columns.
+        flip_x (bool): Reverse the columns to match the detector orientation.
+        flip_y (bool): Reverse the rows to match the detector orientation.
+
+    Returns:
+        A `numpy.ndarray` with the block.
+
+    """
+    with fits.open(file_path) as hdu_list:
+        return _read_block(hdu=hdu_list[extension], rows=rows, columns=columns, flip_x=flip_x, flip_y=flip_y)
+
+
+def read_focus_frame(file_path, executor=None, half_width=50, header=None, data_offset=None):
+    """Read the data needed to measure a focus frame
+
+    Single HDU files are read as they are. For multi-extension files, such as
+    multi-amplifier readouts, only the rows of the central band are read from
+    every extension that contains them, in parallel when an `Executor` is
+    given, and the pieces are placed according to `DATASEC` and `DETSEC`. The
+    band gives the same profile as the central band of the assembled frame.
+
+    Compressed files also return only the central band. For tile-compressed
+    (`.fz`) files only the tiles that contain it are decompressed, and gzip
+    files are decompressed only up to its last row.
+
+    When the header and the offset of the data obtained with
+    `read_focus_header` are given, the central band is read directly from
+    the file without parsing the header again.
+
+    Args:
+        file_path (str): Full path to the file.
+        executor (Executor): Optional executor to read the extensions.
+        half_width (int): Half the number of rows of the central band.
+        header (astropy.io.fits.Header): Header from `read_focus_header`.
+        data_offset (int): Offset of the data from `read_focus_header`.
+
+    Returns:
+        The data and the header, see `read_focus_header`.
+
+    """
+    if header is not None and data_offset is not None:
+        return _read_band_at(file_path=file_path,
+                             header=header,
+                             data_offset=data_offset,
+                             half_width=half_width), header
+
+    with open(file_path, 'rb') as binary_file:
+        if _is_gzip_stream(binary_file):
+            band = _read_gzip_band(binary_file=binary_file, half_width=half_width)
+            if band is not None:
+                return band
+            binary_file.seek(0)
+
+        with fits.open(binary_file) as hdu_list:
+            extension = _get_compressed_extension(hdu_list)
+            if extension is not None:
+                hdu = hdu_list[extension]
+                low, high = get_band_limits(height=hdu.header['NAXIS2'], half_width=half_width)
+                return np.array(hdu.section[low:high, :]), hdu.header
+            header = hdu_list[0].header
+            if not is_multi_extension(hdu_list):
+                return hdu_list[0].data, header
+            tasks, locations, shape = _get_band_tasks(file_path=file_path, hdu_list=hdu_list, half_width=half_width)
+            log.debug("Reading %s extensions of %s", len(tasks), file_path)
+            if executor is None:
+                blocks = [_read_block(hdu_list[extension], *task) for _, extension, *task in tasks]
+
+    if executor is not None:
+        blocks = executor.map(read_extension_band, tasks)
+
+    band = np.zeros(shape, dtype=np.result_type(*[block.dtype for block in blocks]))
+    for block, (first_row, last_row, first_column, last_column) in zip(blocks, locations):
+        band[first_row:last_row, first_column:last_column] = block
+    return band, header
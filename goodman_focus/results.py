@@ -0,0 +1,217 @@
+import numpy as np
+import pandas
+
+import logging
+
+
+log = logging.getLogger(__name__)
+
+MEASUREMENT_FIELDS = ['file', 'fwhm', 'focus', 'fwhm_error']
+
+
+def get_measurement_dtype(file_name_length=1):
+    """Structured type of a measurement with room for the file name"""
+    return np.dtype([('file', f"U{max(int(file_name_length), 1)}"),
+                     ('fwhm', np.float64),
+                     ('focus', np.float64),
+                     ('fwhm_error', np.float64)])
+
+
+class FocusMeasurements(object):
+    """FWHM and focus of every file of a focus group
+
+    Measurements are kept in a single NumPy structured array with the fields
+    `file`, `fwhm`, `focus` and `fwhm_error`, which uses much less memory than lists of
+    Python objects and is fast to aggregate over many groups.
+
+    Args:
+        data (numpy.ndarray): Structured array with the fields of
+          `get_measurement_dtype`.
+
+    """
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def from_records(cls, records):
+        """Create the measurements from `(file, fwhm, focus, fwhm_error)` tuples
+
+        The uncertainty is optional, it is `nan` when it is not given.
+        """
+        records = [tuple(record) + (np.nan,) * (len(MEASUREMENT_FIELDS) - len(record)) for record in records]
+        length = max([len(str(record[0])) for record in records], default=1)
+        return cls(np.array(records, dtype=get_measurement_dtype(length)))
+
+    @classmethod
+    def from_arrays(cls, file, fwhm, focus, fwhm_error=np.nan):
+        """Create the measurements from one array per field"""
+        file = np.asarray(file, dtype=str)
+        data = np.empty(len(file), dtype=get_measurement_dtype(file.dtype.itemsize // 4))
+        data['file'] = file
+        data['fwhm'] = fwhm
+        data['focus'] = focus
+        data['fwhm_error'] = fwhm_error
+        return cls(data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({len(self)} measurements)"
+
+    @property
+    def file(self):
+        return self.data['file']
+
+    @property
+    def fwhm(self):
+        return self.data['fwhm']
+
+    @property
+    def focus(self):
+        return self.data['focus']
+
+    @property
+    def fwhm_error(self):
+        return self.data['fwhm_error']
+
+    def sort_by_focus(self):
+        """Measurements in increasing order of focus"""
+        return self.__class__(self.data[np.argsort(self.data['focus'], kind='stable')])
+
+    def to_pandas(self):
+        """Convert to a `pandas.DataFrame` with one column per field
+
+        The numeric columns are views of the structured array, not
+        copies, so the measurements must not be modified while the data frame
+        is in use.
+        """
+        return pandas.DataFrame({name: self.data[name] for name in MEASUREMENT_FIELDS}, copy=False)
+
+    def to_arrow(self):
+        """Convert to a `pyarrow.Table`, `pyarrow` must be installed
+
+        Arrow columns are contiguous, so unlike `to_pandas` every field is
+        copied once.
+        """
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("to_arrow requires pyarrow, install it with: pip install pyarrow")
+        return pyarrow.table({name: self.data[name] for name in MEASUREMENT_FIELDS})
+
+
+class FocusResult(object):
+    """Best focus of a single mode
+
+    Args:
+        date (str): Value of `DATE` of the first file.
+        time (str): Value of `DATE-OBS` of the first file.
+        mode_name (str): Mode name, see `GoodmanFocus._get_mode_name`.
+        focus (float): Best focus.
+        fwhm (float): FWHM at best focus.
+        best_image_name (str): File closest to the best focus.
+        best_image_focus (float): Focus of the best image.
+        best_image_fwhm (float): FWHM of the best image.
+        measurements (FocusMeasurements): Measurements of every file in order
+          of focus.
+        notes (str): Warnings about how the focus was obtained.
+        skipped_files (list): Files not measured by `coarse_to_fine`, `None`
+          when it is not used.
+        line_focus (dict): Best focus of every line when `per_line_focus` is
+          used, `None` otherwise.
+
+    """
+
+    __slots__ = ('date',
+                 'time',
+                 'mode_name',
+                 'notes',
+                 'focus',
+                 'fwhm',
+                 'best_image_name',
+                 'best_image_focus',
+                 'best_image_fwhm',
+                 'measurements',
+                 'skipped_files',
+                 'line_focus')
+
+    def __init__(self,
+                 date,
+                 time,
+                 mode_name,
+                 focus,
+                 fwhm,
+                 best_image_name,
+                 best_image_focus,
+                 best_image_fwhm,
+                 measurements,
+                 notes='',
+                 skipped_files=None,
+                 line_focus=None):
+        self.date = date
+        self.time = time
+        self.mode_name = mode_name
+        self.notes = notes
+        self.focus = focus
+        self.fwhm = fwhm
+        self.best_image_name = best_image_name
+        self.best_image_focus = best_image_focus
+        self.best_image_fwhm = best_image_fwhm
+        self.measurements = measurements
+        self.skipped_files = skipped_files
+        self.line_focus = line_focus
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(mode_name={self.mode_name!r}, focus={self.focus}, fwhm={self.fwhm})"
+
+    def to_dict(self):
+        """Convert to the dictionary returned by `GoodmanFocus.__call__`"""
+        result = {'date': self.date,
+                  'time': self.time,
+                  'mode_name': self.mode_name,
+                  'notes': self.notes,
+                  'focus': self.focus,
+                  'fwhm': self.fwhm,
+                  'best_image_name': self.best_image_name,
+                  'best_image_focus': self.best_image_focus,
+                  'best_image_fwhm': self.best_image_fwhm,
+                  'focus_data': self.measurements.focus.tolist(),
+                  'fwhm_data': self.measurements.fwhm.tolist(),
+                  'fwhm_error_data': [None if np.isnan(error) else error
+                                      for error in self.measurements.fwhm_error.tolist()]}
+        if self.skipped_files is not None:
+            result['skipped_files'] = self.skipped_files
+        if self.line_focus is not None:
+            result['line_focus'] = self.line_focus
+        return result
+
+
+def results_to_pandas(results):
+    """Combine the measurements of many results in a single `pandas.DataFrame`
+
+    Args:
+        results (list): `FocusResult` instances, for instance from many nights.
+
+    Returns:
+        A data frame with the columns `mode_name`, `date`, `file`, `fwhm`,
+        `focus` and `fwhm_error`, with one row per measurement.
+
+    """
+    if not results:
+        empty = FocusMeasurements.from_records([]).to_pandas()
+        empty.insert(0, 'date', pandas.Categorical([]))
+        empty.insert(0, 'mode_name', pandas.Categorical([]))
+        return empty
+
+    sizes = [len(result.measurements) for result in results]
+    columns = {}
+    for name in ['mode_name', 'date']:
+        categories, codes = np.unique([getattr(result, name) for result in results], return_inverse=True)
+        columns[name] = pandas.Categorical.from_codes(np.repeat(codes, sizes), categories=categories)
+    for name in MEASUREMENT_FIELDS:
+        columns[name] = np.concatenate([result.measurements.data[name] for result in results])
+    return pandas.DataFrame(columns, copy=False)
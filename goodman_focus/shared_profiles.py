@@ -0,0 +1,127 @@
+import numpy as np
+
+from multiprocessing import resource_tracker, shared_memory
+
+import logging
+
+
+log = logging.getLogger(__name__)
+
+_created_names = set()
+
+
+def _attach_shared_memory(name):
+    """Attach to an existing block without handing its ownership to this process
+
+    Before Python 3.13 attaching registers the block with the resource tracker,
+    which would remove it when a worker exits. The registration is undone
+    unless the block was created by this process.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        if name not in _created_names:
+            resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+
+class SharedProfileStore(object):
+    """Profiles of a group of frames and their results in shared memory
+
+    Profiles and results are kept in a single block. The process that creates
+    the store fills `profiles`, and workers on the same host attach to it with
+    `SharedProfileStore.attach(store.descriptor)` to read the profiles without
+    copying them and to write into `results`. Only the small `descriptor` is
+    sent to the workers.
+
+    Views of `profiles` and `results` are not valid after `close`, results
+    needed afterwards must be copied.
+
+    Args:
+        number_of_profiles (int): Number of profiles, usually one per frame.
+        length (int): Length of every profile.
+        results_shape (tuple): Shape of the results array. Default is one value
+          per profile.
+        dtype (numpy.dtype): Type of the profiles. Results are `float64`.
+
+    """
+
+    def __init__(self, number_of_profiles, length, results_shape=None, dtype=np.float64):
+        if results_shape is None:
+            results_shape = (number_of_profiles,)
+        profiles_shape = (number_of_profiles, length)
+        profiles_size = int(np.prod(profiles_shape)) * np.dtype(dtype).itemsize
+        results_offset = -(-profiles_size // 8) * 8
+        size = max(results_offset + int(np.prod(results_shape)) * 8, 1)
+
+        self._owner = True
+        self._block = shared_memory.SharedMemory(create=True, size=size)
+        _created_names.add(self._block.name)
+        self.descriptor = {'name': self._block.name,
+                           'profiles_shape': profiles_shape,
+                           'dtype': np.dtype(dtype).str,
+                           'results_shape': tuple(results_shape),
+                           'results_offset': results_offset}
+        self._set_views()
+        self.results[:] = np.nan
+
+    def _set_views(self):
+        self.profiles = np.ndarray(self.descriptor['profiles_shape'],
+                                   dtype=self.descriptor['dtype'],
+                                   buffer=self._block.buf)
+        self.results = np.ndarray(self.descriptor['results_shape'],
+                                  dtype=np.float64,
+                                  buffer=self._block.buf,
+                                  offset=self.descriptor['results_offset'])
+
+    @classmethod
+    def from_profiles(cls, profiles, results_shape=None):
+        """Create a store with a copy of `profiles`
+
+        Args:
+            profiles (array-like): Two dimensional array with one profile per
+              row.
+            results_shape (tuple): Shape of the results array.
+
+        """
+        profiles = np.atleast_2d(profiles)
+        store = cls(number_of_profiles=profiles.shape[0],
+                    length=profiles.shape[1],
+                    results_shape=results_shape,
+                    dtype=profiles.dtype)
+        store.profiles[:] = profiles
+        return store
+
+    @classmethod
+    def attach(cls, descriptor):
+        """Attach to a store created by another process
+
+        Args:
+            descriptor (dict): The `descriptor` of the store.
+
+        """
+        store = cls.__new__(cls)
+        store._owner = False
+        store.descriptor = descriptor
+        store._block = _attach_shared_memory(descriptor['name'])
+        store._set_views()
+        return store
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Detach from the shared memory, which is released by its creator"""
+        if self._block is None:
+            return
+        self.profiles = None
+        self.results = None
+        self._block.close()
+        if self._owner:
+            self._block.unlink()
+            _created_names.discard(self._block.name)
+        self._block = None
@@ -0,0 +1,208 @@
+import numpy as np
+
+import logging
+
+
+log = logging.getLogger(__name__)
+
+GOLDEN_SECTION = 0.381966
+
+
+def _is_measured(value, focus, min_step):
+    return len(focus) > 0 and np.min(np.abs(np.asarray(focus) - value)) < min_step
+
+
+def _get_parabola_vertex(x, y):
+    """Vertex of the parabola fitted to the square of the FWHM
+
+    A defocused profile is the focused one added in quadrature with a term
+    proportional to the distance to best focus, so the square of the FWHM is a
+    parabola. Every point is used, weighted by the inverse of its FWHM to
+    account for the noise growing when squaring, which makes the vertex much
+    less sensitive to noise than using only the points around the minimum.
+
+    Returns:
+        The location of the vertex or `None` if the points do not describe a
+        parabola with a minimum within their range.
+
+    """
+    x = np.asarray(x, dtype=float)
+    center, scale = np.mean(x), max(np.ptp(x) / 2., 1.)
+    y = np.asarray(y, dtype=float)
+    curvature, slope, _ = np.polyfit((x - center) / scale, y ** 2, 2, w=1. / y)
+    if curvature <= 0:
+        return None
+    vertex = center - scale * slope / (2 * curvature)
+    if not x.min() < vertex < x.max():
+        return None
+    return vertex
+
+
+def recommend_next_focus(focus, fwhm, focus_range, tolerance=50, min_step=None):
+    """Recommend the next focus value to expose
+
+    The first three exposures are the middle and both ends of `focus_range`.
+    While the minimum FWHM is at one end of the measured values, the interval
+    between that end and its neighbour is sampled at the golden section. Once
+    the minimum is at an interior point it is bracketed by its neighbours and
+    every new exposure is placed at the vertex of the parabola fitted to the
+    square of the FWHM of all the points, or, when that vertex is too close to
+    an already measured value, inside the largest side of the bracket. The
+    sequence is finished when the bracket is not wider than twice `tolerance`.
+
+    Args:
+        focus (array-like): Focus values measured so far.
+        fwhm (array-like): FWHM measured for each focus value.
+        focus_range (tuple): Lowest and highest focus values allowed.
+        tolerance (float): Required uncertainty of the best focus.
+        min_step (float): Minimum separation between exposures. Default is half
+          of `tolerance`.
+
+    Returns:
+        A dictionary with the `next_focus` to expose, or `None` when `done`,
+        the current `best_focus` estimate and its `uncertainty`.
+
+    """
+    low, high = float(min(focus_range)), float(max(focus_range))
+    if min_step is None:
+        min_step = tolerance / 2.
+
+    focus = np.asarray(focus, dtype=float)
+    fwhm = np.asarray(fwhm, dtype=float)
+    valid = np.isfinite(fwhm)
+    focus, fwhm = focus[valid], fwhm[valid]
+    order = np.argsort(focus)
+    focus, fwhm = focus[order], fwhm[order]
+
+    recommendation = {'next_focus': None,
+                      'done': False,
+                      'best_focus': None,
+                      'uncertainty': high - low}
+
+    for initial_focus in [(low + high) / 2., low, high]:
+        if not _is_measured(initial_focus, focus=focus, min_step=min_step):
+            recommendation['next_focus'] = initial_focus
+            if len(focus) > 0:
+                recommendation['best_focus'] = float(focus[np.argmin(fwhm)])
+            return recommendation
+
+    index = int(np.argmin(fwhm))
+    recommendation['best_focus'] = float(focus[index])
+
+    if index == 0 or index == len(focus) - 1:
+        neighbour = 1 if index == 0 else len(focus) - 2
+        recommendation['uncertainty'] = float(abs(focus[neighbour] - focus[index]))
+        candidate = focus[index] + GOLDEN_SECTION * (focus[neighbour] - focus[index])
+        if recommendation['uncertainty'] <= tolerance or _is_measured(candidate, focus=focus, min_step=min_step):
+            log.warning(f"Minimum FWHM is at the end of the focus range: {focus[index]}")
+            recommendation['done'] = True
+        else:
+            recommendation['next_focus'] = float(candidate)
+        return recommendation
+
+    bracket = focus[index - 1:index + 2]
+    vertex = _get_parabola_vertex(x=focus, y=fwhm)
+    if vertex is not None:
+        recommendation['best_focus'] = float(vertex)
+    recommendation['uncertainty'] = float(bracket[2] - bracket[0]) / 2.
+
+    if recommendation['uncertainty'] <= tolerance:
+        recommendation['done'] = True
+        return recommendation
+
+    left, right = bracket[1] - bracket[0], bracket[2] - bracket[1]
+    candidate = vertex
+    if candidate is None or _is_measured(candidate, focus=focus, min_step=min_step):
+        if right > left:
+            candidate = bracket[1] + max(min(GOLDEN_SECTION * right, tolerance), min_step)
+        else:
+            candidate = bracket[1] - max(min(GOLDEN_SECTION * left, tolerance), min_step)
+
+    if _is_measured(candidate, focus=focus, min_step=min_step):
+        recommendation['done'] = True
+        return recommendation
+
+    recommendation['next_focus'] = float(candidate)
+    return recommendation
+
+
+def get_focus_curve(best_focus=0., min_fwhm=2.5, defocus_slope=2e-3):
+    """Synthetic focus curve
+
+    The FWHM grows as a hyperbola away from best focus, which is the expected
+    behavior of a defocused image added in quadrature to the seeing or slit
+    width.
+
+    Args:
+        best_focus (float): Focus value with minimum FWHM.
+        min_fwhm (float): FWHM at best focus.
+        defocus_slope (float): FWHM increase per focus unit far from best focus.
+
+    Returns:
+        A function that returns the FWHM for a focus value.
+
+    """
+    def focus_curve(focus):
+        return np.sqrt(min_fwhm ** 2 + (defocus_slope * (np.asarray(focus) - best_focus)) ** 2)
+
+    return focus_curve
+
+
+def _get_polynomial_minimum(focus, fwhm, focus_range, degree=5):
+    """Best focus from a polynomial fitted to a full sequence"""
+    low, high = min(focus_range), max(focus_range)
+    center, half_range = (low + high) / 2., (high - low) / 2.
+    coefficients = np.polyfit((np.asarray(focus) - center) / half_range, fwhm, min(degree, len(focus) - 1))
+    x_axis = np.linspace(-1, 1, 2000)
+    return center + x_axis[np.argmin(np.polyval(coefficients, x_axis))] * half_range
+
+
+def simulate_sweep(focus_curve,
+                   focus_range,
+                   tolerance=50,
+                   noise=0.,
+                   grid_size=11,
+                   max_exposures=30,
+                   seed=None):
+    """Compare the adaptive sequence against a fixed grid of exposures
+
+    Args:
+        focus_curve (callable): Function returning the FWHM for a focus value,
+          for instance one returned by `get_focus_curve`.
+        focus_range (tuple): Lowest and highest focus values allowed.
+        tolerance (float): Required uncertainty of the best focus.
+        noise (float): Standard deviation of the noise added to each FWHM.
+        grid_size (int): Number of exposures of the fixed grid.
+        max_exposures (int): Stop the adaptive sequence after this many
+          exposures.
+        seed (int): Seed for the noise generator.
+
+    Returns:
+        A dictionary with the number of exposures, best focus and the focus and
+        FWHM values of the adaptive sequence, the number of exposures and best
+        focus of the fixed grid and the exposures saved.
+
+    """
+    generator = np.random.default_rng(seed)
+
+    def measure(value):
+        return float(focus_curve(value) + generator.normal(0, noise)) if noise > 0 else float(focus_curve(value))
+
+    focus, fwhm = [], []
+    recommendation = recommend_next_focus(focus, fwhm, focus_range=focus_range, tolerance=tolerance)
+    while not recommendation['done'] and len(focus) < max_exposures:
+        focus.append(recommendation['next_focus'])
+        fwhm.append(measure(recommendation['next_focus']))
+        recommendation = recommend_next_focus(focus, fwhm, focus_range=focus_range, tolerance=tolerance)
+
+    grid_focus = np.linspace(min(focus_range), max(focus_range), grid_size)
+    grid_fwhm = [measure(value) for value in grid_focus]
+
+    return {'exposures': len(focus),
+            'best_focus': recommendation['best_focus'],
+            'uncertainty': recommendation['uncertainty'],
+            'focus': focus,
+            'fwhm': fwhm,
+            'grid_exposures': grid_size,
+            'grid_best_focus': float(_get_polynomial_minimum(grid_focus, grid_fwhm, focus_range)),
+            'saved_exposures': grid_size - len(focus)}
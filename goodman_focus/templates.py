@@ -0,0 +1,149 @@
+import contextlib
+import datetime
+import fcntl
+import json
+import os
+import tempfile
+
+import logging
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE_PATH = os.path.join(os.path.expanduser('~'), '.goodman_focus', 'line_templates.json')
+
+
+class LineTemplateStore(object):
+    """On-disk store of line positions for spectroscopic modes
+
+    For a given mode, binning and region of interest the lines of the
+    comparison lamps fall almost at the same position every night. The store
+    keeps their positions and widths in a JSON file so that a new focus
+    sequence can start fitting the lines directly instead of detecting them.
+
+    Several stores, in other threads or processes, may share the same file.
+    Every change is made under a lock on `<path>.lock`, reloading the file and
+    changing only its own template before replacing the file.
+
+    Args:
+        path (str): Location of the JSON file. It is created on the first
+          update.
+        min_lines (int): Minimum number of lines required to store a template.
+
+    """
+
+    def __init__(self, path=DEFAULT_TEMPLATE_PATH, min_lines=3):
+        self.path = path
+        self.min_lines = min_lines
+        self._templates = None
+
+    @staticmethod
+    def get_key(mode_name, binning, roi):
+        """Build the identifier of a template
+
+        Args:
+            mode_name (str): Mode name as returned by `GoodmanFocus._get_mode_name`.
+            binning (str): Value of the `CCDSUM` keyword.
+            roi (str): Value of the `ROI` keyword.
+
+        Returns:
+            A string unique to the mode, binning and region of interest.
+
+        """
+        return '__'.join([str(mode_name),
+                          str(binning).replace(' ', 'x'),
+                          str(roi).replace(' ', '')])
+
+    @property
+    def templates(self):
+        if self._templates is None:
+            self._templates = self._load()
+        return self._templates
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path) as json_file:
+                return json.load(json_file)
+        except (OSError, ValueError) as error:
+            log.error(f"Unable to read line templates from {self.path}: {str(error)}")
+            return {}
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """Hold an exclusive lock on the file while changing it"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _save(self, templates):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w') as json_file:
+            json.dump(templates, json_file, indent=2)
+        os.replace(temporary_path, self.path)
+
+    def _set(self, key, template=None):
+        """Store a template, or remove it when `template` is `None`
+
+        Returns:
+            `True` if the file was changed.
+
+        """
+        with self._lock():
+            templates = self._load()
+            if template is not None:
+                templates[key] = template
+                changed = True
+            else:
+                changed = templates.pop(key, None) is not None
+            if changed:
+                self._save(templates)
+            self._templates = templates
+        return changed
+
+    def get(self, mode_name, binning, roi):
+        """Get the template for a mode
+
+        Returns:
+            A dictionary with `positions` and `widths` or `None` if there is no
+            template.
+
+        """
+        return self.templates.get(self.get_key(mode_name=mode_name, binning=binning, roi=roi), None)
+
+    def update(self, mode_name, binning, roi, positions, widths):
+        """Store or replace the template of a mode
+
+        Args:
+            mode_name (str): Mode name.
+            binning (str): Value of the `CCDSUM` keyword.
+            roi (str): Value of the `ROI` keyword.
+            positions (array-like): Line centers in pixels.
+            widths (array-like): Line widths as gaussian standard deviation.
+
+        Returns:
+            `True` if the template was stored, `False` if there were not enough
+            lines.
+
+        """
+        if len(positions) < self.min_lines:
+            log.debug(f"Not enough lines to store a template: {len(positions)}")
+            return False
+        key = self.get_key(mode_name=mode_name, binning=binning, roi=roi)
+        self._set(key, {'positions': [float(position) for position in positions],
+                        'widths': [float(width) for width in widths],
+                        'updated': datetime.datetime.now().isoformat()})
+        log.debug(f"Stored template {key} with {len(positions)} lines")
+        return True
+
+    def invalidate(self, mode_name, binning, roi):
+        """Remove the template of a mode"""
+        key = self.get_key(mode_name=mode_name, binning=binning, roi=roi)
+        if self._set(key):
+            log.info(f"Line template {key} is no longer valid and was removed")
@@ -0,0 +1,129 @@
+"""Deterministic synthetic focus nights used by the regression tests"""
+import os
+
+import numpy as np
+
+from astropy.io import fits
+from astropy.modeling import models
+
+
+SPECTROSCOPY = 'spectroscopy'
+IMAGING = 'imaging'
+
+NIGHTS = {
+    'red_1x1': [
+        {'kind': SPECTROSCOPY, 'prefix': 'sp_400m2', 'instconf': 'Red', 'binning': 1,
+         'wavmode': '400_M2', 'grating': 'SYZY_400', 'filter2': 'GG455', 'cam_targ': 11.6, 'grt_targ': 5.8,
+         'focus': (-1500, 1500, 11), 'best_focus': 237., 'min_fwhm': 3.2, 'lines': 25, 'seed': 1},
+        {'kind': IMAGING, 'prefix': 'im_g', 'instconf': 'Red', 'binning': 1, 'filter': 'g-SDSS',
+         'focus': (-1200, 1200, 9), 'best_focus': -143., 'min_fwhm': 4.1, 'seed': 2},
+    ],
+    'red_2x2': [
+        {'kind': SPECTROSCOPY, 'prefix': 'sp_1200m5', 'instconf': 'Red', 'binning': 2,
+         'wavmode': '1200_M5', 'grating': 'SYZY_1200', 'filter2': 'GG495', 'cam_targ': 40.6, 'grt_targ': 20.3,
+         'focus': (-1000, 1000, 11), 'best_focus': 402., 'min_fwhm': 2.6, 'lines': 18, 'seed': 3},
+        {'kind': IMAGING, 'prefix': 'im_r', 'instconf': 'Red', 'binning': 2, 'filter': 'r-SDSS',
+         'focus': (-1000, 1000, 9), 'best_focus': 55., 'min_fwhm': 3.0, 'seed': 4},
+    ],
+    'blue_2x2': [
+        {'kind': SPECTROSCOPY, 'prefix': 'sp_930m3', 'instconf': 'Blue', 'binning': 2,
+         'wavmode': '930_M3', 'grating': 'SYZY_930', 'filter2': 'NO_FILTER', 'cam_targ': 28.0, 'grt_targ': 14.0,
+         'focus': (-2000, 2000, 13), 'best_focus': -612., 'min_fwhm': 2.4, 'lines': 30, 'noise': 15.,
+         'seed': 5},
+    ],
+}
+
+_UNBINNED_SHAPE = (200, 2048)
+
+
+def _get_fwhm(focus, best_focus, min_fwhm, binning, defocus_slope=4e-3):
+    """FWHM in binned pixels growing as a hyperbola away from best focus"""
+    return np.sqrt(min_fwhm ** 2 + (defocus_slope * (focus - best_focus)) ** 2) / binning
+
+
+def _get_header(sequence, focus, index):
+    header = fits.Header()
+    binning = sequence['binning']
+    spectroscopy = sequence['kind'] == SPECTROSCOPY
+    header['DATE'] = '2023-03-14'
+    header['DATE-OBS'] = f"2023-03-14T23:{index:02d}:00.000"
+    header['INSTCONF'] = sequence['instconf']
+    header['OBSTYPE'] = 'FOCUS'
+    header['CAM_FOC'] = float(focus)
+    header['COLL_FOC'] = 0.
+    header['CAM_TARG'] = sequence.get('cam_targ', 0.)
+    header['GRT_TARG'] = sequence.get('grt_targ', 0.)
+    header['FILTER'] = sequence.get('filter', 'NO_FILTER')
+    header['FILTER2'] = sequence.get('filter2', 'NO_FILTER')
+    header['GRATING'] = sequence.get('grating', 'NO_GRATING')
+    header['SLIT'] = '1.0_LONG_SLIT'
+    header['WAVMODE'] = sequence['wavmode'] if spectroscopy else 'IMAGING'
+    header['EXPTIME'] = 1.
+    header['RDNOISE'] = 3.89
+    header['GAIN'] = 1.48
+    header['ROI'] = f"{'Spectroscopic' if spectroscopy else 'Imaging'} {binning}x{binning}"
+    header['CCDSUM'] = f"{binning} {binning}"
+    header['ENVTEM'] = sequence.get('temperature', 12.5)
+    return header
+
+
+def get_frame(sequence, focus):
+    """Synthetic frame of a sequence at a focus value
+
+    Args:
+        sequence (dict): One of the sequences in `NIGHTS`.
+        focus (float): Focus value.
+
+    Returns:
+        An `uint16` array.
+
+    """
+    generator = np.random.default_rng([sequence['seed'], int(focus) + 10000])
+    binning = sequence['binning']
+    rows, columns = _UNBINNED_SHAPE[0] // binning, _UNBINNED_SHAPE[1] // binning
+    x_axis = np.arange(columns)
+    stddev = _get_fwhm(focus, sequence['best_focus'], sequence['min_fwhm'], binning) / 2.35482
+
+    layout = np.random.default_rng(sequence['seed'])
+    if sequence['kind'] == SPECTROSCOPY:
+        centers = np.sort(layout.uniform(20, columns - 20, sequence['lines']))
+        amplitudes = layout.uniform(800, 8000, sequence['lines'])
+    else:
+        centers = [0.47 * columns]
+        amplitudes = [12000.]
+
+    profile = 300. + 0.02 * x_axis
+    for center, amplitude in zip(centers, amplitudes):
+        # total flux is conserved when defocused
+        profile += models.Gaussian1D(amplitude=amplitude * 1.5 / (stddev * binning),
+                                     mean=center,
+                                     stddev=stddev)(x_axis)
+    data = profile[np.newaxis, :] + generator.normal(0, sequence.get('noise', 8.), (rows, columns))
+    return np.clip(np.round(data), 0, 65535).astype(np.uint16)
+
+
+def write_night(path, name, compression=None):
+    """Write all the sequences of a night to a directory
+
+    Args:
+        path (str): Destination directory, it must exist.
+        name (str): Key of `NIGHTS`.
+        compression (str): `fz` to write tile-compressed `.fits.fz` files or
+          `gz` to write `.fits.gz` files. By default files are not compressed.
+
+    Returns:
+        The number of files written.
+
+    """
+    number_of_files = 0
+    for sequence in NIGHTS[name]:
+        for index, focus in enumerate(np.linspace(*sequence['focus'])):
+            data = get_frame(sequence=sequence, focus=focus)
+            header = _get_header(sequence=sequence, focus=focus, index=index)
+            file_path = os.path.join(path, f"{sequence['prefix']}_{index:03d}.fits")
+            if compression == 'fz':
+                fits.HDUList([fits.PrimaryHDU(), fits.CompImageHDU(data=data, header=header)]).writeto(f"{file_path}.fz")
+            else:
+                fits.PrimaryHDU(data=data, header=header).writeto(f"{file_path}.gz" if compression == 'gz' else file_path)
+            number_of_files += 1
+    return number_of_files
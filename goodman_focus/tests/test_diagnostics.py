@@ -0,0 +1,72 @@
+import numpy as np
+import os
+import tempfile
+
+from astropy.io import fits
+from astropy.modeling import models
+from ccdproc import CCDData
+from unittest import TestCase
+
+from ..diagnostics import DiagnosticsRecorder
+from ..goodman_focus import get_peaks, get_fwhm
+
+
+class DiagnosticsRecorderTest(TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temporary_directory.name, 'diagnostics.npz')
+
+        self.recorder = DiagnosticsRecorder()
+        for i, number_of_peaks in enumerate([2, 0, 3]):
+            self.recorder.start_frame(file_name=f"file_{i}.fits")
+            self.recorder.record(raw_profile=np.arange(10, dtype=float) + i,
+                                 accepted_peaks=np.arange(number_of_peaks),
+                                 threshold=0.5 * i)
+            if i != 1:
+                self.recorder.record(focus=i * 100)
+
+    def test_save_and_load(self):
+        self.recorder.save(self.path)
+        loaded = DiagnosticsRecorder.load(self.path)
+
+        self.assertEqual(len(loaded), 3)
+        for original, frame in zip(self.recorder.frames, loaded.frames):
+            self.assertEqual(sorted(original.keys()), sorted(frame.keys()))
+            for name in original:
+                np.testing.assert_array_equal(original[name], frame[name])
+        self.assertEqual(loaded.frame(2)['file_name'], 'file_2.fits')
+        self.assertEqual(loaded.frame(2)['threshold'], 1.)
+        self.assertEqual(loaded.frame(0)['raw_profile'].dtype, np.float32)
+
+    def test_record_without_frame(self):
+        recorder = DiagnosticsRecorder()
+        recorder.record(threshold=1)
+        self.assertEqual(len(recorder), 1)
+
+    def test_replay_get_peaks(self):
+        ccd = CCDData(data=np.ones((100, 1000)), meta=fits.Header(), unit='adu')
+        gaussian = models.Gaussian1D(mean=500, amplitude=500, stddev=5)
+        ccd.data[:] = gaussian(range(1000)) + 10
+
+        recorder = DiagnosticsRecorder()
+        recorder.start_frame(file_name='file.fits')
+        peaks, values, x_axis, profile = get_peaks(ccd=ccd, recorder=recorder)
+        get_fwhm(peaks=peaks, values=values, x_axis=x_axis, profile=profile,
+                 model=models.Gaussian1D(), recorder=recorder)
+        recorder.save(self.path)
+
+        loaded = DiagnosticsRecorder.load(self.path)
+        frame = loaded.frame(0)
+        np.testing.assert_array_equal(frame['accepted_peaks'], [500])
+        self.assertEqual(frame['line_parameters'].shape, (1, 3))
+        self.assertAlmostEqual(frame['line_parameters'][0, 2], gaussian.fwhm, delta=0.001)
+
+        plot_arguments = loaded.get_profile_plot_arguments(index=0)
+        np.testing.assert_allclose(plot_arguments['profile'], profile, atol=1e-3)
+
+        written = loaded.plot(output_dir=os.path.join(self.temporary_directory.name, 'plots'))
+        self.assertEqual([os.path.basename(_file) for _file in written], ['file_profile.png'])
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
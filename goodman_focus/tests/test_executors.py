@@ -0,0 +1,152 @@
+import asyncio
+import os
+import threading
+
+from multiprocessing import AuthenticationError
+from unittest import TestCase, mock
+
+from ..executors import (DEFAULT_TIMEOUT,
+                         DistributedExecutor,
+                         ProcessExecutor,
+                         SerialExecutor,
+                         ThreadExecutor,
+                         get_executor,
+                         parse_address,
+                         run_worker)
+
+
+def _add(a, b):
+    return a + b
+
+
+def _get_process_id(_):
+    return os.getpid()
+
+
+def _fail(value):
+    raise ValueError(f"Invalid value {value}")
+
+
+def _wait(event, started, value):
+    started.append(value)
+    event.wait(timeout=10)
+    return value
+
+
+class ExecutorTests(TestCase):
+
+    def setUp(self):
+        self.tasks = [(i, 10 * i) for i in range(20)]
+        self.expected = [11 * i for i in range(20)]
+
+    def test_serial_executor(self):
+        with SerialExecutor() as executor:
+            self.assertEqual(executor.map(_add, self.tasks), self.expected)
+
+    def test_thread_executor(self):
+        with ThreadExecutor(workers=3) as executor:
+            self.assertEqual(executor.map(_add, self.tasks), self.expected)
+
+    def test_process_executor(self):
+        with ProcessExecutor(workers=2) as executor:
+            self.assertEqual(executor.map(_add, self.tasks), self.expected)
+            self.assertEqual(executor.map(_add, self.tasks[:3]), self.expected[:3])
+
+    def test_empty_tasks(self):
+        with ThreadExecutor(workers=2) as executor:
+            self.assertEqual(executor.map(_add, []), [])
+
+    def test_amap(self):
+        for executor in [SerialExecutor(), ThreadExecutor(workers=3), ProcessExecutor(workers=2)]:
+            with executor:
+                self.assertEqual(asyncio.run(executor.amap(_add, self.tasks)), self.expected)
+
+    def test_amap_errors_are_raised(self):
+        with ThreadExecutor(workers=2) as executor:
+            self.assertRaises(ValueError, asyncio.run, executor.amap(_fail, [(1,)]))
+
+    def test_amap_cancellation(self):
+        event = threading.Event()
+        started = []
+
+        async def cancel(executor):
+            task = asyncio.ensure_future(executor.amap(_wait, [(event, started, i) for i in range(5)]))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+            return False
+
+        with ThreadExecutor(workers=1) as executor:
+            self.assertTrue(asyncio.run(cancel(executor)))
+            event.set()
+        self.assertEqual(started, [0])
+
+    def test_get_executor(self):
+        self.assertIsInstance(get_executor('serial'), SerialExecutor)
+        self.assertIsInstance(get_executor('thread', workers=2), ThreadExecutor)
+        self.assertIsInstance(get_executor('process', workers=2), ProcessExecutor)
+        self.assertRaises(ValueError, get_executor, 'unknown')
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address('localhost:5000'), ('localhost', 5000))
+
+
+class DistributedExecutorTests(TestCase):
+
+    def setUp(self):
+        self.executor = DistributedExecutor(workers=3, timeout=60)
+
+    def test_map_keeps_order(self):
+        tasks = [(i, 10 * i) for i in range(50)]
+        self.assertEqual(self.executor.map(_add, tasks), [11 * i for i in range(50)])
+        self.assertEqual(self.executor.map(_add, tasks[:5]), [11 * i for i in range(5)])
+
+    def test_tasks_run_in_workers(self):
+        process_ids = self.executor.map(_get_process_id, [(i,) for i in range(30)])
+        self.assertNotIn(os.getpid(), process_ids)
+        self.assertLessEqual(len(set(process_ids)), 3)
+
+    def test_address_is_assigned(self):
+        host, port = self.executor.address
+        self.assertEqual(host, '127.0.0.1')
+        self.assertGreater(port, 0)
+
+    def test_errors_are_raised(self):
+        self.assertRaises(ValueError, self.executor.map, _fail, [(1,)])
+
+    def test_amap(self):
+        tasks = [(i, 10 * i) for i in range(10)]
+        self.assertEqual(asyncio.run(self.executor.amap(_add, tasks)), [11 * i for i in range(10)])
+
+    def test_concurrent_amap(self):
+        async def run_concurrently():
+            return await asyncio.gather(self.executor.amap(_add, [(i, 10 * i) for i in range(15)]),
+                                        self.executor.amap(_add, [(i, 100 * i) for i in range(15)]))
+
+        first, second = asyncio.run(run_concurrently())
+        self.assertEqual(first, [11 * i for i in range(15)])
+        self.assertEqual(second, [101 * i for i in range(15)])
+
+    def test_random_authkey(self):
+        self.assertEqual(self.executor.timeout, 60)
+        with mock.patch.dict(os.environ, {'GOODMAN_FOCUS_AUTHKEY': ''}):
+            with DistributedExecutor() as first, DistributedExecutor() as second:
+                self.assertNotEqual(first.authkey, second.authkey)
+                self.assertGreaterEqual(len(first.authkey), 32)
+                self.assertEqual(first.timeout, DEFAULT_TIMEOUT)
+                self.assertRaises(AuthenticationError, run_worker, first.address, second.authkey)
+
+    def test_authkey_from_environment(self):
+        with mock.patch.dict(os.environ, {'GOODMAN_FOCUS_AUTHKEY': 'secret'}):
+            with DistributedExecutor() as executor:
+                self.assertEqual(executor.authkey, b'secret')
+
+    def test_timeout_without_workers(self):
+        with DistributedExecutor(timeout=0.5) as executor:
+            self.assertRaises(TimeoutError, executor.map, _add, [(1, 2)])
+
+    def tearDown(self):
+        self.executor.close()
@@ -1,16 +1,26 @@
+import asyncio
 import datetime
 import numpy as np
 import logging
 import pandas
 import os
+import tempfile
+import warnings
 
 from astropy.io import fits
 from astropy.modeling import models
-from unittest import TestCase
+from astropy.utils.exceptions import AstropyUserWarning
+from unittest import TestCase, mock
 from ccdproc import CCDData
 
-from ..goodman_focus import GoodmanFocus
-from ..goodman_focus import get_args, get_peaks, get_fwhm
+from ..goodman_focus import GoodmanFocus, GoodmanFocusError
+from ..goodman_focus import get_args, get_peaks, get_fwhm, get_profile
+from ..goodman_focus import fit_lines, fit_line_focus_curves, get_slit_fwhm, LineTracker
+from ..goodman_focus import _clip_fwhm, _get_fwhm_error, get_fit_weights
+from ..diagnostics import DiagnosticsRecorder
+from ..executors import DistributedExecutor, ProcessExecutor, ThreadExecutor
+from ..templates import LineTemplateStore
+from .synthetic import write_night
 
 
 logging.disable(logging.CRITICAL)
@@ -24,6 +34,7 @@ class ArgumentTests(TestCase):
                          '--obstype', 'ANY',
                          '--features-model', 'moffat',
                          '--plot-results',
+                         '--track-lines',
                          '--debug']
 
     def test_get_args_default(self):
@@ -34,6 +45,7 @@ class ArgumentTests(TestCase):
         self.assertEqual(args.obstype, 'ANY')
         self.assertEqual(args.features_model, 'moffat')
         self.assertTrue(args.plot_results)
+        self.assertTrue(args.track_lines)
         self.assertTrue(args.debug)
 
 
@@ -104,6 +116,256 @@ class GetPeaksTest(TestCase):
         self.assertLessEqual(len(peaks), number_of_peaks)
         self.assertAlmostEqual(mean_fwhm, np.mean(set_fwhms), delta=0.1)
 
+    def test_float32_profile(self):
+        gaussian = models.Gaussian1D(mean=500, amplitude=500, stddev=5)
+        noise = np.random.default_rng(0).normal(0, 5, self.ccd.data.shape)
+        self.ccd.data = 1000 + gaussian(np.arange(1000)) + noise
+
+        peaks, values, x_axis, profile = get_peaks(ccd=self.ccd)
+        peaks_32, values_32, _, profile_32 = get_peaks(ccd=self.ccd, dtype=np.float32)
+
+        self.assertEqual(profile_32.dtype, np.float32)
+        self.assertEqual(list(peaks_32), list(peaks))
+        np.testing.assert_allclose(profile_32, profile, atol=1e-3)
+        fwhm = get_fwhm(peaks, values, x_axis, profile, model=models.Gaussian1D())
+        fwhm_32 = get_fwhm(peaks_32, values_32, x_axis, profile_32, model=models.Gaussian1D())
+        self.assertAlmostEqual(fwhm_32, fwhm, delta=1e-4 * fwhm)
+
+    def test_slit_fwhm(self):
+        gaussian = models.Gaussian1D(mean=480, amplitude=3000, stddev=2.5)
+        noise = np.random.default_rng(0).normal(0, 10, self.ccd.data.shape)
+        self.ccd.data = 200 + 0.01 * np.arange(1000) + gaussian(np.arange(1000)) + noise
+
+        peaks, values, x_axis, profile = get_peaks(ccd=self.ccd)
+        expected = get_fwhm(peaks, values, x_axis, profile, model=models.Gaussian1D())
+        fwhm = get_slit_fwhm(ccd=self.ccd, model=models.Gaussian1D())
+        self.assertAlmostEqual(fwhm, expected, delta=0.005 * expected)
+        self.assertAlmostEqual(fwhm, gaussian.fwhm, delta=0.01 * gaussian.fwhm)
+
+    def test_float32_profile_of_integer_data(self):
+        self.ccd.data = np.full((100, 1000), 1000, dtype=np.uint16)
+        _, profile = get_profile(ccd=self.ccd, dtype=np.float32)
+        self.assertEqual(profile.dtype, np.float32)
+
+
+class LineTrackerTest(TestCase):
+
+    def setUp(self):
+        self.centers = np.linspace(40, 960, num=15)
+        self.amplitudes = np.linspace(300, 1500, num=15)
+        self.stddevs = [4, 3.5, 3, 2.5, 2.2, 2.5, 3, 3.5, 4]
+        self.x_axis = np.arange(1000)
+
+    def _get_profile(self, stddev, number_of_lines=None):
+        profile = np.zeros(1000)
+        for center, amplitude in list(zip(self.centers, self.amplitudes))[-(number_of_lines or len(self.centers)):]:
+            profile += models.Gaussian1D(amplitude=amplitude, mean=center, stddev=stddev)(self.x_axis)
+        return profile
+
+    def test_fit_lines(self):
+        profile = self._get_profile(stddev=3)
+        centers, widths, fwhm, success, evaluations = fit_lines(
+            x_axis=self.x_axis,
+            profile=profile,
+            centers=self.centers + 1,
+            widths=np.full(len(self.centers), 5.),
+            model=models.Gaussian1D())
+        self.assertTrue(np.all(success))
+        np.testing.assert_allclose(centers, self.centers, atol=1e-3)
+        np.testing.assert_allclose(widths, 3, atol=1e-3)
+        self.assertTrue(np.all(evaluations > 0))
+
+    def test_tracking_skips_detection(self):
+        tracker = LineTracker(model=models.Gaussian1D())
+        tracked_lines = []
+        for stddev in self.stddevs:
+            fwhm = tracker(x_axis=self.x_axis, profile=self._get_profile(stddev=stddev))
+            self.assertAlmostEqual(fwhm, stddev * 2.35482004503, delta=0.01)
+            tracked_lines.append(len(tracker.centers))
+        self.assertEqual(tracker.frames, len(self.stddevs))
+        self.assertEqual(tracker.detections, 1)
+        self.assertEqual(tracker.failed_fits, 0)
+        self.assertEqual(len(set(tracked_lines)), 1)
+
+    def test_get_fwhm_matrix(self):
+        tracker = LineTracker(model=models.Gaussian1D())
+        for stddev in self.stddevs:
+            tracker(x_axis=self.x_axis, profile=self._get_profile(stddev=stddev))
+        positions, fwhm_matrix = tracker.get_fwhm_matrix()
+        self.assertEqual(fwhm_matrix.shape, (len(positions), len(self.stddevs)))
+        self.assertFalse(np.any(np.isnan(fwhm_matrix)))
+        np.testing.assert_allclose(fwhm_matrix[0], np.array(self.stddevs) * 2.35482004503, atol=0.01)
+
+    def test_tracking_detects_again_when_lines_are_lost(self):
+        tracker = LineTracker(model=models.Gaussian1D())
+        tracker.seed(centers=[100, 200, 300], widths=[3, 3, 3])
+        fwhm = tracker(x_axis=self.x_axis, profile=self._get_profile(stddev=3))
+        self.assertEqual(tracker.detections, 1)
+        self.assertAlmostEqual(fwhm, 3 * 2.35482004503, delta=0.01)
+
+    def test_lines_lost_over_several_frames(self):
+        tracker = LineTracker(model=models.Gaussian1D())
+        detections = []
+        # the weakest lines are lost first, the three weakest are never detected
+        for number_of_lines in [12, 11, 10, 9, 8, 7, 6, 5]:
+            profile = self._get_profile(stddev=3, number_of_lines=number_of_lines)
+            # nothing left to fit where a line was lost
+            profile[profile < 1e-3] = 0
+            tracker(x_axis=self.x_axis, profile=profile)
+            detections.append(tracker.detections)
+            self.assertEqual(len(tracker.centers), number_of_lines)
+        # every frame keeps most of the lines of the previous one, but 8 of 12
+        # and 5 of 8 detected lines are below `min_valid_fraction`
+        self.assertEqual(detections, [1, 1, 1, 1, 2, 2, 2, 3])
+
+
+class LineFocusCurvesTest(TestCase):
+
+    def setUp(self):
+        self.focus = np.linspace(-2000, 2000, 11)
+        self.best_focus = np.linspace(-400, 400, 120)
+        self.fwhm_matrix = 3 + 1e-6 * (self.focus[np.newaxis, :] - self.best_focus[:, np.newaxis]) ** 2
+
+    def test_best_focus_per_line(self):
+        line_focus = fit_line_focus_curves(focus=self.focus, fwhm_matrix=self.fwhm_matrix)
+        np.testing.assert_allclose(line_focus['best_focus'], self.best_focus, atol=1)
+        np.testing.assert_allclose(line_focus['best_fwhm'], 3, atol=1e-3)
+        self.assertAlmostEqual(line_focus['compromise_focus'], 0, delta=1)
+
+    def test_matches_polyfit_with_missing_values(self):
+        rng = np.random.default_rng(0)
+        fwhm_matrix = self.fwhm_matrix[:5] + rng.normal(0, 0.01, size=(5, 11))
+        fwhm_matrix[1, 3] = np.nan
+        line_focus = fit_line_focus_curves(focus=self.focus, fwhm_matrix=fwhm_matrix)
+        for line in range(5):
+            valid = np.isfinite(fwhm_matrix[line])
+            coefficients = np.polyfit(self.focus[valid], fwhm_matrix[line][valid], 2)
+            self.assertAlmostEqual(line_focus['best_focus'][line],
+                                   -coefficients[1] / (2 * coefficients[0]),
+                                   delta=1)
+
+    def test_not_enough_values(self):
+        fwhm_matrix = np.full((2, 11), np.nan)
+        fwhm_matrix[0] = self.fwhm_matrix[0]
+        fwhm_matrix[1, :3] = 4
+        line_focus = fit_line_focus_curves(focus=self.focus, fwhm_matrix=fwhm_matrix)
+        self.assertTrue(np.isfinite(line_focus['best_focus'][0]))
+        self.assertTrue(np.isnan(line_focus['best_focus'][1]))
+
+    def test_not_enough_distinct_focus_values(self):
+        focus = np.repeat([-1000., 0., 1000.], 2)
+        fwhm_matrix = np.tile(3 + 1e-6 * (focus - 100) ** 2, (2, 1))
+        fwhm_matrix[1, 2:4] = np.nan
+        with mock.patch('goodman_focus.goodman_focus.log') as log:
+            line_focus = fit_line_focus_curves(focus=focus, fwhm_matrix=fwhm_matrix)
+        log.warning.assert_called_once()
+        self.assertIn('Lines [1]', log.warning.call_args[0][0])
+        self.assertAlmostEqual(line_focus['best_focus'][0], 100, delta=1)
+        self.assertTrue(np.isnan(line_focus['best_focus'][1]))
+        self.assertAlmostEqual(line_focus['compromise_focus'], 100, delta=1)
+
+
+class FwhmUncertaintyTest(TestCase):
+
+    def setUp(self):
+        self.x_axis = np.arange(200)
+        self.gaussian = models.Gaussian1D(amplitude=500, mean=100, stddev=3)
+
+    def test_gaussian_error_matches_scatter(self):
+        generator = np.random.default_rng(0)
+        values = []
+        errors = []
+        for _ in range(50):
+            profile = self.gaussian(self.x_axis) + generator.normal(0, 10, len(self.x_axis))
+            fwhm, fwhm_error = get_fwhm(peaks=[100],
+                                        values=[profile[100]],
+                                        x_axis=self.x_axis,
+                                        profile=profile,
+                                        model=models.Gaussian1D(),
+                                        return_error=True)
+            values.append(fwhm)
+            errors.append(fwhm_error)
+        self.assertAlmostEqual(np.mean(values), self.gaussian.fwhm, delta=0.05)
+        self.assertAlmostEqual(np.std(values) / np.mean(errors), 1, delta=0.3)
+
+    def test_moffat_error(self):
+        generator = np.random.default_rng(1)
+        moffat = models.Moffat1D(amplitude=500, x_0=100, gamma=4, alpha=2.5)
+        profile = moffat(self.x_axis) + generator.normal(0, 10, len(self.x_axis))
+        centers, widths, fwhm, success, evaluations, fwhm_error = fit_lines(x_axis=self.x_axis,
+                                                                            profile=profile,
+                                                                            centers=[100],
+                                                                            widths=[3.],
+                                                                            model=models.Moffat1D(),
+                                                                            return_errors=True)
+        self.assertTrue(success[0])
+        self.assertGreater(fwhm_error[0], 0)
+        self.assertLess(abs(fwhm[0] - moffat.fwhm), 5 * fwhm_error[0])
+
+    def test_error_without_covariance(self):
+        self.assertTrue(np.isnan(_get_fwhm_error(model=self.gaussian, covariance=None)))
+
+    def test_clip_fwhm_error(self):
+        fwhm, fwhm_error = _clip_fwhm(all_fwhm=[3., 3.1, 2.9, 3.05],
+                                      all_fwhm_error=[0.01, 0.01, 0.01, 0.01],
+                                      sigma=3,
+                                      return_error=True)
+        self.assertAlmostEqual(fwhm, 3.0125)
+        self.assertAlmostEqual(fwhm_error, np.std([3., 3.1, 2.9, 3.05], ddof=1) / 2.)
+
+        fwhm, fwhm_error = _clip_fwhm(all_fwhm=[3., 3.], all_fwhm_error=[0.2, np.nan], return_error=True)
+        self.assertAlmostEqual(fwhm_error, 0.2 / np.sqrt(2))
+        self.assertEqual(_clip_fwhm(all_fwhm=[], return_error=True)[0], None)
+        self.assertEqual(_clip_fwhm(all_fwhm=[3.]), 3.)
+
+    def test_get_fit_weights(self):
+        np.testing.assert_allclose(get_fit_weights([0.1, np.nan, 0.2, 0.001]), [10., 5., 5., 100.])
+        self.assertIsNone(get_fit_weights([np.nan, 0.]))
+
+    def test_weighted_fit_ignores_noisy_frame(self):
+        goodman_focus = GoodmanFocus()
+        focus = np.linspace(-1000, 1000, 9)
+        fwhm = np.sqrt(3 ** 2 + (4e-3 * (focus - 100)) ** 2)
+        fwhm_error = np.full(len(focus), 0.01)
+        fwhm[3] += 1.
+        fwhm_error[3] = 1.
+        data_frame = pandas.DataFrame({'file': [f"{i}.fits" for i in range(9)],
+                                       'fwhm': fwhm,
+                                       'focus': focus,
+                                       'fwhm_error': fwhm_error})
+        goodman_focus._fit(df=data_frame.drop(columns='fwhm_error'))
+        unweighted = goodman_focus._GoodmanFocus__best_focus
+        goodman_focus._fit(df=data_frame)
+        weighted = goodman_focus._GoodmanFocus__best_focus
+        self.assertLess(abs(weighted - 100), 10)
+        self.assertLess(abs(weighted - 100), abs(unweighted - 100))
+
+    def test_fit_is_well_conditioned(self):
+        goodman_focus = GoodmanFocus()
+        focus = np.linspace(-2000, 2000, 13)
+        fwhm = np.sqrt(3 ** 2 + (4e-3 * (focus - 100)) ** 2)
+        data_frame = pandas.DataFrame({'file': [f"{i}.fits" for i in range(13)], 'fwhm': fwhm, 'focus': focus})
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', AstropyUserWarning)
+            polynomial = goodman_focus._fit(df=data_frame)
+        self.assertEqual(goodman_focus.fitter.fit_info['rank'], 3)
+        np.testing.assert_allclose(polynomial(focus), fwhm ** 2, rtol=1e-6)
+        np.testing.assert_allclose(goodman_focus._get_model_fwhm(focus), fwhm, rtol=1e-6)
+        self.assertAlmostEqual(goodman_focus._GoodmanFocus__best_focus, 100, places=3)
+
+    def test_short_sweep_is_not_interpolated(self):
+        goodman_focus = GoodmanFocus()
+        focus = np.linspace(-1500, 1500, 7)
+        fwhm_error = np.array([0.05, 0.05, 0.05, 1., 0.05, 0.05, 0.05])
+        fwhm = np.sqrt(3 ** 2 + (4e-3 * (focus - 150)) ** 2) + np.array([0, 0, 0, 1., 0, 0, 0])
+        goodman_focus._fit(df=pandas.DataFrame({'file': [f"{i}.fits" for i in range(7)],
+                                                'fwhm': fwhm,
+                                                'focus': focus,
+                                                'fwhm_error': fwhm_error}))
+        self.assertEqual(len(goodman_focus.polynomial.parameters), 3)
+        self.assertGreater(fwhm[3] - goodman_focus._get_model_fwhm(focus[3]), 0.9)
+        self.assertLess(abs(goodman_focus._GoodmanFocus__best_focus - 150), 5)
+
 
 class GoodmanFocusTests(TestCase):
 
@@ -112,15 +374,8 @@ class GoodmanFocusTests(TestCase):
         number_of_test_subjects = 21
         self.file_list = ["file_{}.fits".format(i + 1) for i in range(number_of_test_subjects)]
         self.focus_values = list(np.linspace(-2000, 2000, number_of_test_subjects))
-        fwhm_model = models.Polynomial1D(degree=5)
-        fwhm_model.c0.value = 5
-        fwhm_model.c1.value = 1e-6
-        fwhm_model.c2.value = 1e-6
-        # fwhm_model.c3.value = 1e-6
-        # fwhm_model.c4.value = 1e-6
-        # fwhm_model.c5.value = 1e-6
-
-        self.list_of_fwhm = fwhm_model(self.focus_values)
+        # the FWHM grows as a hyperbola away from the best focus, at -0.5
+        self.list_of_fwhm = np.sqrt(5 ** 2 + (3.75e-3 * (np.array(self.focus_values) + 0.5)) ** 2)
 
         for i in range(number_of_test_subjects):
             now = datetime.datetime.now()
@@ -188,11 +443,167 @@ class GoodmanFocusTests(TestCase):
         self.goodman_focus()
         self.assertIsNotNone(self.goodman_focus.fwhm)
 
+    def test__call__track_lines(self):
+        expected = self.goodman_focus()
+        self.goodman_focus = GoodmanFocus(track_lines=True)
+        result = self.goodman_focus()
+        self.assertAlmostEqual(result[0]['focus'], expected[0]['focus'], delta=1)
+        np.testing.assert_allclose(result[0]['fwhm_data'], self.list_of_fwhm, atol=1e-3)
+
+    def test__call__per_line_focus(self):
+        self.goodman_focus = GoodmanFocus(per_line_focus=True)
+        result = self.goodman_focus()
+        line_focus = result[0]['line_focus']
+        self.assertEqual(len(line_focus['line_position']), 1)
+        self.assertAlmostEqual(line_focus['line_position'][0], 500, delta=0.1)
+        self.assertAlmostEqual(line_focus['compromise_focus'], result[0]['focus'], delta=5)
+
+    def test__call__line_templates(self):
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            path = os.path.join(temporary_directory, 'templates.json')
+            self.goodman_focus = GoodmanFocus(line_templates=path)
+            expected = self.goodman_focus()
+            self.assertEqual(self.goodman_focus.line_tracker.detections, 1)
+            settings = self.goodman_focus._template_settings
+            template = LineTemplateStore(path=path, min_lines=1).get(*settings)
+            self.assertIsNone(template)
+
+            store = LineTemplateStore(path=path, min_lines=1)
+            store.update(*settings, positions=[501], widths=[3])
+
+            self.goodman_focus = GoodmanFocus(line_templates=path)
+            self.goodman_focus.template_store.min_lines = 1
+            result = self.goodman_focus()
+            self.assertEqual(self.goodman_focus.line_tracker.detections, 0)
+            self.assertAlmostEqual(result[0]['focus'], expected[0]['focus'], delta=1)
+            template = LineTemplateStore(path=path).get(*settings)
+            self.assertAlmostEqual(template['positions'][0], 500, delta=0.1)
+
+    def test__call__line_templates_invalidated(self):
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            path = os.path.join(temporary_directory, 'templates.json')
+            self.goodman_focus = GoodmanFocus(line_templates=path)
+            self.goodman_focus()
+            settings = self.goodman_focus._template_settings
+            LineTemplateStore(path=path, min_lines=1).update(*settings, positions=[100, 800], widths=[3, 3])
+
+            self.goodman_focus = GoodmanFocus(line_templates=path)
+            self.goodman_focus()
+            self.assertEqual(self.goodman_focus.line_tracker.detections, 1)
+            self.assertIsNone(LineTemplateStore(path=path).get(*settings))
+
+    def test__call__plot_dir(self):
+        with tempfile.TemporaryDirectory() as plot_dir:
+            self.goodman_focus = GoodmanFocus(plot_results=True, debug=True, plot_dir=plot_dir)
+            with mock.patch('matplotlib.pyplot.show') as show:
+                self.goodman_focus()
+            show.assert_not_called()
+            self.assertIsNone(self.goodman_focus.renderer)
+            plots = sorted(os.listdir(plot_dir))
+            self.assertEqual(len(plots), len(self.file_list) + 1)
+            group = self.goodman_focus.focus_groups[0]
+            first_file = group['file'].tolist()[0].split('.')[0]
+            self.assertIn(f"SP__Red__400m2__filter2_{group['DATE'].tolist()[0]}_{first_file}_focus.png", plots)
+
+    def test__call__diagnostics(self):
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            path = os.path.join(temporary_directory, 'diagnostics.npz')
+            self.goodman_focus = GoodmanFocus(diagnostics=path)
+            self.goodman_focus()
+            recorder = DiagnosticsRecorder.load(path)
+        self.assertEqual(len(recorder), len(self.file_list))
+        self.assertEqual(sorted(str(frame['file_name']) for frame in recorder.frames), sorted(self.file_list))
+        for frame in recorder.frames:
+            for name in ['raw_profile', 'accepted_peaks', 'line_parameters', 'line_fwhm', 'focus']:
+                self.assertIn(name, frame)
+
+    def test__call__use_index(self):
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            index_path = os.path.join(temporary_directory, 'index.json')
+            expected = self.goodman_focus()
+            self.goodman_focus = GoodmanFocus(use_index=True, index_path=index_path)
+            result = self.goodman_focus()
+            self.assertTrue(os.path.isfile(index_path))
+            self.assertEqual(result, expected)
+            self.assertEqual(self.goodman_focus(), expected)
+
+    def test__call__coarse_to_fine(self):
+        expected = self.goodman_focus()[0]
+        self.goodman_focus = GoodmanFocus(coarse_to_fine=True, focus_tolerance=50)
+        result = self.goodman_focus()[0]
+        self.assertGreaterEqual(len(result['skipped_files']), len(self.file_list) // 2)
+        self.assertEqual(len(result['skipped_files']) + len(result['focus_data']), len(self.file_list))
+        self.assertTrue(set(result['skipped_files']).isdisjoint([expected['best_image_name']]))
+        self.assertAlmostEqual(result['focus'], expected['focus'], delta=50)
+
+    def test__call__coarse_to_fine_ignored_when_tracking(self):
+        self.goodman_focus = GoodmanFocus(coarse_to_fine=True, track_lines=True)
+        result = self.goodman_focus()[0]
+        self.assertEqual(result['skipped_files'], [])
+        self.assertEqual(len(result['focus_data']), len(self.file_list))
+
+    def test__call__float32_precision(self):
+        expected = self.goodman_focus()[0]
+        self.goodman_focus = GoodmanFocus(precision='float32')
+        result = self.goodman_focus()[0]
+        np.testing.assert_allclose(result['fwhm_data'], expected['fwhm_data'], rtol=1e-4)
+        self.assertAlmostEqual(result['focus'], expected['focus'], delta=1)
+        self.assertAlmostEqual(result['fwhm'], expected['fwhm'], delta=1e-4 * expected['fwhm'])
+
+    def test__call__executor_maps_files(self):
+        expected = self.goodman_focus(files=self.file_list)
+        with ThreadExecutor(workers=2) as executor:
+            self.goodman_focus = GoodmanFocus(executor=executor)
+            with mock.patch.object(executor, 'map', wraps=executor.map) as executor_map:
+                result = self.goodman_focus(files=self.file_list)
+        self.assertEqual(executor_map.call_count, 1)
+        self.assertEqual(len(executor_map.call_args[0][1]), len(self.file_list))
+        self.assertEqual(result, expected)
+
+    def test__call__executor_maps_groups(self):
+        for _file in self.file_list[:10]:
+            fits.setval(_file, 'FILTER2', value='other-filter2')
+        expected = self.goodman_focus(files=self.file_list)
+        with ProcessExecutor(workers=2) as executor:
+            self.goodman_focus = GoodmanFocus(executor=executor)
+            result = self.goodman_focus(files=self.file_list)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result, expected)
+
+    def test__call__distributed_executor(self):
+        expected = self.goodman_focus()
+        with DistributedExecutor(workers=2, timeout=60) as executor:
+            self.goodman_focus = GoodmanFocus(executor=executor)
+            result = self.goodman_focus()
+        self.assertEqual(result, expected)
+
+    def test__call__executor_keeps_tracking_serial(self):
+        executor = mock.Mock(workers=2, local=True)
+        self.goodman_focus = GoodmanFocus(track_lines=True, executor=executor)
+        self.goodman_focus(files=self.file_list)
+        executor.map.assert_not_called()
+
     def test__call__with_list(self):
         self.assertIsNone(self.goodman_focus.fwhm)
         self.goodman_focus(files=self.file_list)
         self.assertIsNotNone(self.goodman_focus.fwhm)
 
+    def test__call__with_list_parses_each_header_once(self):
+        with mock.patch('builtins.open', wraps=open) as os_open:
+            self.goodman_focus(files=self.file_list)
+        opened = [os.path.basename(str(call[0][0])) for call in os_open.call_args_list if call[0]]
+        # once for the header and once to read the data at the offset found with it
+        for _file in self.file_list:
+            self.assertEqual(opened.count(_file), 2)
+
+    def test__call__with_list_groups_by_configuration(self):
+        for _file in self.file_list[:10]:
+            fits.setval(_file, 'FILTER2', value='other-filter2')
+        results = self.goodman_focus(files=self.file_list)
+        self.assertEqual(len(self.goodman_focus.focus_groups), 2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(sorted([len(group) for group in self.goodman_focus.focus_groups]), [10, 11])
+
     def test__call__list_file_no_exist(self):
         file_list = ["no_file_{}.fits".format(i) for i in range(10, 20)]
         self.assertRaises(SystemExit, self.goodman_focus, file_list)
@@ -206,6 +617,125 @@ class GoodmanFocusTests(TestCase):
             os.unlink(_file)
 
 
+class ImagingFastPathTest(TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.data_path = self.temporary_directory.name
+        generator = np.random.default_rng(0)
+        for i, focus in enumerate(np.linspace(-1000, 1000, 11)):
+            ccd = CCDData(data=np.zeros((200, 1000)), meta=fits.Header(), unit='adu')
+            for key, value in [('DATE', '2022-01-01'), ('DATE-OBS', '2022-01-01T01:00:00'),
+                               ('INSTCONF', 'Blue'), ('OBSTYPE', 'FOCUS'), ('CAM_FOC', focus),
+                               ('CAM_TARG', 0), ('GRT_TARG', 0), ('FILTER', 'g-SDSS'),
+                               ('FILTER2', 'NO_FILTER'), ('GRATING', 'NO_GRATING'),
+                               ('SLIT', '1.0 LONG SLIT'), ('WAVMODE', 'IMAGING'),
+                               ('RDNOISE', 1), ('GAIN', 1), ('ROI', 'user-defined')]:
+                ccd.header[key] = value
+            fwhm = np.sqrt(3 ** 2 + (4e-3 * (focus - 150)) ** 2)
+            slit = models.Gaussian1D(amplitude=3000, mean=512, stddev=fwhm / 2.35482)(np.arange(1000))
+            ccd.data = 100 + slit + generator.normal(0, 5, ccd.data.shape)
+            ccd.write(os.path.join(self.data_path, f"imaging_{i}.fits"))
+
+    def test_same_focus_as_full_pipeline(self):
+        expected = GoodmanFocus(data_path=self.data_path, imaging_fast_path=False)()[0]
+        with mock.patch('goodman_focus.goodman_focus.get_peaks') as get_peaks_mock:
+            result = GoodmanFocus(data_path=self.data_path)()[0]
+        get_peaks_mock.assert_not_called()
+        self.assertEqual(result['mode_name'], 'IM__Blue__g-SDSS')
+        np.testing.assert_allclose(result['fwhm_data'], expected['fwhm_data'], rtol=0.01)
+        self.assertAlmostEqual(result['focus'], expected['focus'], delta=5)
+
+    def test_diagnostics(self):
+        diagnostics = os.path.join(self.data_path, 'diagnostics.npz')
+        GoodmanFocus(data_path=self.data_path, diagnostics=diagnostics)()
+        recorder = DiagnosticsRecorder.load(diagnostics)
+        self.assertEqual(len(recorder), 11)
+        self.assertIsNotNone(recorder.get_profile_plot_arguments(0))
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+
+class AsyncGoodmanFocusTest(TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.data_path = self.temporary_directory.name
+        write_night(path=self.data_path, name='red_2x2')
+        self.expected = GoodmanFocus(data_path=self.data_path)()
+
+    def test_same_results_as_call(self):
+        results = asyncio.run(GoodmanFocus(data_path=self.data_path).arun())
+        self.assertEqual([result.to_dict() for result in results], self.expected)
+
+    def test_shared_executor(self):
+        async def run_concurrently(executor):
+            requests = [GoodmanFocus(data_path=self.data_path, executor=executor).arun() for _ in range(3)]
+            return await asyncio.gather(*requests)
+
+        with ThreadExecutor(workers=2) as executor:
+            all_results = asyncio.run(run_concurrently(executor))
+        for results in all_results:
+            self.assertEqual([result.to_dict() for result in results], self.expected)
+
+    def test_event_loop_is_not_blocked(self):
+        async def count_ticks():
+            ticks = 0
+            task = asyncio.ensure_future(GoodmanFocus(data_path=self.data_path).arun())
+            while not task.done():
+                await asyncio.sleep(0.01)
+                ticks += 1
+            await task
+            return ticks
+
+        self.assertGreater(asyncio.run(count_ticks()), 5)
+
+    def test_cancellation(self):
+        async def cancel():
+            task = asyncio.ensure_future(GoodmanFocus(data_path=self.data_path).arun())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            await task
+
+        self.assertRaises(asyncio.CancelledError, asyncio.run, cancel())
+
+    def test_unreadable_file_is_skipped(self):
+        with open(os.path.join(self.data_path, 'bad.fits'), 'wb') as bad_file:
+            bad_file.write(b'not a FITS file' * 100)
+        self.assertEqual(GoodmanFocus(data_path=self.data_path)(), self.expected)
+        results = asyncio.run(GoodmanFocus(data_path=self.data_path).arun())
+        self.assertEqual([result.to_dict() for result in results], self.expected)
+
+    def test_errors_are_raised(self):
+        empty_path = os.path.join(self.data_path, 'empty')
+        os.mkdir(empty_path)
+        self.assertRaises(GoodmanFocusError, asyncio.run, GoodmanFocus(data_path=empty_path).arun())
+        self.assertRaises(GoodmanFocusError,
+                          asyncio.run,
+                          GoodmanFocus(data_path=self.data_path, obstype='OBJECT').arun())
+        self.assertRaises(GoodmanFocusError,
+                          asyncio.run,
+                          GoodmanFocus(data_path=self.data_path).arun(files=['missing.fits']))
+        self.assertRaises(GoodmanFocusError,
+                          asyncio.run,
+                          GoodmanFocus(data_path=self.data_path, plot_results=True).arun())
+
+    def test_default_constructor_does_not_exit(self):
+        goodman_focus = GoodmanFocus(data_path=os.path.join(self.data_path, 'non-existing'))
+        self.assertRaises(GoodmanFocusError, asyncio.run, goodman_focus.arun())
+        self.assertRaises(SystemExit, goodman_focus)
+
+    def test_exit_on_error(self):
+        goodman_focus = GoodmanFocus(data_path=os.path.join(self.data_path, 'non-existing'), exit_on_error=False)
+        self.assertRaises(GoodmanFocusError, goodman_focus)
+        goodman_focus = GoodmanFocus(data_path=self.data_path, obstype='OBJECT', exit_on_error=False)
+        self.assertRaises(GoodmanFocusError, goodman_focus)
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+
 class SpectroscopicModeNameTests(TestCase):
 
     def setUp(self):
@@ -263,7 +793,7 @@ class DirectoryAndFilesTest(TestCase):
 
         # goodman_focus = GoodmanFocus(arguments=arguments)
         path_non_existing = os.path.join(os.getcwd(), 'non-existing')
-        self.assertRaises(SystemExit, GoodmanFocus, path_non_existing)
+        self.assertRaises(SystemExit, GoodmanFocus(data_path=path_non_existing))
 
     def test_directory_exists_but_empty(self):
         empty_path = os.path.join(os.getcwd(), 'test_dir_empty')
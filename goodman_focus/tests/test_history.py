@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+
+from unittest import TestCase
+
+from ..goodman_focus import GoodmanFocus
+from ..history import FocusHistory
+from .synthetic import write_night
+
+
+MODE_NAME = 'SP__Red__400_M2__GG455'
+
+
+class FocusHistoryTest(TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temporary_directory.name, 'history', 'focus.sqlite')
+        self.history = FocusHistory(path=self.path)
+
+    def tearDown(self):
+        self.history.close()
+        self.temporary_directory.cleanup()
+
+    def _add_nights(self, temperatures, slope=-20., intercept=500.):
+        for day, temperature in enumerate(temperatures, start=1):
+            self.history.add(mode_name=MODE_NAME,
+                             date_obs=f"2023-03-{day:02d}T23:00:00.000",
+                             focus=intercept + slope * temperature,
+                             fwhm=3.,
+                             temperature=temperature)
+
+    def test_add_and_query(self):
+        self._add_nights(temperatures=[10, 12, 14])
+        self.history.add(mode_name='IM__Red__g-SDSS', date_obs='2023-03-02T22:00:00.000', focus=-100.)
+        self.assertTrue(os.path.isfile(self.path))
+        self.assertEqual(self.history.get_modes(), ['IM__Red__g-SDSS', MODE_NAME])
+
+        records = self.history.query(mode_name=MODE_NAME)
+        self.assertEqual([record['date'] for record in records], ['2023-03-01', '2023-03-02', '2023-03-03'])
+        self.assertEqual(records[0]['temperature'], 10.)
+
+        records = self.history.query(start='2023-03-02', end='2023-03-03')
+        self.assertEqual([record['mode_name'] for record in records], ['IM__Red__g-SDSS', MODE_NAME])
+        self.assertEqual(len(self.history.query(mode_name=MODE_NAME, limit=2)), 2)
+
+    def test_same_sequence_is_replaced(self):
+        self._add_nights(temperatures=[10])
+        self._add_nights(temperatures=[11])
+        records = self.history.query(mode_name=MODE_NAME)
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['temperature'], 11.)
+
+    def test_predict_with_temperature(self):
+        self._add_nights(temperatures=[8, 10, 12, 14, 16])
+        prediction = self.history.predict(mode_name=MODE_NAME, temperature=11., min_half_width=50)
+        self.assertEqual(prediction['method'], 'temperature')
+        self.assertAlmostEqual(prediction['focus'], 280.)
+        self.assertAlmostEqual(prediction['low'], 230.)
+        self.assertAlmostEqual(prediction['high'], 330.)
+        self.assertEqual(prediction['samples'], 5)
+
+    def test_predict_without_temperature(self):
+        self._add_nights(temperatures=[10, 10, 10.5, 10])
+        prediction = self.history.predict(mode_name=MODE_NAME, temperature=11.)
+        self.assertEqual(prediction['method'], 'median')
+        self.assertAlmostEqual(prediction['focus'], 300.)
+
+        prediction = self.history.predict(mode_name=MODE_NAME, date='2023-03-04')
+        self.assertEqual(prediction['samples'], 3)
+        self.assertEqual(prediction['scatter'], 0)
+        self.assertEqual(prediction['high'] - prediction['low'], 200.)
+
+        self.assertIsNone(self.history.predict(mode_name=MODE_NAME, date='2024-06-01'))
+        self.assertIsNone(self.history.predict(mode_name='unknown'))
+
+    def test_import_json(self):
+        results = [{'date': '2023-03-01', 'time': '2023-03-01T23:00:00.000', 'mode_name': MODE_NAME,
+                    'focus': 250., 'fwhm': 3.1, 'best_image_name': 'file.fits'},
+                   {'date': '2023-03-02', 'time': '2023-03-02T23:00:00.000', 'mode_name': MODE_NAME,
+                    'focus': None, 'fwhm': None}]
+        json_path = os.path.join(self.temporary_directory.name, 'results.json')
+        with open(json_path, 'w') as json_file:
+            json.dump({'results': results}, json_file)
+
+        self.assertEqual(self.history.import_json(path=json_path), 1)
+        record, = self.history.query()
+        self.assertEqual(record['best_image_name'], 'file.fits')
+        self.assertEqual(record['data_path'], self.temporary_directory.name)
+        self.assertIsNone(record['temperature'])
+
+
+class GoodmanFocusHistoryTest(TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.data_path = os.path.join(self.temporary_directory.name, 'data')
+        os.makedirs(self.data_path)
+        write_night(path=self.data_path, name='red_2x2')
+        self.path = os.path.join(self.temporary_directory.name, 'focus.sqlite')
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_results_are_stored(self):
+        results = GoodmanFocus(data_path=self.data_path, history=self.path)()
+        with FocusHistory(path=self.path) as history:
+            records = history.query()
+        self.assertEqual(sorted(record['mode_name'] for record in records),
+                         sorted(result['mode_name'] for result in results))
+        for record in records:
+            self.assertEqual(record['temperature'], 12.5)
+            self.assertEqual(record['data_path'], self.data_path)
@@ -0,0 +1,79 @@
+import numpy as np
+import os
+import tempfile
+
+from astropy.io import fits
+from unittest import TestCase, mock
+
+from ..index import HeaderIndex, INDEX_FILE_NAME
+
+
+class HeaderIndexTest(TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.data_path = self.temporary_directory.name
+        self.keywords = ['OBSTYPE', 'CAM_FOC', 'FILTER']
+        for i in range(5):
+            self._write_file(f"file_{i}.fits", cam_foc=i * 100)
+        open(os.path.join(self.data_path, 'notes.txt'), 'w').close()
+
+    def _write_file(self, file_name, cam_foc):
+        header = fits.Header()
+        header['OBSTYPE'] = 'FOCUS'
+        header['CAM_FOC'] = cam_foc
+        fits.PrimaryHDU(data=np.zeros((10, 10)), header=header).writeto(
+            os.path.join(self.data_path, file_name), overwrite=True)
+
+    def _update(self, keywords=None):
+        header_index = HeaderIndex(data_path=self.data_path, keywords=keywords or self.keywords)
+        data_frame = header_index.update(file_pattern='*.fits')
+        return header_index, data_frame
+
+    def test_first_update_reads_all(self):
+        header_index, data_frame = self._update()
+        self.assertEqual(header_index.files_read, 5)
+        self.assertTrue(os.path.isfile(os.path.join(self.data_path, INDEX_FILE_NAME)))
+        self.assertEqual(data_frame['file'].tolist(), [f"file_{i}.fits" for i in range(5)])
+        self.assertEqual(data_frame['CAM_FOC'].tolist(), [0, 100, 200, 300, 400])
+        self.assertTrue(data_frame['FILTER'].isnull().all())
+
+    def test_unchanged_files_are_not_read(self):
+        self._update()
+        with mock.patch.object(HeaderIndex, '_read_header') as read_header:
+            header_index, data_frame = self._update()
+        read_header.assert_not_called()
+        self.assertEqual(header_index.files_read, 0)
+        self.assertEqual(len(data_frame), 5)
+
+    def test_new_modified_and_removed_files(self):
+        self._update()
+        self._write_file('file_5.fits', cam_foc=500)
+        self._write_file('file_0.fits', cam_foc=-100)
+        stat = os.stat(os.path.join(self.data_path, 'file_0.fits'))
+        os.utime(os.path.join(self.data_path, 'file_0.fits'), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        os.unlink(os.path.join(self.data_path, 'file_3.fits'))
+
+        header_index, data_frame = self._update()
+        self.assertEqual(header_index.files_read, 2)
+        self.assertEqual(data_frame['file'].tolist(),
+                         ['file_0.fits', 'file_1.fits', 'file_2.fits', 'file_4.fits', 'file_5.fits'])
+        self.assertEqual(data_frame['CAM_FOC'].tolist(), [-100, 100, 200, 400, 500])
+
+    def test_different_keywords_rebuild_the_index(self):
+        self._update()
+        header_index, data_frame = self._update(keywords=['OBSTYPE', 'CAM_FOC'])
+        self.assertEqual(header_index.files_read, 5)
+        self.assertEqual(list(data_frame.columns), ['file', 'OBSTYPE', 'CAM_FOC'])
+
+    def test_unreadable_files_are_skipped(self):
+        with open(os.path.join(self.data_path, 'broken.fits'), 'w') as broken:
+            broken.write('not a fits file')
+        header_index, data_frame = self._update()
+        self.assertNotIn('broken.fits', data_frame['file'].tolist())
+
+        header_index, data_frame = self._update()
+        self.assertEqual(header_index.files_read, 0)
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
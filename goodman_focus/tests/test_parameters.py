@@ -0,0 +1,90 @@
+import numpy as np
+import pandas
+import tempfile
+
+from astropy.modeling import models
+from unittest import TestCase, mock
+
+from .. import goodman_focus as goodman_focus_module
+from ..goodman_focus import GoodmanFocus, _find_peaks
+from ..parameters import (DEFAULT_PARAMETERS,
+                          ExtractionParameters,
+                          get_extraction_parameters,
+                          parse_binning,
+                          parse_slit_width)
+from .synthetic import write_night
+
+
+class ParseHeaderTest(TestCase):
+
+    def test_parse_binning(self):
+        self.assertEqual(parse_binning(ccdsum='2 2'), (2, 2))
+        self.assertEqual(parse_binning(ccdsum='1 3', roi='Spectroscopic 2x2'), (1, 3))
+        self.assertEqual(parse_binning(ccdsum=np.nan, roi='Spectroscopic 3x3'), (3, 3))
+        self.assertIsNone(parse_binning(ccdsum=None, roi='user-defined'))
+
+    def test_parse_slit_width(self):
+        self.assertEqual(parse_slit_width('1.0_LONG_SLIT'), 1.)
+        self.assertEqual(parse_slit_width('0.45_LONG_SLIT'), 0.45)
+        self.assertIsNone(parse_slit_width('<NO MASK>'))
+        self.assertIsNone(parse_slit_width(None))
+
+
+class ExtractionParametersTest(TestCase):
+
+    def test_defaults_without_keywords(self):
+        self.assertEqual(get_extraction_parameters({}), DEFAULT_PARAMETERS)
+        self.assertEqual(DEFAULT_PARAMETERS, ExtractionParameters(band_half_width=50,
+                                                                  peak_order=5,
+                                                                  floor_fraction=0.03,
+                                                                  initial_stddev=5.))
+
+    def test_scaled_with_binning(self):
+        parameters = [get_extraction_parameters({'CCDSUM': f"{binning} {binning}", 'SLIT': '1.0_LONG_SLIT'})
+                      for binning in [1, 2, 3]]
+        self.assertEqual([p.band_half_width for p in parameters], [50, 25, 17])
+        self.assertEqual([p.peak_order for p in parameters], [5, 3, 2])
+        self.assertAlmostEqual(parameters[0].initial_stddev, 2.831, places=3)
+        self.assertAlmostEqual(parameters[2].initial_stddev, parameters[0].initial_stddev / 3)
+        self.assertTrue(all(p.floor_fraction == 0.03 for p in parameters))
+
+    def test_binning_without_slit(self):
+        parameters = get_extraction_parameters(pandas.Series({'CCDSUM': '2 2', 'ROI': 'Spectroscopic 2x2',
+                                                              'SLIT': np.nan}))
+        self.assertEqual(parameters.initial_stddev, 2.5)
+        self.assertEqual(parameters.band_half_width, 25)
+
+    def test_close_lines_are_resolved_on_binned_data(self):
+        x_axis = np.arange(200)
+        profile = models.Gaussian1D(amplitude=1000, mean=100, stddev=0.9)(x_axis) + \
+            models.Gaussian1D(amplitude=800, mean=104, stddev=0.9)(x_axis)
+        binned = get_extraction_parameters({'CCDSUM': '3 3', 'SLIT': '0.45_LONG_SLIT'})
+        self.assertEqual(len(_find_peaks(profile=profile)[0]), 1)
+        self.assertEqual(_find_peaks(profile=profile, parameters=binned)[0], [100, 104])
+
+
+class GoodmanFocusParametersTest(TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.data_path = self.temporary_directory.name
+        write_night(path=self.data_path, name='blue_2x2')
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_parameters_derived_once_per_group(self):
+        goodman_focus = GoodmanFocus(data_path=self.data_path)
+        with mock.patch.object(goodman_focus_module,
+                               'get_extraction_parameters',
+                               wraps=get_extraction_parameters) as get_parameters:
+            goodman_focus()
+        get_parameters.assert_called_once()
+        self.assertEqual(goodman_focus.group_parameters.band_half_width, 25)
+        self.assertEqual(goodman_focus.group_parameters.peak_order, 3)
+
+    def test_fixed_parameters(self):
+        goodman_focus = GoodmanFocus(data_path=self.data_path, extraction_parameters=DEFAULT_PARAMETERS)
+        result, = goodman_focus()
+        self.assertEqual(goodman_focus.group_parameters, DEFAULT_PARAMETERS)
+        self.assertIsNotNone(result['focus'])
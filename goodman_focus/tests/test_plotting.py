@@ -0,0 +1,77 @@
+import numpy as np
+import os
+import tempfile
+
+from unittest import TestCase
+
+from ..plotting import PlotRenderer, get_safe_file_name
+
+
+class PlotRendererTest(TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.temporary_directory.name, 'plots')
+        self.focus = np.linspace(-1000, 1000, 11)
+        self.x_axis = np.arange(200)
+        self.profile = np.exp(-0.5 * ((self.x_axis - 100) / 3.) ** 2)
+
+    def _plot(self, renderer):
+        renderer.plot_focus(mode_name='SP__Red__400m2__GG455',
+                            focus=self.focus,
+                            fwhm=3 + 1e-6 * self.focus ** 2,
+                            best_focus=0,
+                            model_x_axis=self.focus,
+                            model_fwhm=3 + 1e-6 * self.focus ** 2)
+        renderer.plot_profile(file_name='0001_focus.fits',
+                              title='0001_focus.fits',
+                              x_axis=self.x_axis,
+                              raw_profile=self.profile,
+                              clipped_profile=np.ma.masked_greater(self.profile, 0.5),
+                              initial_background=np.zeros(200),
+                              fitted_background=np.zeros(200),
+                              profile=self.profile,
+                              threshold=0.1,
+                              threshold_label='threshold',
+                              peaks=[100])
+        return renderer.close()
+
+    def test_render_in_process(self):
+        written = self._plot(PlotRenderer(output_dir=self.output_dir, formats=('png', 'pdf'), workers=0))
+        self.assertEqual(sorted(os.path.basename(_file) for _file in written),
+                         ['0001_focus_profile.pdf',
+                          '0001_focus_profile.png',
+                          'SP__Red__400m2__GG455_focus.pdf',
+                          'SP__Red__400m2__GG455_focus.png'])
+        for _file in written:
+            self.assertGreater(os.path.getsize(_file), 0)
+
+    def test_render_in_workers(self):
+        with PlotRenderer(output_dir=self.output_dir, workers=2) as renderer:
+            written = self._plot(renderer)
+        self.assertEqual(len(written), 2)
+        self.assertTrue(all(os.path.isfile(_file) for _file in written))
+
+    def test_groups_of_the_same_mode(self):
+        renderer = PlotRenderer(output_dir=self.output_dir, workers=0)
+        for date, first_file in [('2023-03-14', '0001_focus.fits'),
+                                 ('2023-03-14', '0030_focus.fits.fz'),
+                                 ('2023-03-15', '0001_focus.fits')]:
+            renderer.plot_focus(mode_name='SP__Red__400m2__GG455',
+                                focus=self.focus,
+                                fwhm=3 + 1e-6 * self.focus ** 2,
+                                best_focus=0,
+                                model_x_axis=self.focus,
+                                model_fwhm=3 + 1e-6 * self.focus ** 2,
+                                date=date,
+                                first_file=first_file)
+        self.assertEqual(sorted(os.path.basename(_file) for _file in renderer.close()),
+                         ['SP__Red__400m2__GG455_2023-03-14_0001_focus_focus.png',
+                          'SP__Red__400m2__GG455_2023-03-14_0030_focus_focus.png',
+                          'SP__Red__400m2__GG455_2023-03-15_0001_focus_focus.png'])
+
+    def test_get_safe_file_name(self):
+        self.assertEqual(get_safe_file_name('SP__Red__400 m2/<NO FILTER>'), 'SP__Red__400_m2__NO_FILTER_')
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
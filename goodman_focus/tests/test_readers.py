@@ -0,0 +1,254 @@
+import numpy as np
+import os
+import tempfile
+
+from astropy.io import fits
+from astropy.modeling import models
+from ccdproc import CCDData
+from unittest import TestCase, mock
+
+from ..executors import ThreadExecutor
+from ..goodman_focus import GoodmanFocus, get_fwhm, get_peaks, measure_file_fwhm
+from ..readers import (_get_band_tasks,
+                       _scale,
+                       find_files,
+                       get_band_limits,
+                       match_file_pattern,
+                       parse_section,
+                       read_focus_frame,
+                       read_focus_header)
+from .synthetic import NIGHTS, _get_header, get_frame, write_night
+
+
+OVERSCAN = 8
+
+
+def _get_amplifier(frame, rows, columns, flip_x, flip_y, binning=1):
+    """Extension with the data of a region of the frame as read by an amplifier"""
+    data = frame[rows[0]:rows[1], columns[0]:columns[1]]
+    if flip_x:
+        data = data[:, ::-1]
+    if flip_y:
+        data = data[::-1, :]
+    height, width = data.shape
+    data = np.hstack([data, np.full((height, OVERSCAN), 300, dtype=data.dtype)])
+
+    header = fits.Header()
+    header['DATASEC'] = f"[1:{width},1:{height}]"
+    x_range = [columns[0] * binning + 1, columns[1] * binning]
+    y_range = [rows[0] * binning + 1, rows[1] * binning]
+    if flip_x:
+        x_range.reverse()
+    if flip_y:
+        y_range.reverse()
+    header['DETSEC'] = f"[{x_range[0]}:{x_range[1]},{y_range[0]}:{y_range[1]}]"
+    return fits.ImageHDU(data=data, header=header)
+
+
+class ReadersTest(TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.sequence = NIGHTS['red_1x1'][0]
+        self.frame = get_frame(sequence=self.sequence, focus=250.)
+        self.header = _get_header(sequence=self.sequence, focus=250., index=0)
+        self.single_path = os.path.join(self.temporary_directory.name, 'single.fits')
+        fits.PrimaryHDU(data=self.frame, header=self.header).writeto(self.single_path)
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def _write_multi_extension(self, extensions, file_name='mef.fits'):
+        file_path = os.path.join(self.temporary_directory.name, file_name)
+        fits.HDUList([fits.PrimaryHDU(header=self.header)] + extensions).writeto(file_path)
+        return file_path
+
+    def _write_four_amplifiers(self, frame, binning=1):
+        height, width = frame.shape
+        extensions = []
+        for rows, flip_y in [((0, height // 2), False), ((height // 2, height), True)]:
+            for columns, flip_x in [((0, width // 2), False), ((width // 2, width), True)]:
+                extensions.append(_get_amplifier(frame, rows, columns, flip_x, flip_y, binning=binning))
+        return self._write_multi_extension(extensions)
+
+    def test_parse_section(self):
+        self.assertEqual(parse_section('[1:2048, 1:100]'), (1, 2048, 1, 100))
+        self.assertEqual(parse_section('[2048:1025,1:100]'), (2048, 1025, 1, 100))
+        self.assertRaises(ValueError, parse_section, '1:2048,1:100')
+
+    def test_single_extension_is_read_as_is(self):
+        data, header = read_focus_frame(file_path=self.single_path)
+        np.testing.assert_array_equal(data, self.frame)
+        self.assertEqual(header['CAM_FOC'], 250.)
+
+    def test_band_matches_assembled_frame(self):
+        file_path = self._write_four_amplifiers(frame=self.frame)
+        low, high = get_band_limits(height=self.frame.shape[0])
+        data, header = read_focus_frame(file_path=file_path)
+        self.assertEqual(data.dtype, self.frame.dtype)
+        np.testing.assert_array_equal(data, self.frame[low:high])
+        self.assertEqual(header['CAM_FOC'], 250.)
+
+        with ThreadExecutor(workers=2) as executor:
+            data, _ = read_focus_frame(file_path=file_path, executor=executor)
+        np.testing.assert_array_equal(data, self.frame[low:high])
+
+    def test_remote_executor_is_not_used_for_extensions(self):
+        file_path = self._write_four_amplifiers(frame=self.frame)
+        executor = mock.Mock(workers=2, local=False)
+        goodman_focus = GoodmanFocus(data_path=self.temporary_directory.name, executor=executor)
+        ccd = goodman_focus._read_ccd(file_name=os.path.basename(file_path))
+        executor.map.assert_not_called()
+        low, high = get_band_limits(height=self.frame.shape[0])
+        np.testing.assert_array_equal(ccd.data, self.frame[low:high])
+
+    def test_binned_detector_section(self):
+        frame = self.frame.reshape(100, 2, 1024, 2).mean(axis=(1, 3)).astype(np.uint16)
+        file_path = self._write_four_amplifiers(frame=frame, binning=2)
+        data, _ = read_focus_frame(file_path=file_path)
+        np.testing.assert_array_equal(data, frame[0:100])
+
+    def test_extensions_without_detector_section_are_stitched(self):
+        extensions = [fits.ImageHDU(data=self.frame[:, :1000]), fits.ImageHDU(data=self.frame[:, 1000:])]
+        data, _ = read_focus_frame(file_path=self._write_multi_extension(extensions))
+        np.testing.assert_array_equal(data, self.frame[50:150])
+
+    def test_only_extensions_in_the_band_are_read(self):
+        extensions = [_get_amplifier(self.frame, rows, (0, 2048), False, False)
+                      for rows in [(0, 40), (40, 160), (160, 200)]]
+        file_path = self._write_multi_extension(extensions)
+        with fits.open(file_path) as hdu_list:
+            tasks, locations, shape = _get_band_tasks(file_path=file_path, hdu_list=hdu_list)
+        self.assertEqual([task[1] for task in tasks], [2])
+        self.assertEqual(tasks[0][2], (10, 110))
+        self.assertEqual(shape, (100, 2048))
+
+    def test_measurements_match_assembled_frame(self):
+        file_path = self._write_four_amplifiers(frame=self.frame)
+        self.assertEqual(measure_file_fwhm(file_path=file_path), measure_file_fwhm(file_path=self.single_path))
+
+        data, header = read_focus_frame(file_path=file_path)
+        band_peaks = get_peaks(ccd=CCDData(data=data, meta=header, unit='adu'))
+        frame_peaks = get_peaks(ccd=CCDData(data=self.frame, meta=self.header, unit='adu'))
+        for band_value, frame_value in zip(band_peaks, frame_peaks):
+            np.testing.assert_array_equal(band_value, frame_value)
+        self.assertEqual(get_fwhm(*band_peaks, model=models.Gaussian1D()),
+                         get_fwhm(*frame_peaks, model=models.Gaussian1D()))
+
+    def test_focus_matches_assembled_frames(self):
+        results = {}
+        for layout in ['single', 'multi_extension']:
+            data_path = os.path.join(self.temporary_directory.name, layout)
+            os.makedirs(data_path)
+            for index, focus in enumerate(np.linspace(*self.sequence['focus'])):
+                frame = get_frame(sequence=self.sequence, focus=focus)
+                header = _get_header(sequence=self.sequence, focus=focus, index=index)
+                if layout == 'single':
+                    hdu_list = fits.HDUList([fits.PrimaryHDU(data=frame, header=header)])
+                else:
+                    hdu_list = fits.HDUList([fits.PrimaryHDU(header=header)] +
+                                            [_get_amplifier(frame, (0, 200), columns, flip_x, False)
+                                             for columns, flip_x in [((0, 1024), False), ((1024, 2048), True)]])
+                hdu_list.writeto(os.path.join(data_path, f"focus_{index:03d}.fits"))
+            results[layout], = GoodmanFocus(data_path=data_path)()
+
+        for key in ['focus', 'fwhm', 'best_image_name', 'fwhm_data']:
+            self.assertEqual(results['multi_extension'][key], results['single'][key])
+
+
+class CompressedReadersTest(TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        sequence = NIGHTS['red_1x1'][0]
+        self.frame = get_frame(sequence=sequence, focus=250.)
+        self.header = _get_header(sequence=sequence, focus=250., index=0)
+        self.low, self.high = get_band_limits(height=self.frame.shape[0])
+        self.fz_path = self._get_path('frame.fits.fz')
+        fits.HDUList([fits.PrimaryHDU(), fits.CompImageHDU(data=self.frame, header=self.header)]).writeto(self.fz_path)
+        self.gz_path = self._get_path('frame.fits.gz')
+        fits.PrimaryHDU(data=self.frame, header=self.header).writeto(self.gz_path)
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def _get_path(self, file_name):
+        return os.path.join(self.temporary_directory.name, file_name)
+
+    def test_file_pattern(self):
+        fits.PrimaryHDU().writeto(self._get_path('frame.fits'))
+        fits.PrimaryHDU().writeto(self._get_path('frame.fit'))
+        self.assertTrue(match_file_pattern('a.fits.fz', '*.fits, *.fits.fz'))
+        self.assertFalse(match_file_pattern('a.fits.fz', '*.fits'))
+        self.assertEqual(find_files(self.temporary_directory.name),
+                         ['frame.fits', 'frame.fits.fz', 'frame.fits.gz'])
+        self.assertEqual(find_files(self.temporary_directory.name, file_pattern=['*.fit', '*.gz']),
+                         ['frame.fit', 'frame.fits.gz'])
+
+    def test_tile_compressed_band(self):
+        data, header = read_focus_frame(file_path=self.fz_path)
+        self.assertEqual(data.dtype, self.frame.dtype)
+        np.testing.assert_array_equal(data, self.frame[self.low:self.high])
+        self.assertEqual(header['CAM_FOC'], 250.)
+
+    def test_gzip_band(self):
+        data, header = read_focus_frame(file_path=self.gz_path)
+        self.assertEqual(data.dtype, self.frame.dtype)
+        np.testing.assert_array_equal(data, self.frame[self.low:self.high])
+        self.assertEqual(header['CAM_FOC'], 250.)
+
+    def test_headers_do_not_read_data(self):
+        with mock.patch.object(fits, 'open', wraps=fits.open) as fits_open:
+            self.assertEqual(read_focus_header(self.gz_path)['OBSTYPE'], 'FOCUS')
+        fits_open.assert_not_called()
+
+        with mock.patch.object(fits.CompImageHDU, 'data', new_callable=mock.PropertyMock) as data:
+            self.assertEqual(read_focus_header(self.fz_path)['OBSTYPE'], 'FOCUS')
+        data.assert_not_called()
+
+    def test_band_at_data_offset(self):
+        file_path = self._get_path('frame.fits')
+        fits.PrimaryHDU(data=self.frame, header=self.header).writeto(file_path)
+        for path in [file_path, self.gz_path]:
+            with mock.patch('builtins.open', wraps=open) as os_open:
+                header, data_offset = read_focus_header(path, return_offset=True)
+            self.assertEqual(os_open.call_count, 1)
+            self.assertEqual(data_offset % 2880, 0)
+            with mock.patch('builtins.open', wraps=open) as os_open:
+                data, _ = read_focus_frame(file_path=path, header=header, data_offset=data_offset)
+            self.assertEqual(os_open.call_count, 1)
+            self.assertEqual(data.dtype, self.frame.dtype)
+            np.testing.assert_array_equal(data, self.frame[self.low:self.high])
+        self.assertIsNone(read_focus_header(self.fz_path, return_offset=True)[1])
+
+    def test_gzip_multi_extension_falls_back(self):
+        file_path = self._get_path('mef.fits.gz')
+        fits.HDUList([fits.PrimaryHDU(header=self.header), fits.ImageHDU(data=self.frame)]).writeto(file_path)
+        self.assertEqual(read_focus_header(file_path)['CAM_FOC'], 250.)
+        data, _ = read_focus_frame(file_path=file_path)
+        np.testing.assert_array_equal(data, self.frame[self.low:self.high])
+
+    def test_scale(self):
+        raw = np.array([[-32768, 0, 32767]], dtype='>i2')
+        unsigned = _scale(raw, {'BZERO': 32768, 'BSCALE': 1})
+        self.assertEqual(unsigned.dtype, np.uint16)
+        np.testing.assert_array_equal(unsigned, [[0, 32768, 65535]])
+        scaled = _scale(raw, {'BZERO': 10, 'BSCALE': 2})
+        self.assertEqual(scaled.dtype, np.float32)
+        np.testing.assert_array_equal(scaled, [[-65526, 10, 65544]])
+        self.assertEqual(_scale(np.array([1.5], dtype='>f4'), {}).dtype, np.float32)
+
+    def test_focus_matches_uncompressed(self):
+        results = {}
+        for compression in [None, 'fz', 'gz']:
+            data_path = self._get_path(str(compression))
+            os.makedirs(data_path)
+            write_night(path=data_path, name='red_2x2', compression=compression)
+            results[compression] = GoodmanFocus(data_path=data_path)()
+
+        for compression in ['fz', 'gz']:
+            self.assertEqual(len(results[compression]), len(results[None]))
+            for result, expected in zip(results[compression], results[None]):
+                for key in ['mode_name', 'focus', 'fwhm', 'fwhm_data']:
+                    self.assertEqual(result[key], expected[key])
+                self.assertEqual(result['best_image_name'], f"{expected['best_image_name']}.{compression}")
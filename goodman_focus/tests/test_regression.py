@@ -0,0 +1,153 @@
+"""Regression tests of the results and throughput on synthetic nights
+
+The results of every night are compared with `data/golden_focus.json`. The
+processing time, normalized by a fixed calibration workload so it does not
+depend on the machine, is compared with `data/baseline_timings.json` only when
+requested, since it depends on the load of the machine.
+
+Environment variables:
+
+- ``GOODMAN_FOCUS_CHECK_THROUGHPUT``: when set to ``1`` the throughput is
+  compared with the baseline, every night is processed several times and
+  the best time is kept.
+- ``GOODMAN_FOCUS_THROUGHPUT_TOLERANCE``: allowed slowdown in percent with
+  respect to the baseline. Default: 50.
+- ``GOODMAN_FOCUS_UPDATE_GOLDEN``: when set to ``1`` both files are written
+  with the current results and timings instead of being compared.
+
+"""
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from astropy.modeling import fitting, models
+from unittest import TestCase, skipUnless
+
+from ..goodman_focus import GoodmanFocus
+from .synthetic import NIGHTS, write_night
+
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data')
+GOLDEN_PATH = os.path.join(DATA_PATH, 'golden_focus.json')
+BASELINE_PATH = os.path.join(DATA_PATH, 'baseline_timings.json')
+
+UPDATE_GOLDEN = os.environ.get('GOODMAN_FOCUS_UPDATE_GOLDEN', '0') == '1'
+CHECK_THROUGHPUT = os.environ.get('GOODMAN_FOCUS_CHECK_THROUGHPUT', '0') == '1'
+THROUGHPUT_TOLERANCE = float(os.environ.get('GOODMAN_FOCUS_THROUGHPUT_TOLERANCE', 50))
+
+FOCUS_TOLERANCE = 1.
+FWHM_RELATIVE_TOLERANCE = 1e-3
+REPEAT = 3
+
+
+def get_calibration_time(repeat=5):
+    """Best time of a fixed workload similar to processing a frame"""
+    generator = np.random.default_rng(0)
+    band = generator.normal(1000, 10, (100, 2048))
+    x_axis = np.arange(2048)
+    profile = models.Gaussian1D(amplitude=1000, mean=1024, stddev=3)(x_axis) + generator.normal(0, 10, 2048)
+    fitter = fitting.LevMarLSQFitter()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(10):
+            np.median(band, axis=0)
+            fitter(models.Gaussian1D(amplitude=900, mean=1023, stddev=5), x_axis, profile)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _write_json(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as json_file:
+        json.dump(content, json_file, indent=2, sort_keys=True)
+        json_file.write('\n')
+
+
+class RegressionTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temporary_directory = tempfile.TemporaryDirectory()
+        cls.results = {}
+        cls.timings = {}
+        cls.normalized_times = {}
+        cls.number_of_files = {}
+
+        calibration_time = get_calibration_time()
+        for name in sorted(NIGHTS):
+            data_path = os.path.join(cls.temporary_directory.name, name)
+            os.makedirs(data_path)
+            cls.number_of_files[name] = write_night(path=data_path, name=name)
+
+            best_total = None
+            for _ in range(REPEAT if CHECK_THROUGHPUT or UPDATE_GOLDEN else 1):
+                goodman_focus = GoodmanFocus(data_path=data_path)
+                results = goodman_focus()
+                if best_total is None or goodman_focus.timings['total'] < best_total:
+                    best_total = goodman_focus.timings['total']
+                    cls.timings[name] = dict(goodman_focus.timings)
+            cls.results[name] = results
+            cls.normalized_times[name] = best_total / calibration_time
+
+        if UPDATE_GOLDEN:
+            _write_json(GOLDEN_PATH, {name: [{'mode_name': result['mode_name'],
+                                              'focus': result['focus'],
+                                              'fwhm': result['fwhm'],
+                                              'best_image_name': result['best_image_name']}
+                                             for result in results]
+                                      for name, results in cls.results.items()})
+            _write_json(BASELINE_PATH, {name: {'files': cls.number_of_files[name],
+                                               'normalized_time': round(cls.normalized_times[name], 4),
+                                               'stages': {stage: round(value / calibration_time, 4)
+                                                          for stage, value in cls.timings[name].items()}}
+                                        for name in cls.results})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temporary_directory.cleanup()
+
+    def _load(self, path):
+        if not os.path.isfile(path):
+            self.fail(f"{path} does not exist, create it with GOODMAN_FOCUS_UPDATE_GOLDEN=1")
+        with open(path) as json_file:
+            return json.load(json_file)
+
+    def test_results_match_golden(self):
+        golden = self._load(GOLDEN_PATH)
+        self.assertEqual(sorted(golden), sorted(self.results))
+        for name, expected_results in golden.items():
+            results = {result['mode_name']: result for result in self.results[name]}
+            self.assertEqual(sorted(results), sorted(expected['mode_name'] for expected in expected_results))
+            for expected in expected_results:
+                with self.subTest(night=name, mode_name=expected['mode_name']):
+                    result = results[expected['mode_name']]
+                    self.assertAlmostEqual(result['focus'], expected['focus'], delta=FOCUS_TOLERANCE)
+                    self.assertAlmostEqual(result['fwhm'],
+                                           expected['fwhm'],
+                                           delta=FWHM_RELATIVE_TOLERANCE * expected['fwhm'])
+                    self.assertEqual(result['best_image_name'], expected['best_image_name'])
+
+    @skipUnless(CHECK_THROUGHPUT, "set GOODMAN_FOCUS_CHECK_THROUGHPUT=1 to compare with the baseline timings")
+    def test_throughput(self):
+        baseline = self._load(BASELINE_PATH)
+        for name, expected in baseline.items():
+            with self.subTest(night=name):
+                limit = expected['normalized_time'] * (1 + THROUGHPUT_TOLERANCE / 100.)
+                self.assertLessEqual(
+                    self.normalized_times[name],
+                    limit,
+                    f"Processing {name} took {self.normalized_times[name]:.2f} calibration units, "
+                    f"{100 * (self.normalized_times[name] / expected['normalized_time'] - 1):.0f}% more than "
+                    f"the baseline of {expected['normalized_time']:.2f}")
+
+    def test_stage_timings(self):
+        for name, timings in self.timings.items():
+            with self.subTest(night=name):
+                for stage in ['discovery', 'read', 'measure', 'focus_curve', 'total']:
+                    self.assertIn(stage, timings)
+                self.assertLessEqual(timings['discovery'] + timings['read'] + timings['measure'],
+                                     timings['total'])
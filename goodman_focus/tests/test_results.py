@@ -0,0 +1,111 @@
+import numpy as np
+import os
+import pickle
+import tempfile
+import unittest
+
+from unittest import TestCase
+
+from ..goodman_focus import GoodmanFocus
+from ..results import FocusMeasurements, FocusResult, results_to_pandas
+from .synthetic import write_night
+
+
+def _get_result(mode_name='mode', date='2019-06-19', skipped_files=None):
+    measurements = FocusMeasurements.from_records([('file_3.fits', 3.2, 300., 0.2),
+                                                   ('file_1.fits', 3.5, -100., 0.3),
+                                                   ('file_2.fits', 2.9, 100.)]).sort_by_focus()
+    return FocusResult(date=date,
+                       time=f"{date}T00:00:00.000",
+                       mode_name=mode_name,
+                       focus=120.,
+                       fwhm=2.9,
+                       best_image_name='file_2.fits',
+                       best_image_focus=100.,
+                       best_image_fwhm=2.9,
+                       measurements=measurements,
+                       skipped_files=skipped_files)
+
+
+class FocusMeasurementsTest(TestCase):
+
+    def test_from_records_sorted_by_focus(self):
+        measurements = _get_result().measurements
+        self.assertEqual(len(measurements), 3)
+        self.assertEqual(measurements.file.tolist(), ['file_1.fits', 'file_2.fits', 'file_3.fits'])
+        np.testing.assert_array_equal(measurements.focus, [-100., 100., 300.])
+        np.testing.assert_array_equal(measurements.fwhm, [3.5, 2.9, 3.2])
+        np.testing.assert_array_equal(measurements.fwhm_error, [0.3, np.nan, 0.2])
+
+    def test_from_arrays(self):
+        measurements = FocusMeasurements.from_arrays(file=['a.fits', 'bb.fits'], fwhm=[1., 2.], focus=[0., 10.])
+        self.assertEqual(measurements.file.tolist(), ['a.fits', 'bb.fits'])
+        np.testing.assert_array_equal(measurements.fwhm, [1., 2.])
+        self.assertTrue(np.all(np.isnan(measurements.fwhm_error)))
+
+    def test_empty(self):
+        measurements = FocusMeasurements.from_records([])
+        self.assertEqual(len(measurements), 0)
+        self.assertEqual(measurements.to_pandas().shape, (0, 4))
+
+    def test_to_pandas_does_not_copy(self):
+        measurements = _get_result().measurements
+        data_frame = measurements.to_pandas()
+        self.assertEqual(data_frame.columns.tolist(), ['file', 'fwhm', 'focus', 'fwhm_error'])
+        self.assertTrue(np.shares_memory(data_frame['focus'].to_numpy(), measurements.data))
+        self.assertTrue(np.shares_memory(data_frame['fwhm'].to_numpy(), measurements.data))
+
+    def test_to_arrow(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise unittest.SkipTest('pyarrow is not installed')
+        table = _get_result().measurements.to_arrow()
+        self.assertEqual(table.column_names, ['file', 'fwhm', 'focus', 'fwhm_error'])
+        self.assertEqual(table.column('focus').to_pylist(), [-100., 100., 300.])
+
+
+class FocusResultTest(TestCase):
+
+    def test_to_dict(self):
+        result = _get_result()
+        self.assertEqual(list(result.to_dict()),
+                         ['date', 'time', 'mode_name', 'notes', 'focus', 'fwhm', 'best_image_name',
+                          'best_image_focus', 'best_image_fwhm', 'focus_data', 'fwhm_data', 'fwhm_error_data'])
+        self.assertEqual(result.to_dict()['focus_data'], [-100., 100., 300.])
+        self.assertEqual(result.to_dict()['fwhm_error_data'], [0.3, None, 0.2])
+        self.assertNotIn('skipped_files', result.to_dict())
+        self.assertEqual(_get_result(skipped_files=[]).to_dict()['skipped_files'], [])
+
+    def test_pickle(self):
+        result = pickle.loads(pickle.dumps(_get_result()))
+        self.assertEqual(result.mode_name, 'mode')
+        self.assertEqual(result.measurements.file.tolist(), ['file_1.fits', 'file_2.fits', 'file_3.fits'])
+
+    def test_results_to_pandas(self):
+        data_frame = results_to_pandas([_get_result(mode_name='a'),
+                                        _get_result(mode_name='b', date='2019-06-20')])
+        self.assertEqual(data_frame.shape, (6, 6))
+        self.assertEqual(data_frame['mode_name'].tolist(), ['a'] * 3 + ['b'] * 3)
+        self.assertEqual(data_frame.groupby('mode_name', observed=True)['fwhm'].min().tolist(), [2.9, 2.9])
+        self.assertEqual(results_to_pandas([]).shape, (0, 6))
+
+
+class GoodmanFocusRunTest(TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.data_path = os.path.join(self.temporary_directory.name, 'data')
+        os.makedirs(self.data_path)
+        write_night(path=self.data_path, name='red_2x2')
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_run_matches_call(self):
+        results = GoodmanFocus(data_path=self.data_path).run()
+        self.assertTrue(all(isinstance(result, FocusResult) for result in results))
+        self.assertEqual([result.to_dict() for result in results], GoodmanFocus(data_path=self.data_path)())
+        for result in results:
+            self.assertTrue(np.all(np.diff(result.measurements.focus) >= 0))
+            self.assertTrue(np.all(result.measurements.fwhm_error > 0))
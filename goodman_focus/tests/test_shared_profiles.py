@@ -0,0 +1,75 @@
+import numpy as np
+
+from astropy.modeling import models
+from unittest import TestCase
+
+from ..executors import ProcessExecutor, ThreadExecutor
+from ..goodman_focus import get_fwhm, _find_peaks
+from ..shared_profiles import SharedProfileStore
+
+
+def _get_profile(stddev, number_of_lines=12, length=1000):
+    x_axis = np.arange(length)
+    profile = np.zeros(length)
+    for center in np.linspace(50, length - 50, number_of_lines):
+        profile += models.Gaussian1D(amplitude=1000, mean=center, stddev=stddev)(x_axis)
+    return profile
+
+
+def _double_in_place(descriptor, index):
+    with SharedProfileStore.attach(descriptor) as store:
+        store.results[index] = 2 * store.profiles[index].sum()
+
+
+class SharedProfileStoreTest(TestCase):
+
+    def test_from_profiles(self):
+        profiles = np.arange(12, dtype=np.float32).reshape(3, 4)
+        with SharedProfileStore.from_profiles(profiles) as store:
+            self.assertEqual(store.profiles.dtype, np.float32)
+            np.testing.assert_array_equal(store.profiles, profiles)
+            self.assertEqual(store.results.shape, (3,))
+            self.assertTrue(np.all(np.isnan(store.results)))
+
+    def test_attach_shares_memory(self):
+        with SharedProfileStore(number_of_profiles=2, length=5) as store:
+            with SharedProfileStore.attach(store.descriptor) as attached:
+                attached.profiles[1] = 7
+                attached.results[0] = 3
+            self.assertEqual(store.profiles[1, 0], 7)
+            self.assertEqual(store.results[0], 3)
+
+    def test_workers_write_results(self):
+        profiles = np.random.default_rng(0).normal(size=(6, 100))
+        with ProcessExecutor(workers=2) as executor:
+            with SharedProfileStore.from_profiles(profiles) as store:
+                executor.map(_double_in_place, [(store.descriptor, i) for i in range(6)])
+                results = store.results.copy()
+        np.testing.assert_allclose(results, 2 * profiles.sum(axis=1), rtol=1e-6)
+
+
+class SharedFittingTest(TestCase):
+
+    def setUp(self):
+        self.stddevs = [2., 3., 4.]
+        self.profiles = np.array([_get_profile(stddev) for stddev in self.stddevs])
+
+    def test_get_fwhm_in_parallel(self):
+        profile = self.profiles[1]
+        peaks, values, _ = _find_peaks(profile)
+        x_axis = np.arange(len(profile))
+        expected = get_fwhm(peaks, values, x_axis, profile, models.Gaussian1D())
+        with ProcessExecutor(workers=2) as executor:
+            result = get_fwhm(peaks, values, x_axis, profile, models.Gaussian1D(), executor=executor)
+        self.assertAlmostEqual(result, expected)
+
+    def test_threads_fit_their_own_model(self):
+        profile = self.profiles[1]
+        peaks, values, _ = _find_peaks(profile)
+        x_axis = np.arange(len(profile))
+        expected = get_fwhm(peaks, values, x_axis, profile, models.Gaussian1D())
+        model = models.Gaussian1D()
+        with ThreadExecutor(workers=4) as executor:
+            result = get_fwhm(peaks, values, x_axis, profile, model, executor=executor)
+        self.assertAlmostEqual(result, expected)
+        np.testing.assert_array_equal(model.parameters, models.Gaussian1D().parameters)
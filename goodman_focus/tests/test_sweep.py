@@ -0,0 +1,73 @@
+import logging
+import numpy as np
+
+from unittest import TestCase
+
+from ..sweep import get_focus_curve, recommend_next_focus, simulate_sweep
+
+
+logging.disable(logging.CRITICAL)
+
+
+class RecommendNextFocusTest(TestCase):
+
+    def setUp(self):
+        self.focus_range = (-2000, 2000)
+        self.focus_curve = get_focus_curve(best_focus=-350)
+
+    def test_initial_exposures(self):
+        focus = []
+        for expected in [0, -2000, 2000]:
+            recommendation = recommend_next_focus(focus,
+                                                  self.focus_curve(focus),
+                                                  focus_range=self.focus_range)
+            self.assertFalse(recommendation['done'])
+            self.assertEqual(recommendation['next_focus'], expected)
+            focus.append(recommendation['next_focus'])
+
+    def test_converges_within_tolerance(self):
+        focus = [0, -2000, 2000]
+        recommendation = recommend_next_focus(focus, self.focus_curve(focus), focus_range=self.focus_range)
+        while not recommendation['done']:
+            focus.append(recommendation['next_focus'])
+            recommendation = recommend_next_focus(focus,
+                                                  self.focus_curve(focus),
+                                                  focus_range=self.focus_range,
+                                                  tolerance=20)
+        self.assertLessEqual(recommendation['uncertainty'], 20)
+        self.assertAlmostEqual(recommendation['best_focus'], -350, delta=20)
+        self.assertLess(len(focus), 11)
+
+    def test_minimum_at_the_end_of_the_range(self):
+        focus_curve = get_focus_curve(best_focus=-2500)
+        focus = [0, -2000, 2000]
+        recommendation = recommend_next_focus(focus, focus_curve(focus), focus_range=self.focus_range)
+        while not recommendation['done']:
+            focus.append(recommendation['next_focus'])
+            recommendation = recommend_next_focus(focus, focus_curve(focus), focus_range=self.focus_range)
+        self.assertEqual(recommendation['best_focus'], -2000)
+        self.assertLessEqual(recommendation['uncertainty'], 50)
+
+    def test_ignores_missing_fwhm(self):
+        focus = [0, -2000, 2000, 500]
+        fwhm = list(self.focus_curve(focus[:3])) + [np.nan]
+        recommendation = recommend_next_focus(focus, fwhm, focus_range=self.focus_range)
+        self.assertFalse(recommendation['done'])
+        self.assertIsNotNone(recommendation['next_focus'])
+
+
+class SimulateSweepTest(TestCase):
+
+    def test_saves_exposures(self):
+        for best_focus in [-1200, -300, 0, 800]:
+            result = simulate_sweep(focus_curve=get_focus_curve(best_focus=best_focus),
+                                    focus_range=(-2000, 2000),
+                                    tolerance=50)
+            self.assertGreater(result['saved_exposures'], 0)
+            self.assertEqual(result['exposures'], len(result['focus']))
+            self.assertAlmostEqual(result['best_focus'], best_focus, delta=50)
+            self.assertAlmostEqual(result['grid_best_focus'], best_focus, delta=50)
+
+    def test_noise_is_reproducible(self):
+        arguments = {'focus_curve': get_focus_curve(), 'focus_range': (-2000, 2000), 'noise': 0.03, 'seed': 3}
+        self.assertEqual(simulate_sweep(**arguments), simulate_sweep(**arguments))
@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from ..templates import LineTemplateStore
+
+
+class LineTemplateStoreTest(TestCase):
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temporary_directory.name, 'cache', 'templates.json')
+        self.store = LineTemplateStore(path=self.path)
+        self.settings = ('SP__Red__400m2__GG455', '2 2', 'Spectroscopic 2x2')
+
+    def test_get_key(self):
+        key = LineTemplateStore.get_key(*self.settings)
+        self.assertEqual(key, 'SP__Red__400m2__GG455__2x2__Spectroscopic2x2')
+
+    def test_get_missing(self):
+        self.assertIsNone(self.store.get(*self.settings))
+
+    def test_update_and_reload(self):
+        self.assertTrue(self.store.update(*self.settings,
+                                          positions=[100, 200, 300],
+                                          widths=[2, 2.5, 3]))
+        self.assertTrue(os.path.isfile(self.path))
+
+        template = LineTemplateStore(path=self.path).get(*self.settings)
+        self.assertEqual(template['positions'], [100, 200, 300])
+        self.assertEqual(template['widths'], [2, 2.5, 3])
+
+    def test_update_not_enough_lines(self):
+        self.assertFalse(self.store.update(*self.settings, positions=[100], widths=[2]))
+        self.assertFalse(os.path.isfile(self.path))
+
+    def test_invalidate(self):
+        self.store.update(*self.settings, positions=[100, 200, 300], widths=[2, 2, 2])
+        self.store.invalidate(*self.settings)
+        self.assertIsNone(self.store.get(*self.settings))
+        with open(self.path) as json_file:
+            self.assertEqual(json.load(json_file), {})
+
+    def test_interleaved_stores_keep_every_update(self):
+        other_settings = ('SP__Blue__930m3__NO_FILTER', '1 1', 'Spectroscopic 1x1')
+        other_store = LineTemplateStore(path=self.path)
+        self.assertIsNone(self.store.get(*self.settings))
+        self.assertIsNone(other_store.get(*other_settings))
+        self.store.update(*self.settings, positions=[100, 200, 300], widths=[2, 2, 2])
+        other_store.update(*other_settings, positions=[110, 210, 310], widths=[3, 3, 3])
+        self.store.invalidate(*other_settings[:1], '2 2', 'Spectroscopic 2x2')
+
+        with open(self.path) as json_file:
+            self.assertEqual(sorted(json.load(json_file)),
+                             sorted([LineTemplateStore.get_key(*self.settings),
+                                     LineTemplateStore.get_key(*other_settings)]))
+        self.assertIsNotNone(self.store.get(*other_settings))
+
+    def test_concurrent_updates(self):
+        def update(index):
+            LineTemplateStore(path=self.path).update(f"mode_{index}", '1 1', 'Spectroscopic 1x1',
+                                                     positions=[100, 200, 300],
+                                                     widths=[2, 2, 2])
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(update, range(32)))
+        self.assertEqual(len(LineTemplateStore(path=self.path).templates), 32)
+
+    def test_corrupted_file(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as json_file:
+            json_file.write('not json')
+        self.assertIsNone(self.store.get(*self.settings))
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()